@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+from ansible_collections.gmeiner.unifi.plugins.action.unifi import UniFiAction
+from ansible_collections.gmeiner.unifi.plugins.modules import config
+
+
+class ActionModule(UniFiAction):
+    '''
+    Runs the module unifi_config in the worker process
+    '''
+
+    module = config
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+from traceback import format_exc
+
+from ansible.module_utils.common.arg_spec import ArgumentSpecValidator
+from ansible.module_utils.errors import UnsupportedError
+from ansible.plugins.action import ActionBase
+
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi import \
+    TaskExit
+
+
+class TaskModule(object):
+    '''
+    A replacement for AnsibleModule which takes the parameters from a task of
+    an action plugin and raises TaskExit with the result instead of printing
+    it and exiting the process. It provides the subset of AnsibleModule which
+    is used by the UniFi helper.
+
+    :ivar params: the validated module parameters
+    :vartype params: dict
+    :ivar check_mode: True if the task runs in check mode
+    :vartype check_mode: bool
+    '''
+
+    #: constructor arguments of AnsibleModule which are passed on to the
+    #: argument spec validator
+    VALIDATOR_ARGS = ('mutually_exclusive', 'required_together',
+                      'required_one_of', 'required_if', 'required_by')
+
+    def __init__(self, task_args, check_mode, socket_path, argument_spec,
+                 supports_check_mode=False, **kwargs):
+        '''
+        Initialize self.
+
+        :raises TaskExit: if the parameters are invalid or the task runs in
+            check mode which is not supported
+
+        :param task_args: the arguments of the task
+        :type task_args: dict
+        :param check_mode: True if the task runs in check mode
+        :type check_mode: bool
+        :param socket_path: the socket of the persistent connection
+        :type socket_path: str
+        :param argument_spec: the argument spec of the module
+        :type argument_spec: dict
+        :param supports_check_mode: True if the module supports check mode
+        :type supports_check_mode: bool
+        :param \\**kwargs: further constructor arguments of AnsibleModule
+        :type \\**kwargs: any
+        '''
+        self._socket_path = socket_path
+        self.check_mode = check_mode
+        if check_mode and not supports_check_mode:
+            self.exit_json(skipped=True,
+                           msg='remote module does not support check mode')
+
+        validator = ArgumentSpecValidator(
+            argument_spec, **{key: value for key, value in kwargs.items()
+                              if key in TaskModule.VALIDATOR_ARGS})
+        validation = validator.validate(task_args)
+        self.params = validation.validated_parameters
+        if validation.error_messages:
+            msg = validation.error_messages[0]
+            # like AnsibleModule, which names the unsupported parameters first
+            if isinstance(validation.errors[0], UnsupportedError):
+                msg = 'Unsupported parameters: ' + msg
+            self.fail_json(msg=msg)
+
+    def exit_json(self, **result):
+        raise TaskExit(result)
+
+    def fail_json(self, msg, **result):
+        result['failed'] = True
+        result['msg'] = msg
+        raise TaskExit(result)
+
+
+class UniFiAction(ActionBase):
+    '''
+    Base class of the action plugins for the UniFi modules. The module code
+    runs directly in the worker process and talks to the persistent
+    connection, so that no module payload needs to be built, transferred and
+    started by a new interpreter for each task.
+
+    The module is executed as usual if the task runs asynchronously or the
+    connection is not persistent (i.e. not the UniFi httpapi connection).
+
+    :cvar module: the Python module of the Ansible module, subclasses must
+        set it
+    :vartype module: module
+    '''
+
+    _supports_check_mode = True
+    _supports_async = True
+
+    module = None
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(UniFiAction, self).run(tmp, task_vars)
+        del tmp
+
+        socket_path = getattr(self._connection, 'socket_path', None)
+        if self._task.async_val or not socket_path:
+            result.update(self._execute_module(task_vars=task_vars,
+                                               wrap_async=self._task.async_val))
+            return result
+
+        def module_class(**module_specs):
+            return TaskModule(self._task.args, self._play_context.check_mode,
+                              socket_path, **module_specs)
+
+        try:
+            self.module.main(module_class=module_class)
+        except TaskExit as e:
+            result.update(e.result)
+        except Exception as e:
+            result.update(failed=True, msg=str(e), exception=format_exc())
+        return result
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+
+class ModuleDocFragment(object):
+
+    # options which are accepted by all UniFi modules
+    DOCUMENTATION = r'''
+options:
+  site:
+    description:
+      - The name of the UniFi site
+    type: str
+    required: false
+    default: default
+  debug:
+    description:
+      - The log level of the module and the connection plugin, the logs are
+        returned in the field logs of the result
+    type: str
+    required: false
+    choices: ['DISABLED', 'FATAL', 'ERROR', 'WARNING', 'INFO', 'VERBOSE',
+              'DEBUG', 'DEBUG_2', 'TRACE', 'TRACE_2', 'MAXIMUM']
+    default: DISABLED
+  result_mode:
+    description:
+      - Specifies which items are returned in the result, C(full) returns all
+        items, C(changed_only) only the created, updated and deleted items and
+        C(summary) no items at all. The number of items per action is always
+        returned in the field summary.
+    type: str
+    required: false
+    choices: ['full', 'changed_only', 'summary']
+    default: full
+  return_fields:
+    description:
+      - Reduces the returned items to their identifying attributes (e.g. _id
+        and name), the attributes listed here and the attributes which were
+        changed. All attributes are returned if omitted.
+    type: list
+    elements: str
+    required: false
+'''
@@ -8,12 +8,244 @@ from __future__ import absolute_import, division, print_function
 
 __metaclass__ = type
 
+DOCUMENTATION = r'''
+---
+author: "Sebastian Gmeiner (@bastig)"
+name: httpapi
+short_description: HttpApi plugin for the UniFi controller REST API
+description:
+  - This HttpApi plugin provides methods to connect to the REST API of a
+    UniFi controller (classic or unifi-os based)
+version_added: "1.0"
+options:
+  unifi_cache_size:
+    description:
+      - Maximum number of bytes of GET responses which are cached by the
+        persistent connection, set to 0 to disable caching
+    type: int
+    default: 16777216
+    env:
+      - name: ANSIBLE_UNIFI_CACHE_SIZE
+    vars:
+      - name: ansible_unifi_cache_size
+  unifi_cache_ttl:
+    description:
+      - Default time to live in seconds for cached GET responses, applies to
+        all API endpoints which don't define their own time to live
+    type: float
+    default: 60
+    env:
+      - name: ANSIBLE_UNIFI_CACHE_TTL
+    vars:
+      - name: ansible_unifi_cache_ttl
+  unifi_max_workers:
+    description:
+      - Maximum number of requests of a batch which are sent to the
+        controller concurrently, batches are sent one request at a time if
+        the connection pool is disabled (see unifi_pool_size)
+    type: int
+    default: 4
+    env:
+      - name: ANSIBLE_UNIFI_MAX_WORKERS
+    vars:
+      - name: ansible_unifi_max_workers
+  unifi_session_path:
+    description:
+      - Path of the file where authenticated sessions are shared between
+        connection processes, set to an empty string to disable sharing
+    type: path
+    default: ~/.ansible/unifi/sessions.json
+    env:
+      - name: ANSIBLE_UNIFI_SESSION_PATH
+    vars:
+      - name: ansible_unifi_session_path
+  unifi_session_ttl:
+    description:
+      - Lifetime in seconds of a session if the controller does not provide
+        an expiry with its token
+    type: float
+    default: 3600
+    env:
+      - name: ANSIBLE_UNIFI_SESSION_TTL
+    vars:
+      - name: ansible_unifi_session_ttl
+  unifi_session_refresh:
+    description:
+      - Sessions are renewed this many seconds before they expire
+    type: float
+    default: 300
+    env:
+      - name: ANSIBLE_UNIFI_SESSION_REFRESH
+    vars:
+      - name: ansible_unifi_session_refresh
+  unifi_metadata_path:
+    description:
+      - Path of the file where controller metadata (controller type, version
+        and site ids) is shared between connection processes, set to an
+        empty string to keep metadata per connection only
+    type: path
+    default: ~/.ansible/unifi/controllers.json
+    env:
+      - name: ANSIBLE_UNIFI_METADATA_PATH
+    vars:
+      - name: ansible_unifi_metadata_path
+  unifi_metadata_ttl:
+    description:
+      - Lifetime in seconds of shared controller metadata
+    type: float
+    default: 86400
+    env:
+      - name: ANSIBLE_UNIFI_METADATA_TTL
+    vars:
+      - name: ansible_unifi_metadata_ttl
+  unifi_pool_size:
+    description:
+      - Maximum number of idle keep-alive connections to the controller,
+        set to 0 to open a new connection for every request
+      - Pooled connections use the proxy (see use_proxy) and the certificate
+        options (ca_path, client_cert, client_key, ciphers) of the connection
+    type: int
+    default: 4
+    env:
+      - name: ANSIBLE_UNIFI_POOL_SIZE
+    vars:
+      - name: ansible_unifi_pool_size
+  unifi_retries:
+    description:
+      - Maximum number of retries of an idempotent request or a login if the
+        controller is busy (HTTP 429, 502, 503, 504) or the connection failed
+    type: int
+    default: 4
+    env:
+      - name: ANSIBLE_UNIFI_RETRIES
+    vars:
+      - name: ansible_unifi_retries
+  unifi_retry_backoff:
+    description:
+      - Base delay in seconds of the exponential backoff between retries
+    type: float
+    default: 0.5
+    env:
+      - name: ANSIBLE_UNIFI_RETRY_BACKOFF
+    vars:
+      - name: ansible_unifi_retry_backoff
+  unifi_retry_max_delay:
+    description:
+      - Maximum delay in seconds between retries, also caps Retry-After
+    type: float
+    default: 30
+    env:
+      - name: ANSIBLE_UNIFI_RETRY_MAX_DELAY
+    vars:
+      - name: ansible_unifi_retry_max_delay
+  unifi_retry_budget:
+    description:
+      - Maximum number of retries of all requests of a persistent connection
+    type: int
+    default: 50
+    env:
+      - name: ANSIBLE_UNIFI_RETRY_BUDGET
+    vars:
+      - name: ansible_unifi_retry_budget
+  unifi_defer_writes:
+    description:
+      - Defer updates (PUT) of existing objects and merge all updates of the
+        same object, so that each object is updated only once when the
+        deferred writes are flushed by the unifi_flush module or when the
+        connection is closed
+      - Only updates of objects of REST collections (e.g. /rest/device) are
+        deferred, other updates like the ones of settings are sent
+        immediately
+    type: bool
+    default: false
+    env:
+      - name: ANSIBLE_UNIFI_DEFER_WRITES
+    vars:
+      - name: ansible_unifi_defer_writes
+  unifi_events:
+    description:
+      - Subscribe to the event websocket of each requested site, so that
+        cached GET responses are patched or invalidated as soon as objects
+        are added, changed or deleted on the controller, e.g. in the web UI
+    type: bool
+    default: false
+    env:
+      - name: ANSIBLE_UNIFI_EVENTS
+    vars:
+      - name: ansible_unifi_events
+  unifi_events_cache_ttl:
+    description:
+      - Time to live in seconds of cached GET responses which are kept up to
+        date by a connected event websocket, replaces shorter times to live
+        of these responses
+    type: float
+    default: 600
+    env:
+      - name: ANSIBLE_UNIFI_EVENTS_CACHE_TTL
+    vars:
+      - name: ansible_unifi_events_cache_ttl
+'''
+
+from ansible.errors import AnsibleConnectionFailure
 from ansible.plugins.httpapi import HttpApiBase
-from json import dumps as json_dumps, load as json_load
+from base64 import urlsafe_b64decode
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from email.utils import parsedate_to_datetime
+from io import BytesIO
+from collections import OrderedDict
+from random import uniform
+from threading import Lock
+from time import time, perf_counter, sleep
+from urllib.error import HTTPError
 
+from ansible_collections.gmeiner.unifi.plugins.module_utils.cache import \
+    ResponseCache
+from ansible_collections.gmeiner.unifi.plugins.module_utils.codec import \
+    dumps as json_dumps, loads as json_loads, Pretty, JsonStream
+from ansible_collections.gmeiner.unifi.plugins.module_utils.collection import \
+    IndexedCollection
+from ansible_collections.gmeiner.unifi.plugins.module_utils.limiter import \
+    AimdLimiter
 from ansible_collections.gmeiner.unifi.plugins.module_utils.logging import \
     Logger
+from ansible_collections.gmeiner.unifi.plugins.module_utils.metrics import \
+    MetricsRegistry
+from ansible_collections.gmeiner.unifi.plugins.module_utils.pool import \
+    ConnectionPool
+from ansible_collections.gmeiner.unifi.plugins.module_utils.store import \
+    FileStore
+from ansible_collections.gmeiner.unifi.plugins.module_utils.websocket \
+    import WebSocket, EventListener
+from ansible_collections.gmeiner.unifi.plugins.module_utils.writes import \
+    WriteQueue
+
+
+class ControllerError(Exception):
+    """
+    Raised for HTTP errors of the controller which can't be handled by the
+    plugin.
+
+    :ivar code: the HTTP status code
+    :vartype code: int
+    """
+    def __init__(self, message, code):
+        super(ControllerError, self).__init__(message)
+        self.code = code
+
+
+class RetryableError(ControllerError):
+    """
+    Raised for HTTP errors which indicate that the controller is temporarily
+    unable to process a request, e.g. while it is busy provisioning.
+
+    :ivar retry_after: the delay in seconds requested by the controller via
+        the Retry-After header or None
+    :vartype retry_after: float
+    """
+    def __init__(self, message, code, retry_after=None):
+        super(RetryableError, self).__init__(message, code)
+        self.retry_after = retry_after
 
 
 class HttpApi(HttpApiBase):
@@ -25,6 +257,32 @@ class HttpApi(HttpApiBase):
     :vartype __masked_errors: list
     :ivar __logger: logging facility, only used for log_levels > 0
     :vartype __logger: Logger
+    :ivar __write_queue: deferred updates of objects
+    :vartype __write_queue: WriteQueue
+    :ivar __retry_budget: number of retries left for this connection
+    :vartype __retry_budget: int
+    :ivar __metrics: request metrics of the current module run
+    :vartype __metrics: MetricsRegistry
+    :ivar __cache: cache for raw GET responses, created on first use
+    :vartype __cache: ResponseCache
+    :ivar __pool: keep-alive connections to the controller, created on first
+        use
+    :vartype __pool: ConnectionPool
+    :ivar __metadata: metadata of the controller, i.e. 'is_unifi_os',
+        'version' and 'sites' (a map of site names to site ids)
+    :vartype __metadata: dict
+    :ivar __session: the auth headers and expiry of the current session as
+        they were last shared via the session store
+    :vartype __session: dict
+    :ivar __reauthenticated: True if a login was triggered by a 401 error
+        and no request has succeeded since
+    :vartype __reauthenticated: bool
+    :ivar __listeners: maps site names to their event listeners
+    :vartype __listeners: dict
+    :ivar __collections: parsed collections for queries in least recently
+        used order, maps collection keys to tuples of the raw response and
+        the indexed collection
+    :vartype __collections: OrderedDict
     :ivar error: shorthand to the same method of the logger
     :vartype error: function
     :ivar info: shorthand to the same method of the logger
@@ -34,6 +292,25 @@ class HttpApi(HttpApiBase):
     :ivar trace: shorthand to the same method of the logger
     :vartype trace: function
     """
+    #: request methods which may be repeated without changing the outcome
+    IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+    #: HTTP status codes of errors which may be resolved by retrying later
+    RETRYABLE_CODES = (429, 502, 503, 504)
+    #: maps object types of controller events to the paths of the
+    #: collections which list these objects, other types are listed by
+    #: /rest/<type>
+    EVENT_PATHS = {
+        'device': ['/stat/device', '/rest/device'],
+        'setting': ['/get/setting', '/rest/setting'],
+        'user': ['/stat/user', '/rest/user']
+    }
+    #: actions of controller events which carry complete objects
+    EVENT_UPSERTS = ('add', 'sync')
+    #: the maximum number of parsed collections which are kept for queries
+    COLLECTION_MEMO_SIZE = 32
+    #: the attributes which identify objects in the results of diff
+    IDENTITY_FIELDS = ('_id', 'key', 'name')
+
     def __init__(self, *args, **kwargs):
         """
         Initialize self.
@@ -42,6 +319,22 @@ class HttpApi(HttpApiBase):
         """
         super(HttpApi, self).__init__(*args, **kwargs)
         self.__masked_errors = []
+        self.__cache = None
+        self.__pool = None
+        self.__connect_lock = Lock()
+        self.__metadata = None
+        self.__metadata_store = None
+        self.__session_store = None
+        self.__session = None
+        self.__session_lock = Lock()
+        self.__reauthenticated = False
+        self.__retry_budget = None
+        self.__retry_lock = Lock()
+        self.__write_queue = WriteQueue()
+        self.__listeners = {}
+        self.__listener_lock = Lock()
+        self.__collections = OrderedDict()
+        self.__collection_lock = Lock()
         self.set_logging(Logger.LEVEL_DISABLED, None)
 
     @property
@@ -54,10 +347,122 @@ class HttpApi(HttpApiBase):
             CloudKey)
         :rtype: bool
         """
-        return self.connection.get_option('is_unifi_os') \
-            if self.connection.has_option('is_unifi_os') else None
-    
-    def set_logging(self, loglevel, logfile):
+        return self.__controller_metadata.get('is_unifi_os')
+
+    @property
+    def connection_pool(self):
+        """
+        Gives access to the pool of keep-alive connections to the controller.
+
+        :returns: the connection pool or None if pooling is disabled
+        :rtype: ConnectionPool
+        """
+        if self.__pool is None and self.get_option('unifi_pool_size') > 0:
+            use_ssl = self.connection.get_option('use_ssl')
+            host = self.connection.get_option('host')
+            proxy = None
+            if self.__connection_option('use_proxy', True):
+                proxy = ConnectionPool.proxy_for(host, use_ssl)
+            self.__pool = ConnectionPool(
+                host,
+                self.connection.get_option('port') or (443 if use_ssl else 80),
+                use_ssl=use_ssl,
+                timeout=self.connection.get_option('persistent_command_timeout'),
+                max_size=self.get_option('unifi_pool_size'),
+                proxy=proxy,
+                ssl_context=self.__ssl_context() if use_ssl else None)
+        return self.__pool
+
+    def __connection_option(self, option, default=None):
+        """
+        Reads an option of the connection plugin which older versions of the
+        plugin may not define.
+
+        :param option: the name of the option
+        :type option: str
+        :param default: the value if the option is not defined
+        :type default: any
+        :rtype: any
+        """
+        try:
+            value = self.connection.get_option(option)
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def __ssl_context(self):
+        """
+        Creates an SSL context with the certificate options of the connection
+        plugin, i.e. validate_certs, ca_path, client_cert, client_key and
+        ciphers.
+
+        :rtype: ssl.SSLContext
+        """
+        return ConnectionPool.ssl_context(
+            validate_certs=self.connection.get_option('validate_certs'),
+            ca_path=self.__connection_option('ca_path'),
+            client_cert=self.__connection_option('client_cert'),
+            client_key=self.__connection_option('client_key'),
+            ciphers=self.__connection_option('ciphers'))
+
+    @property
+    def metadata_store(self):
+        """
+        Gives access to the store for controller metadata which is shared
+        between connection processes.
+
+        :returns: the metadata store or None if sharing is disabled
+        :rtype: FileStore
+        """
+        if self.__metadata_store is None and \
+                self.get_option('unifi_metadata_path'):
+            self.__metadata_store = FileStore(
+                self.get_option('unifi_metadata_path'))
+        return self.__metadata_store
+
+    @property
+    def __controller_url(self):
+        """
+        Identifies the controller by host and port, this is available even
+        before the connection is established.
+
+        :rtype: str
+        """
+        return '{host}:{port}'.format(host=self.connection.get_option('host'),
+                                      port=self.connection.get_option('port'))
+
+    @property
+    def __controller_metadata(self):
+        """
+        The metadata of the controller, loaded from the metadata store on
+        first access.
+
+        :rtype: dict
+        """
+        if self.__metadata is None:
+            self.__metadata = {}
+            if self.metadata_store is not None:
+                self.__metadata = self.metadata_store.load(
+                    FileStore.key(self.__controller_url)) or {}
+        return self.__metadata
+
+    def __update_metadata(self, **values):
+        """
+        Updates the metadata of the controller and shares it via the metadata
+        store. The expiry of shared metadata is not extended by updates.
+
+        :param \\**values: the metadata values to update
+        :type \\**values: any
+        """
+        metadata = self.__controller_metadata
+        metadata.update(values)
+        metadata.setdefault('expires',
+                            time() + self.get_option('unifi_metadata_ttl'))
+        if self.metadata_store is not None:
+            self.metadata_store.save(FileStore.key(self.__controller_url),
+                                     **metadata)
+
+    def set_logging(self, loglevel, logfile, metrics=False):
         """
         Initialize the logging facility for this object
 
@@ -65,7 +470,11 @@ class HttpApi(HttpApiBase):
         :type loglevel: LogLevel
         :param logfile: an optional log file to write output to, may be None
         :type logfile: str
+        :param metrics: optional, record request metrics which can be
+            retrieved with get_metrics
+        :type metrics: bool
         """
+        self.__metrics = MetricsRegistry(metrics)
         self.__logger = Logger(loglevel, logfile)
         self.info = self.__logger.info
         self.debug = self.__logger.debug
@@ -81,10 +490,171 @@ class HttpApi(HttpApiBase):
             self.__masked_errors.append(401)
             response, _ = self.connection.send('/api/system',
                                                None, method='GET')
-            self.connection.set_option('is_unifi_os', response.status == 200)
+            self.__update_metadata(is_unifi_os=response.status == 200)
             self.__masked_errors.remove(400)
             self.__masked_errors.remove(401)
 
+    @property
+    def response_cache(self):
+        """
+        Gives access to the cache for GET responses of this connection. The
+        cache is created on first access, so that the plugin options are
+        already available.
+
+        :returns: the response cache
+        :rtype: ResponseCache
+        """
+        if self.__cache is None:
+            self.__cache = ResponseCache(self.get_option('unifi_cache_size'),
+                                         self.get_option('unifi_cache_ttl'))
+        return self.__cache
+
+    @property
+    def session_store(self):
+        """
+        Gives access to the store for sessions which are shared between
+        connection processes.
+
+        :returns: the session store or None if sharing is disabled
+        :rtype: FileStore
+        """
+        if self.__session_store is None and \
+                self.get_option('unifi_session_path'):
+            self.__session_store = FileStore(
+                self.get_option('unifi_session_path'))
+        return self.__session_store
+
+    @property
+    def __session_key(self):
+        """
+        The key of the current controller URL and username in the session
+        store.
+
+        :rtype: str
+        """
+        return FileStore.key(self.__controller_url,
+                             self.connection.get_option('remote_user'))
+
+    def __session_expiry(self, headers):
+        """
+        Determines when a session expires. The expiry is taken from the JWT
+        of the TOKEN cookie (unifi-os) if possible, otherwise the configured
+        session lifetime is applied.
+
+        :param headers: the auth headers of the session
+        :type headers: dict
+        :returns: the timestamp when the session expires
+        :rtype: float
+        """
+        for cookie in headers.get('cookie', '').split(','):
+            name, _, value = cookie.strip().partition('=')
+            if name != 'TOKEN' or value.count('.') != 2:
+                continue
+            try:
+                payload = value.split('.')[1]
+                payload += '=' * (-len(payload) % 4)
+                return float(json_loads(urlsafe_b64decode(payload))['exp'])
+            except (KeyError, TypeError, ValueError):
+                break
+        return time() + self.get_option('unifi_session_ttl')
+
+    def __share_session(self):
+        """
+        Writes the auth headers of this connection to the session store if
+        they changed since they were last shared.
+        """
+        headers = self.connection._auth
+        if self.session_store is None or not headers or \
+                (self.__session and self.__session['headers'] == headers):
+            return
+        self.__session = {'headers': dict(headers),
+                          'expires': self.__session_expiry(headers)}
+        self.session_store.save(self.__session_key, **self.__session)
+
+    def __ensure_session(self):
+        """
+        Renews the session ahead of its expiry, so that no request has to
+        fail with a 401 error first.
+        """
+        with self.__session_lock:
+            if self.__session is None or self.__session['expires'] - \
+                    self.get_option('unifi_session_refresh') > time():
+                return
+            self.info('Session expires soon, renewing it')
+            self.login(self.connection.get_option('remote_user'),
+                       self.connection.get_option('password'))
+
+    def invalidate_cache(self, site=None, paths=None):
+        """
+        Removes cached GET responses. This method may also be invoked by
+        modules, e.g. to enforce a fresh view on the controller.
+
+        :param site: optional, only remove responses for this site
+        :type site: str
+        :param paths: optional, only remove responses for these paths (the
+            last part of the REST endpoint URI)
+        :type paths: list
+        :returns: the number of removed responses
+        :rtype: int
+        """
+        def matches(key):
+            _, _, key_site, key_path, _ = key
+            return (site is None or key_site == site) and \
+                (paths is None or key_path in paths)
+
+        count = self.response_cache.invalidate(matches)
+        if count:
+            self.debug('Invalidated {count} cached responses for {paths}',
+                       count=count, paths=paths or 'all paths')
+        return count
+
+    def get_controller_info(self):
+        """
+        Returns the metadata of the controller. The version of the controller
+        is requested once and then taken from the shared metadata.
+
+        :returns: a dict with the keys 'is_unifi_os' and 'version'
+        :rtype: dict
+        """
+        self.__check_unifi_os()
+        if 'version' not in self.__controller_metadata:
+            status = self.send_request(path='/status', path_prefix='',
+                                       site='', proxy='network', cache_ttl=0)
+            self.__update_metadata(
+                version=status.get('meta', {}).get('server_version'))
+        return {'is_unifi_os': self.is_unifi_os,
+                'version': self.__controller_metadata['version']}
+
+    def get_site_id(self, site='default'):
+        """
+        Looks up the id of a site by its name. The map of site names to ids is
+        requested once and then taken from the shared metadata, it is only
+        requested again if a site is unknown.
+
+        :param site: the name of the site
+        :type site: str
+        :returns: the id of the site or None if there is no such site
+        :rtype: str
+        """
+        sites = self.__controller_metadata.get('sites', {})
+        if site not in sites:
+            self.debug('Site {site} is unknown, requesting sites', site=site)
+            response = self.send_request(path='/sites', path_prefix='/api/',
+                                         site='self', proxy='network')
+            sites = {item['name']: item['_id'] for item in response['data']}
+            self.__update_metadata(sites=sites)
+        return sites.get(site)
+
+    def get_metrics(self):
+        """
+        Returns the request metrics which were recorded since logging was set
+        up, aggregated per endpoint.
+
+        :returns: a dict which maps endpoints to their metrics
+        :rtype: dict
+        """
+        return self.__metrics.summary()
+
     def get_logs(self):
         """
         Returns all logs that were captured by the logger.
@@ -96,7 +666,9 @@ class HttpApi(HttpApiBase):
 
     def send_request(self, data=None, path='/', proxy=None,
                      path_prefix='/api/s/', site='default', _id=None,
-                     **message_kwargs):
+                     cache_ttl=None, invalidates=None, readonly=False,
+                     result_path=None,
+                     filters=None, fields=None, limit=None, **message_kwargs):
         """
         Primary method for interaction with the UniFi REST API.
 
@@ -122,6 +694,14 @@ class HttpApi(HttpApiBase):
         - {path} is the last part of the REST endpoint URI - needs to start with
           a '/' (forward slash)
 
+        GET responses are cached per proxy, path_prefix, site, path and _id
+        until their time to live expires or any other request method is sent
+        for the same path.
+
+        If writes are deferred, updates (PUT) are queued instead and the
+        responses of GET and readonly requests include the queued updates, see
+        flush_writes.
+
         :param data: any data to submit to the UniFi REST endpoint
         :type data: dict
         :param path: the last part of the REST endpoint URI
@@ -137,23 +717,64 @@ class HttpApi(HttpApiBase):
         :type site: str
         :param _id: optional, explicit id of the object on the UniFi controller
         :type _id: str
+        :param cache_ttl: optional, time to live in seconds of a cached GET
+            response, 0 disables caching and None applies the default
+        :type cache_ttl: float
+        :param invalidates: optional, further paths whose cached responses
+            are outdated by a modifying request, e.g. a different getter path
+        :type invalidates: list
+        :param readonly: optional, marks a request with another method than GET
+            as query which does not modify any data, e.g. POST /stat/device
+            with a list of MACs, so that cached responses remain valid
+        :type readonly: bool
+        :param result_path: optional, a list of path elements to navigate the
+            response, only the value at the end of this path will be returned
+        :type result_path: list
+        :param filters: optional, only return the items of the result array
+            which have these attribute values, requires result_path
+        :type filters: dict
+        :param fields: optional, only return these attributes of the items of
+            the result array, requires result_path
+        :type fields: list
+        :param limit: optional, return at most this many items of the result
+            array, requires result_path
+        :type limit: int
         :param \\**message_kwargs: may contain 'method' to override the decision
             matrix above, other keyword arguments will be ignored
         :type \\**message_kwargs: any
         
         :returns: the response from the UniFi controller, parsed from its json
-            format
+            format, or the value at the end of the result path
         :rtype: dict
         """
+        response_data = self.__respond(data, path, proxy, path_prefix, site,
+                                       _id, cache_ttl, invalidates, readonly,
+                                       message_kwargs)
+        if result_path is None:
+            return json_loads(response_data)
+        return self.__select(response_data, result_path, filters, fields, limit)
+
+    def __respond(self, data, path, proxy, path_prefix, site, _id, cache_ttl,
+                  invalidates, readonly, message_kwargs):
+        """
+        Sends a request or answers it from the response cache or the queue of
+        deferred updates, see send_request for the parameters.
+
+        :returns: the raw response body
+        :rtype: bytes
+        """
         self.__check_unifi_os()
+        self.__ensure_session()
 
+        payload = None
         if data is not None and not isinstance(data, str):
             if not _id and '_id' in data:
                 _id = data['_id']
                 if len(data) == 1:
                     data = None
             if data:
-                data = json_dumps(data, indent=4)
+                payload = data
+                data = json_dumps(data)
 
         if self.is_unifi_os and proxy:
             proxy = '/proxy/{proxy}'.format(proxy=proxy)
@@ -178,30 +799,822 @@ class HttpApi(HttpApiBase):
         if 'method' in message_kwargs:
             method = message_kwargs['method']
 
+        cache_key = (proxy, path_prefix, site, path, _id)
+        endpoint = '{method} {path}'.format(method=method, path=path)
+        idempotent = readonly or method in HttpApi.IDEMPOTENT_METHODS
         path = path_template.format(proxy=proxy,
                                     path_prefix=path_prefix,
                                     site=site,
                                     path=path,
                                     id=_id)
 
+        if path_prefix == '/api/s/' and self.get_option('unifi_events'):
+            listener = self.__subscribe(site)
+            if cache_ttl != 0 and listener.connected and \
+                    self.__event_paths(cache_key[3]):
+                cache_ttl = max(cache_ttl or self.get_option('unifi_cache_ttl'),
+                                self.get_option('unifi_events_cache_ttl'))
+
+        # only objects of REST collections can be fetched and listed by id,
+        # other updates like the ones of settings are sent immediately
+        if method == 'PUT' and payload and _id and \
+                cache_key[3].startswith('/rest/') and \
+                self.get_option('unifi_defer_writes'):
+            response_data = self.__defer_write(
+                cache_key, payload, [cache_key[3]] + (invalidates or []))
+        elif method == 'GET' and data is None and \
+                self.get_option('unifi_cache_size') > 0:
+            # responses of requests which are pending while an event changes
+            # their collection are not stored, see ResponseCache.update
+            response_data, hit = self.response_cache.fetch(
+                cache_key,
+                lambda: self.__send(method, path, data, endpoint, idempotent),
+                cache_ttl)
+            self.debug('Cache {result} for {path}',
+                       result='hit' if hit else 'miss', path=path)
+            self.__metrics.count(endpoint, 'cache_hits' if hit else 'cache_misses')
+        else:
+            response_data = self.__send(method, path, data, endpoint,
+                                        idempotent)
+            if method != 'GET' and not readonly:
+                self.invalidate_cache(site=site,
+                                      paths=[cache_key[3]] + (invalidates or []))
+            if method == 'DELETE':
+                self.__write_queue.discard(cache_key)
+
+        # queries like POST /stat/device with a list of MACs list the same
+        # objects as GET requests and need to include the queued updates too
+        if (method == 'GET' or readonly) and self.__write_queue.pending and \
+                self.__write_queue.affects(site, cache_key[3]):
+            response = json_loads(response_data)
+            items = response.get('data') if isinstance(response, dict) \
+                else response
+            if isinstance(items, list) and \
+                    self.__write_queue.overlay(site, cache_key[3], items):
+                response_data = json_dumps(response).encode('utf-8')
+
+        return response_data
+
+    @classmethod
+    def __event_paths(cls, path):
+        """
+        Determines if responses of a path are kept up to date by events.
+
+        :param path: the last part of the REST endpoint URI
+        :type path: str
+        :rtype: bool
+        """
+        return path.startswith('/rest/') or \
+            any(path in paths for paths in cls.EVENT_PATHS.values())
+
+    def __subscribe(self, site):
+        """
+        Starts the event listener of a site if it is not running yet.
+
+        :param site: the name of the site
+        :type site: str
+        :returns: the event listener of the site
+        :rtype: EventListener
+        """
+        with self.__listener_lock:
+            listener = self.__listeners.get(site)
+            if listener is None:
+                self.info('Subscribing to events of site {site}', site=site)
+                listener = self.__listeners[site] = EventListener(
+                    lambda: self.__open_events(site),
+                    lambda message: self.__handle_event(site, message),
+                    lambda error: self.__events_lost(site, error))
+                listener.start()
+            return listener
+
+    def __open_events(self, site):
+        """
+        Opens the event websocket of a site with the auth headers of this
+        connection.
+
+        :param site: the name of the site
+        :type site: str
+        :returns: the connected websocket
+        :rtype: WebSocket
+        """
+        self.__connect()
+        use_ssl = self.connection.get_option('use_ssl')
+        ssl_context = self.__ssl_context() if use_ssl else None
+
+        auth = self.connection._auth or {}
+        headers = {}
+        if auth.get('cookie'):
+            headers['Cookie'] = '; '.join(
+                cookie.strip() for cookie in auth['cookie'].split(','))
+        if auth.get('x-csrf-token'):
+            headers['X-Csrf-Token'] = auth['x-csrf-token']
+
+        websocket = WebSocket(
+            self.connection.get_option('host'),
+            self.connection.get_option('port') or (443 if use_ssl else 80),
+            '{proxy}/wss/s/{site}/events'.format(
+                proxy='/proxy/network' if self.is_unifi_os else '', site=site),
+            headers=headers, ssl_context=ssl_context,
+            timeout=self.connection.get_option('persistent_command_timeout'))
+        websocket.connect()
+        self.info('Receiving events of site {site}', site=site)
+        return websocket
+
+    def __events_lost(self, site, error):
+        """
+        Invalidates all cached responses of a site when its event websocket
+        is disconnected, since events may be missed until it reconnects.
+
+        :param site: the name of the site
+        :type site: str
+        :param error: the error which caused the disconnect or None
+        :type error: Exception
+        """
+        self.info('Events of site {site} are unavailable: {error}', site=site,
+                  error=error or 'connection closed')
+        self.invalidate_cache(site=site)
+
+    def __handle_event(self, site, message):
+        """
+        Applies a message of the event websocket to the response cache.
+        Objects of add and sync messages replace the cached objects with the
+        same id, objects of delete messages are removed. Cached responses
+        which can't be patched, e.g. statistics, are invalidated.
+
+        :param site: the name of the site
+        :type site: str
+        :param message: the raw message
+        :type message: str
+        """
+        try:
+            message = json_loads(message)
+            object_type, _, action = message['meta']['message'].partition(':')
+            items = [item for item in message.get('data') or []
+                     if isinstance(item, dict)]
+        except (KeyError, TypeError, ValueError, AttributeError):
+            self.trace('Ignoring event {message}', message=Pretty(message))
+            return
+        if not action:
+            return
+
+        paths = self.EVENT_PATHS.get(object_type,
+                                     ['/rest/{type}'.format(type=object_type)])
+        items = [item for item in items if '_id' in item]
+        ids = set(item['_id'] for item in items)
+        if action == 'delete':
+            items = []
+        elif action not in self.EVENT_UPSERTS:
+            ids = set()
+
+        def matches(key):
+            _, path_prefix, key_site, key_path, _ = key
+            return path_prefix == '/api/s/' and key_site == site and \
+                key_path in paths
+
+        def patch(key, value):
+            if not ids or not key[3].startswith('/rest/'):
+                return None
+            if key[4] is not None:
+                if key[4] not in ids:
+                    return value
+                updated = [item for item in items if item['_id'] == key[4]]
+                return json_dumps({'meta': {'rc': 'ok'}, 'data': updated}) \
+                    .encode('utf-8') if updated else None
+            response = json_loads(value)
+            cached = response.get('data') if isinstance(response, dict) \
+                else None
+            if not isinstance(cached, list):
+                return None
+            remaining = dict((item['_id'], item) for item in items)
+            patched = []
+            for item in cached:
+                _id = item.get('_id') if isinstance(item, dict) else None
+                if _id not in ids:
+                    patched.append(item)
+                elif _id in remaining:
+                    patched.append(remaining.pop(_id))
+            patched.extend(remaining.values())
+            response['data'] = patched
+            return json_dumps(response).encode('utf-8')
+
+        count = self.response_cache.update(matches, patch)
+        self.debug('Event {event} for {ids} objects updated {count} cached '
+                   'responses', event=message['meta']['message'],
+                   ids=len(ids) or 'unknown', count=count)
+
+    def __collection_path(self, key):
+        """
+        Assembles the full path of a collection from a cache or queue key.
+
+        :param key: a tuple of (proxy, path_prefix, site, path, _id)
+        :type key: tuple
+        :rtype: str
+        """
+        proxy, path_prefix, site, path, _ = key
+        return '{proxy}{path_prefix}{site}{path}'.format(
+            proxy=proxy, path_prefix=path_prefix, site=site, path=path)
+
+    def __fetch_object(self, key):
+        """
+        Requests the current state of a single object from the controller,
+        bypassing the response cache.
+
+        :param key: a tuple of (proxy, path_prefix, site, path, _id)
+        :type key: tuple
+        :returns: the object or None if the controller returned no object
+        :rtype: dict
+        """
+        path = '{collection}/{id}'.format(
+            collection=self.__collection_path(key), id=key[4])
+        response = json_loads(self.__send(
+            'GET', path, None, 'GET {path}'.format(path=key[3]), True))
+        items = response.get('data') or [None]
+        return items[0]
+
+    def __defer_write(self, key, payload, paths):
+        """
+        Queues an update of an object instead of sending it.
+
+        :param key: a tuple of (proxy, path_prefix, site, path, _id)
+        :type key: tuple
+        :param payload: the fields to update
+        :type payload: dict
+        :param paths: the paths of the collections which list the object
+        :type paths: list
+        :returns: a response body in the format of the controller which
+            contains the object including all queued updates
+        :rtype: bytes
+        """
+        base = None
+        if key not in self.__write_queue:
+            base = self.__fetch_object(key) or {}
+        item = self.__write_queue.put(key, payload, base, paths)
+        self.debug('Deferred update of {path}/{id}',
+                   path=key[3], id=key[4])
+        return json_dumps({'meta': {'rc': 'ok', 'deferred': True},
+                           'data': [item]}).encode('utf-8')
+
+    def flush_writes(self):
+        """
+        Sends all deferred updates to the controller, one request per object.
+        An object is not updated if any of its queued fields has been changed
+        on the controller since the update was deferred.
+
+        :returns: a list with one dict per object which contains its 'site',
+            'path', '_id', the queued 'fields', the number of merged 'updates'
+            and the 'status' (flushed, conflict, missing or error) as well as
+            the 'conflicts' or the 'error' if applicable
+        :rtype: list
+        """
+        results = []
+        for key, entry in self.__write_queue.drain():
+            _, _, site, path, _id = key
+            result = {'site': site, 'path': path, '_id': _id,
+                      'fields': sorted(entry['data']),
+                      'updates': entry['count']}
+            try:
+                current = self.__fetch_object(key)
+                conflicts = WriteQueue.conflicts(entry, current or {})
+                if current is None:
+                    result['status'] = 'missing'
+                elif conflicts:
+                    result['status'] = 'conflict'
+                    result['conflicts'] = conflicts
+                else:
+                    current.update(entry['data'])
+                    self.__send('PUT', '{collection}/{id}'.format(
+                                    collection=self.__collection_path(key),
+                                    id=_id),
+                                json_dumps(current),
+                                'PUT {path}'.format(path=path), True)
+                    result['status'] = 'flushed'
+            except Exception as e:
+                result['status'] = 'error'
+                result['error'] = str(e)
+            self.invalidate_cache(site=site, paths=list(entry['paths']))
+            self.debug('Flushed {updates} deferred updates of {path}/{id}: '
+                       '{status}', updates=entry['count'], path=path, id=_id,
+                       status=result['status'])
+            results.append(result)
+        return results
+
+    def __select(self, response_data, result_path, filters, fields, limit):
+        """
+        Navigates a response along the result path. If the items of the
+        result array are filtered, projected or limited, the response is
+        parsed incrementally and only the selected items are built.
+
+        :raises KeyError: if the response doesn't include the result path
+
+        :param response_data: the raw response body
+        :type response_data: bytes
+        :param result_path: a list of path elements to navigate the response
+        :type result_path: list
+        :param filters: optional, required attribute values of the items,
+            values also match their string representation
+        :type filters: dict
+        :param fields: optional, the attributes of the items to return
+        :type fields: list
+        :param limit: optional, the maximum number of items to return
+        :type limit: int
+        :returns: the value at the end of the result path
+        :rtype: any
+        """
+        if not filters and not fields and not limit:
+            result = json_loads(response_data)
+            for attr in result_path:
+                if not isinstance(result, dict) or attr not in result:
+                    raise KeyError('UniFi API response does not include '
+                                   '{path}, misses attribute {attr}'
+                                   .format(path=', '.join(result_path),
+                                           attr=attr))
+                result = result[attr]
+            return result
+
+        stream = JsonStream(response_data)
+        stream.descend(result_path)
+        if not stream.at_array:
+            return stream.value()
+
+        filters = [(key, value, str(value))
+                   for key, value in (filters or {}).items()]
+        result = []
+        for item in stream.items():
+            if any(item.get(key) != value and item.get(key) != str_value
+                   for key, value, str_value in filters):
+                continue
+            if fields:
+                item = {key: item[key] for key in fields if key in item}
+            result.append(item)
+            if limit and len(result) >= limit:
+                break
+        self.trace('Selected {count} items from response', count=len(result))
+        return result
+
+    def __collection(self, request):
+        """
+        Returns the items of a collection as indexed collection. A parsed
+        collection is kept as long as the response cache holds the same
+        response, i.e. until it expires or it is invalidated or patched, so
+        that repeated queries neither parse the response nor rebuild indexes.
+
+        :raises ValueError: if the response doesn't contain a collection
+
+        :param request: the keyword arguments of a GET request, see
+            send_request
+        :type request: dict
+        :rtype: IndexedCollection
+        """
+        result_path = request.get('result_path')
+        if result_path is None:
+            result_path = ['data']
+        path_prefix = request.get('path_prefix', '/api/s/')
+        site = request.get('site', 'default')
+        path = request.get('path', '/')
+        response_data = self.__respond(None, path, request.get('proxy'),
+                                       path_prefix, site, None,
+                                       request.get('cache_ttl'), None, True, {})
+
+        key = (request.get('proxy'), path_prefix, site, path,
+               tuple(result_path))
+        with self.__collection_lock:
+            entry = self.__collections.get(key)
+            if entry is not None and entry[0] is response_data:
+                self.__collections.move_to_end(key)
+                return entry[1]
+
+        items = self.__select(response_data, result_path, None, None, None)
+        if not isinstance(items, list):
+            raise ValueError('UniFi API response of {path} is not a '
+                             'collection'.format(path=path))
+        collection = IndexedCollection(items)
+        with self.__collection_lock:
+            self.__collections[key] = (response_data, collection)
+            self.__collections.move_to_end(key)
+            while len(self.__collections) > self.COLLECTION_MEMO_SIZE:
+                self.__collections.popitem(last=False)
+        self.trace('Parsed {count} items of {path} for queries',
+                   count=len(collection), path=path)
+        return collection
+
+    def find(self, request, filters=None, fields=None, limit=None):
+        """
+        Queries a collection with the hash indexes of the connection, so that
+        only the matching items are passed on to the module.
+
+        :param request: the keyword arguments of a GET request for the
+            collection, see send_request
+        :type request: dict
+        :param filters: optional, required attribute values of the items,
+            integer and string values match each other
+        :type filters: dict
+        :param fields: optional, the attributes of the items to return
+        :type fields: list
+        :param limit: optional, the maximum number of items to return
+        :type limit: int
+        :returns: the matching items in collection order
+        :rtype: list
+        """
+        items = self.__collection(request).find_all(**(filters or {}))
+        if limit:
+            items = items[:limit]
+        if fields:
+            items = [{key: item[key] for key in fields if key in item}
+                     for item in items]
+        return items
+
+    def lookup_ids(self, request, values, keys=None, filters=None):
+        """
+        Resolves references to the ids of the referenced objects, e.g. names
+        of networks. Each value is looked up by the given attributes in
+        order until an object matches.
+
+        :param request: the keyword arguments of a GET request for the
+            collection, see send_request
+        :type request: dict
+        :param values: the references
+        :type values: list
+        :param keys: optional, the attributes which are looked up, defaults to
+            '_id' and 'name'
+        :type keys: list
+        :param filters: optional, further required attribute values of the
+            objects
+        :type filters: dict
+        :returns: the ids in the order of the values, None for values which
+            don't match any object
+        :rtype: list
+        """
+        collection = self.__collection(request)
+        ids = []
+        for value in values:
+            _id = None
+            for key in keys or ('_id', 'name'):
+                items = collection.find_all(**dict(filters or {},
+                                                   **{key: value}))
+                if items:
+                    _id = items[0].get('_id')
+                    break
+            ids.append(_id)
+        return ids
+
+    def diff(self, request, items, keys=None, ignore_case=('name',),
+             absent=None, fields=None):
+        """
+        Matches desired items with the objects of a collection and compares
+        them, so that only the objects which need to be updated are passed
+        on to the module in full. Each desired item is matched by the given
+        attributes in order until an object matches (like the id and name
+        comparators of ensure_item).
+
+        Objects which differ from a desired item or which are matched by
+        several desired items are returned complete. Other objects are
+        reduced to their identifying attributes, the attributes of the
+        desired item and the requested fields, which suffices to verify that
+        they are unchanged.
+
+        :param request: the keyword arguments of a GET request for the
+            collection, see send_request
+        :type request: dict
+        :param items: the desired items
+        :type items: list
+        :param keys: optional, the attributes which identify objects, defaults
+            to '_id' and 'name'
+        :type keys: list
+        :param ignore_case: attributes which are matched case invariant
+        :type ignore_case: list
+        :param absent: optional, for each desired item the attributes which
+            must not occur on its objects
+        :type absent: list
+        :param fields: optional, further attributes of unchanged objects to
+            return
+        :type fields: list
+        :returns: for each desired item the list of its matching objects
+        :rtype: list
+        """
+        collection = self.__collection(request)
+        casefolded = {}
+
+        def _match(item):
+            for key in keys or ('_id', 'name'):
+                value = item.get(key)
+                if value is None:
+                    continue
+                if key in ignore_case and isinstance(value, str):
+                    index = casefolded.get(key)
+                    if index is None:
+                        index = casefolded[key] = {}
+                        for existing in collection:
+                            existing_value = existing.get(key)
+                            if isinstance(existing_value, str):
+                                index.setdefault(existing_value.lower(),
+                                                 []).append(existing)
+                    matches = index.get(value.lower(), [])
+                else:
+                    matches = collection.find_all(**{key: value})
+                if matches:
+                    return matches
+            return []
+
+        matches = [_match(item) for item in items]
+        counts = {}
+        for existing in (existing for found in matches for existing in found):
+            counts[id(existing)] = counts.get(id(existing), 0) + 1
+
+        result = []
+        for index, (item, found) in enumerate(zip(items, matches)):
+            required_absent = absent[index] if absent else []
+            reduced = []
+            for existing in found:
+                changed = counts[id(existing)] > 1 or \
+                    any(key not in existing or existing[key] != value
+                        for key, value in item.items()) or \
+                    any(key in existing for key in required_absent)
+                if not changed:
+                    existing = {key: existing[key] for key in
+                                self.IDENTITY_FIELDS + tuple(item) +
+                                tuple(fields or ()) if key in existing}
+                reduced.append(existing)
+            result.append(reduced)
+        self.debug('Matched {count} desired items in {path}',
+                   count=len(items), path=request.get('path'))
+        return result
+
+    def send_requests(self, requests, adaptive=False):
+        """
+        Sends a batch of requests to the UniFi REST API, so that independent
+        requests only cost a single call to the persistent connection. The
+        requests are processed concurrently on a bounded thread pool if the
+        connection pool is enabled, otherwise one after the other.
+
+        :param requests: a list of dicts, each one containing the keyword
+            arguments for a call to `send_request`
+        :type requests: list
+        :param adaptive: optional, start with a single request at a time and
+            adapt the concurrency to the latency and errors of the controller
+            (AIMD), e.g. for writes which are expensive for the controller
+        :type adaptive: bool
+        :returns: a list with one dict per request (in the same order) which
+            either contains the parsed response under the key 'result' or an
+            error message under the key 'error'
+        :rtype: list
+        """
+        self.__check_unifi_os()
+        self.__connect()
+        self.__ensure_session()
+
+        max_workers = min(len(requests), self.get_option('unifi_max_workers'))
+        if self.connection_pool is None:
+            # the connection plugin can't send requests concurrently
+            max_workers = 1
+        limiter = AimdLimiter(max_workers) \
+            if adaptive and max_workers > 1 else None
+
+        def _send(request):
+            if limiter is not None:
+                limiter.acquire()
+            started = perf_counter()
+            error = False
+            try:
+                return {'result': self.send_request(**request)}
+            except Exception as e:
+                error = True
+                return {'error': str(e)}
+            finally:
+                if limiter is not None:
+                    limiter.release(perf_counter() - started, error)
+
+        if max_workers < 2:
+            return [_send(request) for request in requests]
+
+        self.debug('Sending batch of {count} requests using {workers} workers',
+                   count=len(requests), workers=max_workers)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            responses = list(executor.map(_send, requests))
+        if limiter is not None:
+            self.debug('Adaptive batch reached a concurrency of {peak}, final '
+                       'limit {limit}', peak=limiter.peak, limit=limiter.limit)
+        return responses
+
+    def __send(self, method, path, data, endpoint, idempotent=False):
+        """
+        Sends a single request to the UniFi controller. Idempotent requests
+        are retried with exponential backoff if the controller is busy or the
+        connection failed.
+
+        :param method: the HTTP method
+        :type method: str
+        :param path: the full path of the REST endpoint URI
+        :type path: str
+        :param data: the serialized request body or None
+        :type data: str
+        :param endpoint: the name under which metrics are recorded
+        :type endpoint: str
+        :param idempotent: the request may be repeated safely
+        :type idempotent: bool
+        :returns: the raw response body
+        :rtype: bytes
+        """
+        return self.__retrying(
+            lambda: self.__send_once(method, path, data, endpoint),
+            method, path, endpoint, idempotent)
+
+    def __retrying(self, request, method, path, endpoint, idempotent):
+        """
+        Invokes a request and retries it with exponential backoff (or the
+        delay requested by Retry-After) if the controller is busy or the
+        connection failed, as long as the request is idempotent.
+
+        :param request: callable without arguments which sends the request
+        :type request: function
+        :param method: the HTTP method, only used for logging
+        :type method: str
+        :param path: the full path of the REST endpoint URI, only used for
+            logging
+        :type path: str
+        :param endpoint: the name under which metrics are recorded
+        :type endpoint: str
+        :param idempotent: the request may be repeated safely
+        :type idempotent: bool
+        :returns: the result of the request
+        :rtype: any
+        """
+        attempt = 0
+        while True:
+            try:
+                return request()
+            except HTTPError:
+                raise
+            except (RetryableError, AnsibleConnectionFailure, OSError) as e:
+                delay = self.__retry_delay(e, attempt) if idempotent else None
+                if delay is None:
+                    if isinstance(e, RetryableError):
+                        raise Exception(str(e))
+                    raise
+                attempt += 1
+                self.debug('Retrying {method} {path} in {delay:.2f}s '
+                           '(attempt {attempt}): {error}', method=method,
+                           path=path, delay=delay, attempt=attempt, error=e)
+                self.__metrics.count(endpoint, 'retries')
+                self.__metrics.count(endpoint, 'retry_delay_s', delay)
+                sleep(delay)
+
+    def __retry_delay(self, error, attempt):
+        """
+        Determines the delay before the next retry of a failed request and
+        takes a retry from the budget of this connection.
+
+        :param error: the error of the failed attempt
+        :type error: Exception
+        :param attempt: the number of retries so far
+        :type attempt: int
+        :returns: the delay in seconds or None if the request must not be
+            retried anymore
+        :rtype: float
+        """
+        if attempt >= self.get_option('unifi_retries'):
+            return None
+        with self.__retry_lock:
+            if self.__retry_budget is None:
+                self.__retry_budget = self.get_option('unifi_retry_budget')
+            if self.__retry_budget <= 0:
+                self.debug('Retry budget of this connection is exhausted')
+                return None
+            self.__retry_budget -= 1
+
+        max_delay = self.get_option('unifi_retry_max_delay')
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            return min(retry_after, max_delay)
+        # exponential backoff with full jitter
+        return uniform(0, min(max_delay, self.get_option('unifi_retry_backoff')
+                              * 2 ** attempt))
+
+    def __send_once(self, method, path, data, endpoint):
+        """
+        Sends a single request to the UniFi controller without retries.
+
+        :param method: the HTTP method
+        :type method: str
+        :param path: the full path of the REST endpoint URI
+        :type path: str
+        :param data: the serialized request body or None
+        :type data: str
+        :param endpoint: the name under which metrics are recorded
+        :type endpoint: str
+        :returns: the raw response body
+        :rtype: bytes
+        """
+        started = perf_counter() if self.__metrics.enabled else None
         self.debug('Sending request: {method} {path}',
                     method=method, path=path)
         if data:
-            self.trace('Data: {data}', data=data)
+            self.trace('Data: {data}', data=Pretty(data))
 
-        response, response_data = self.connection.send(
-            path, data, method=method
-        )
+        # failed requests are recorded with the status of the error or
+        # without status if no response was received
+        status = None
+        response_data = b''
+        try:
+            if self.connection_pool is not None:
+                response, response_data = self.__pooled_send(method, path,
+                                                             data)
+            else:
+                response, response_data = self.connection.send(
+                    path, data, method=method
+                )
+            status = response.status
+            response_data = response_data.getvalue()
+        except (HTTPError, ControllerError) as e:
+            status = e.code
+            raise
+        finally:
+            if started is not None:
+                self.__metrics.record(endpoint, perf_counter() - started,
+                                      status,
+                                      len(data.encode('utf-8')) if data else 0,
+                                      len(response_data))
 
         self.debug('Response received: {status} ({path})',
-                    status=response.status, path=path)
+                    status=status, path=path)
 
-        return json_load(response_data)
+        self.__reauthenticated = False
+        self.__share_session()
+        return response_data
+
+    def __connect(self):
+        """
+        Establishes the connection (i.e. logs in) if this has not happened
+        yet, since requests over the connection pool bypass the connection
+        plugin.
+        """
+        with self.__connect_lock:
+            if not self.connection.connected:
+                self.connection._connect()
+
+    def __pooled_send(self, method, path, data):
+        """
+        Sends a single request to the UniFi controller over a keep-alive
+        connection, following the same conventions as the send method of the
+        connection plugin regarding authentication and error handling.
+
+        :raises AnsibleConnectionFailure: if the controller is unreachable
+
+        :param method: the HTTP method
+        :type method: str
+        :param path: the full path of the REST endpoint URI
+        :type path: str
+        :param data: the serialized request body or None
+        :type data: str
+        :returns: a tuple of the response object and a buffer with the
+            response body
+        :rtype: tuple
+        """
+        self.__connect()
+
+        while True:
+            try:
+                response, response_data, wire_size = \
+                    self.connection_pool.request(
+                        method, path,
+                        body=data.encode('utf-8') if data else None,
+                        headers=self.connection._auth)
+            except OSError as e:
+                raise AnsibleConnectionFailure(
+                    'Could not connect to {path}: {error}'
+                    .format(path=path, error=e))
+
+            if wire_size != len(response_data):
+                self.debug('Received {raw} bytes as {encoding} encoded '
+                           '{wire} bytes ({path})', raw=len(response_data),
+                           wire=wire_size, path=path,
+                           encoding=response.getheader('content-encoding'))
+
+            if response.status < 400:
+                break
+
+            exc = HTTPError(self.connection._url + path, response.status,
+                            response.reason, response.headers,
+                            BytesIO(response_data))
+            handled = self.handle_httperror(exc)
+            if handled is False:
+                raise exc
+            if handled is not True:
+                response = handled
+                break
+
+        self.connection._auth = self.update_auth(
+            response, BytesIO(response_data)) or self.connection._auth
+        return response, BytesIO(response_data)
 
     def login(self, username, password):
         """
         Call the login endpoint for the UniFi REST API.
 
+        If session sharing is enabled, a valid session of another connection
+        process is reused instead. The login is performed while holding the
+        lock on the session store, so that concurrent processes wait for a
+        single login instead of all logging in at once.
+
         :param username: the API username
         :type username: str
         :param password: the API password
@@ -209,13 +1622,42 @@ class HttpApi(HttpApiBase):
         """
         self.__check_unifi_os()
 
+        if self.session_store is None:
+            self.__login(username, password)
+            return
+
+        with self.session_store.locked():
+            session = self.session_store.load(self.__session_key)
+            if session and session['headers'] != self.connection._auth and \
+                    session['expires'] - \
+                    self.get_option('unifi_session_refresh') > time():
+                self.info('Reusing shared session')
+                self.connection._auth = dict(session['headers'])
+                self.__session = session
+                return
+
+            self.__login(username, password)
+            self.__share_session()
+
+    def __login(self, username, password):
+        """
+        Call the login endpoint for the UniFi REST API. A login which is
+        rate limited or fails while the controller is busy is retried like
+        any idempotent request, honouring Retry-After.
+
+        :param username: the API username
+        :type username: str
+        :param password: the API password
+        :type password: str
+        """
         data = {'username': username, 'password': password}
         path = '/api/auth/login' if self.is_unifi_os else '/api/login'
 
         self.info('Starting Authentication with username and password')
-        self.connection.send(
-            path, json_dumps(data), method='POST'
-        )
+        self.__retrying(
+            lambda: self.connection.send(path, json_dumps(data),
+                                         method='POST'),
+            'POST', path, 'POST {path}'.format(path=path), idempotent=True)
 
     def update_auth(self, response, response_text):
         """
@@ -249,9 +1691,29 @@ class HttpApi(HttpApiBase):
     def logout(self):
         """
         Method to clear session gracefully by invoking the logout REST endpoint.
+
+        Shared sessions are kept alive for other connection processes, in this
+        case only the local state is cleared.
         """
         self.info('Logging out')
 
+        if self.__write_queue.pending:
+            for result in self.flush_writes():
+                if result['status'] != 'flushed':
+                    self.info('Deferred update of {path}/{id} was not '
+                              'flushed: {status}', path=result['path'],
+                              id=result['_id'], status=result['status'])
+        with self.__listener_lock:
+            for listener in self.__listeners.values():
+                listener.stop()
+            self.__listeners.clear()
+        if self.__cache is not None:
+            self.__cache.invalidate()
+        if self.__pool is not None:
+            self.__pool.close()
+        if self.session_store is not None:
+            return
+
         self.__check_unifi_os()
         data = {}
         path = '/api/auth/logout' if self.is_unifi_os else '/api/logout'
@@ -260,10 +1722,36 @@ class HttpApi(HttpApiBase):
             path, json_dumps(data), method='POST'
         )
 
+    @classmethod
+    def __parse_retry_after(cls, headers):
+        """
+        Parses the Retry-After header of a response.
+
+        :param headers: the response headers
+        :type headers: http.client.HTTPMessage
+        :returns: the requested delay in seconds or None
+        :rtype: float
+        """
+        value = headers.get('retry-after') if headers else None
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
     def handle_httperror(self, exc):
         """
         Handles non 2xx HTTP response codes.
 
+        :raises RetryableError: if the controller is temporarily unable to
+            process the request (HTTP 429, 502, 503, 504)
+        :raises ControllerError: for any other error which is not masked
+
         :param exc: the HTTP error object
         :type exc: urllib.error.HttpError
 
@@ -285,12 +1773,30 @@ class HttpApi(HttpApiBase):
             return exc
 
         self.debug('Got error {code} {path}', code=exc.code, path=exc.filename)
+        if exc.code == 401 and self.connection._auth:
+            if self.__reauthenticated:
+                self.debug('Still unauthorized after renewing the session')
+                return False
+            if self.session_store is not None:
+                self.session_store.discard(self.__session_key,
+                                           headers=self.connection._auth)
+            self.__reauthenticated = True
+            self.connection._auth = None
+            self.login(self.connection.get_option('remote_user'),
+                       self.connection.get_option('password'))
+            return True
+
         result = super(HttpApi, self).handle_httperror(exc)
         if result == exc:
             message = exc.read().decode('utf-8')
             self.trace('Message was {message}', message=message)
-            raise Exception('Controller at {path} returned {exc}{message}'
-                            .format(path=exc.filename,
-                                    exc=str(exc),
-                                    message=message))
+            if exc.code in HttpApi.RETRYABLE_CODES:
+                raise RetryableError(
+                    'Controller at {path} returned {exc}{message}'
+                    .format(path=exc.filename, exc=str(exc), message=message),
+                    exc.code, self.__parse_retry_after(exc.headers))
+            raise ControllerError('Controller at {path} returned {exc}{message}'
+                                  .format(path=exc.filename,
+                                          exc=str(exc),
+                                          message=message), exc.code)
         return result
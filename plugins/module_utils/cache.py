@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from collections import OrderedDict
+from threading import Event, Lock
+from time import monotonic
+
+
+class ResponseCache(object):
+    """
+    A thread safe LRU cache for raw response bodies with a byte budget and a
+    time to live per entry.
+
+    Identical concurrent lookups are collapsed, i.e. only the first caller
+    loads the value while all other callers wait for its result.
+
+    :ivar __entries: the cached entries in least recently used order, maps
+        keys to tuples of (expiry, value)
+    :vartype __entries: OrderedDict
+    :ivar __inflight: maps keys to events for lookups which are currently
+        being loaded
+    :vartype __inflight: dict
+    :ivar __stale: keys of lookups which are currently being loaded and
+        were invalidated meanwhile, their values must not be stored
+    :vartype __stale: set
+    """
+
+    def __init__(self, max_bytes, default_ttl):
+        """
+        Initialize self.
+
+        :param max_bytes: the maximum number of bytes held by this cache
+        :type max_bytes: int
+        :param default_ttl: the time to live in seconds for entries which are
+            stored without an explicit time to live
+        :type default_ttl: float
+        """
+        self.__max_bytes = max_bytes
+        self.__default_ttl = default_ttl
+        self.__size = 0
+        self.__entries = OrderedDict()
+        self.__inflight = {}
+        self.__stale = set()
+        self.__lock = Lock()
+
+    @property
+    def size(self):
+        """
+        The number of bytes currently held by this cache.
+
+        :rtype: int
+        """
+        return self.__size
+
+    def __ttl(self, ttl):
+        return self.__default_ttl if ttl is None else ttl
+
+    def __remove(self, key):
+        _, value = self.__entries.pop(key)
+        self.__size -= len(value)
+
+    def get(self, key):
+        """
+        Looks up a value and marks it as recently used.
+
+        :param key: the cache key
+        :type key: tuple
+        :returns: the cached value or None if it is missing or expired
+        :rtype: bytes
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= monotonic():
+                self.__remove(key)
+                return None
+            self.__entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value, ttl=None):
+        """
+        Stores a value, evicting least recently used entries until the cache
+        fits its byte budget. Values which exceed the budget on their own or
+        have a time to live of zero are not stored.
+
+        :param key: the cache key
+        :type key: tuple
+        :param value: the raw value
+        :type value: bytes
+        :param ttl: optional time to live in seconds
+        :type ttl: float
+        """
+        with self.__lock:
+            self.__put(key, value, ttl)
+
+    def __put(self, key, value, ttl):
+        ttl = self.__ttl(ttl)
+        if key in self.__entries:
+            self.__remove(key)
+        if ttl <= 0 or len(value) > self.__max_bytes:
+            return
+        self.__entries[key] = (monotonic() + ttl, value)
+        self.__size += len(value)
+        while self.__size > self.__max_bytes:
+            self.__remove(next(iter(self.__entries)))
+
+    def __mark_stale(self, predicate):
+        # loads which are in flight may have been answered before the change
+        # which caused the invalidation
+        self.__stale.update(key for key in self.__inflight
+                            if predicate is None or predicate(key))
+
+    def fetch(self, key, loader, ttl=None):
+        """
+        Returns the cached value for a key or loads it with the loader.
+        Concurrent calls for the same key will only invoke the loader once.
+        The loaded value is not stored if the key is invalidated while it is
+        being loaded, since it may predate the change.
+
+        :param key: the cache key
+        :type key: tuple
+        :param loader: callable without arguments which returns the raw value
+        :type loader: function
+        :param ttl: optional time to live in seconds
+        :type ttl: float
+        :returns: a tuple of the value and a flag whether it was a cache hit
+        :rtype: tuple
+        """
+        while True:
+            value = self.get(key)
+            if value is not None:
+                return value, True
+            with self.__lock:
+                event = self.__inflight.get(key)
+                if event is None:
+                    event = self.__inflight[key] = Event()
+                    break
+            event.wait()
+
+        try:
+            value = loader()
+            with self.__lock:
+                if key not in self.__stale:
+                    self.__put(key, value, ttl)
+            return value, False
+        finally:
+            with self.__lock:
+                self.__inflight.pop(key, None)
+                self.__stale.discard(key)
+            event.set()
+
+    def invalidate(self, predicate=None):
+        """
+        Removes entries from the cache.
+
+        :param predicate: optional callable which accepts a key and returns
+            True if the entry should be removed, if omitted all entries will
+            be removed
+        :type predicate: function
+        :returns: the number of removed entries
+        :rtype: int
+        """
+        with self.__lock:
+            self.__mark_stale(predicate)
+            keys = [key for key in self.__entries
+                    if predicate is None or predicate(key)]
+            for key in keys:
+                self.__remove(key)
+            return len(keys)
+
+    def update(self, predicate, transform):
+        """
+        Replaces the values of entries in place, e.g. to apply a change which
+        is known to have happened on the server. The entries keep their
+        expiry and their position in the LRU order.
+
+        :param predicate: callable which accepts a key and returns True if the
+            entry should be transformed
+        :type predicate: function
+        :param transform: callable which accepts a key and its value and
+            returns the new value, or None to remove the entry
+        :type transform: function
+        :returns: the number of transformed or removed entries
+        :rtype: int
+        """
+        with self.__lock:
+            self.__mark_stale(predicate)
+            keys = [key for key in self.__entries if predicate(key)]
+            for key in keys:
+                expiry, value = self.__entries[key]
+                value = transform(key, value)
+                if value is None or len(value) > self.__max_bytes:
+                    self.__remove(key)
+                    continue
+                self.__size += len(value) - len(self.__entries[key][1])
+                self.__entries[key] = (expiry, value)
+            while self.__size > self.__max_bytes:
+                self.__remove(next(iter(self.__entries)))
+            return len(keys)
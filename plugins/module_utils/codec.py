@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from codecs import getincrementaldecoder
+from hashlib import blake2b
+from json import dumps as json_dumps, loads as json_loads, JSONDecoder
+from re import compile as re_compile
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def dumps(obj):
+    """
+    Serializes an object to compact JSON for transmission. Uses orjson if
+    it is installed and the object is supported by it, else the json module
+    of the standard library.
+
+    :param obj: the object to serialize
+    :type obj: any
+    :returns: the JSON document
+    :rtype: str
+    """
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(obj).decode('utf-8')
+        except TypeError:
+            pass
+    return json_dumps(obj, separators=(',', ':'))
+
+
+def loads(data):
+    """
+    Parses a JSON document. Uses orjson if it is installed, else the json
+    module of the standard library.
+
+    :param data: the JSON document
+    :type data: bytes or str
+    :returns: the parsed object
+    :rtype: any
+    """
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json_loads(data)
+
+
+def fingerprint(obj):
+    """
+    Calculates a stable hash of an object from its canonical JSON form, i.e.
+    with sorted keys and without whitespace. Equal fingerprints imply equal
+    objects, so comparing fingerprints can replace a field by field
+    comparison.
+
+    :param obj: the object, must be serializable to JSON
+    :type obj: any
+    :returns: the hex digest of the hash
+    :rtype: str
+    """
+    if HAS_ORJSON:
+        try:
+            data = orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            data = None
+        if data is not None:
+            return blake2b(data, digest_size=16).hexdigest()
+    return blake2b(json_dumps(obj, sort_keys=True, separators=(',', ':'))
+                   .encode('utf-8'), digest_size=16).hexdigest()
+
+
+class Pretty(object):
+    """
+    Wrapper which renders an object as indented JSON when it is formatted,
+    e.g. by the logger. Since the logger only formats messages which pass the
+    log level, the rendering cost only applies if the message is actually
+    logged.
+    """
+
+    def __init__(self, obj):
+        """
+        Initialize self.
+
+        :param obj: the object to render, strings are assumed to be JSON
+            documents and will be rendered as they are if they can't be parsed
+        :type obj: any
+        """
+        self.__obj = obj
+
+    def __str__(self):
+        obj = self.__obj
+        if isinstance(obj, (str, bytes)):
+            try:
+                obj = loads(obj)
+            except ValueError:
+                return obj if isinstance(obj, str) \
+                    else obj.decode('utf-8', 'replace')
+        return json_dumps(obj, indent=4, default=str)
+
+    def __format__(self, format_spec):
+        return format(str(self), format_spec)
+
+
+class JsonStream(object):
+    """
+    Incremental parser for large JSON documents. The parser descends into
+    the document along a path of object keys and then yields the items of
+    the array found there one at a time, so that only the items which are
+    consumed are ever built. Values which are not on the path are parsed and
+    dropped one by one.
+
+    Example:
+
+    * stream = JsonStream(response_data)
+    * stream.descend(['data'])
+    * names = [item['name'] for item in stream.items()]
+
+    :ivar __buffer: the decoded but not yet consumed part of the document
+    :vartype __buffer: str
+    :ivar __pos: the current position in the buffer
+    :vartype __pos: int
+    """
+
+    #: size of the chunks in which the document is decoded
+    CHUNK_SIZE = 65536
+
+    __DECODER = JSONDecoder()
+    __WHITESPACE = re_compile(r'[ \t\n\r]*')
+
+    def __init__(self, data, chunk_size=None):
+        """
+        Initialize self.
+
+        :param data: the JSON document or an iterable of chunks of it
+        :type data: bytes or str or iterable
+        :param chunk_size: optional size of the chunks in which a complete
+            document is decoded
+        :type chunk_size: int
+        """
+        if isinstance(data, (bytes, bytearray, str)):
+            document = data
+            chunk_size = chunk_size or self.CHUNK_SIZE
+            data = (document[i:i + chunk_size]
+                    for i in range(0, len(document), chunk_size))
+        self.__chunks = iter(data)
+        self.__decoder = getincrementaldecoder('utf-8')()
+        self.__buffer = ''
+        self.__pos = 0
+        self.__eof = False
+
+    def __more(self, min_size=0):
+        """
+        Decodes further chunks of the document and drops the consumed part of
+        the buffer.
+
+        :raises ValueError: if the document has already been read completely
+
+        :param min_size: decode chunks until at least this many characters
+            are available after the current position
+        :type min_size: int
+        """
+        if self.__eof:
+            raise ValueError('Unexpected end of JSON document')
+        parts = [self.__buffer[self.__pos:]]
+        size = len(parts[0])
+        while True:
+            chunk = next(self.__chunks, None)
+            if chunk is None:
+                parts.append(self.__decoder.decode(b'', final=True))
+                self.__eof = True
+                break
+            text = chunk if isinstance(chunk, str) \
+                else self.__decoder.decode(chunk)
+            parts.append(text)
+            size += len(text)
+            if size > min_size:
+                break
+        self.__buffer = ''.join(parts)
+        self.__pos = 0
+
+    def __peek(self):
+        """
+        Skips whitespace and returns the next character of the document.
+
+        :rtype: str
+        """
+        while True:
+            self.__pos = self.__WHITESPACE.match(self.__buffer,
+                                                 self.__pos).end()
+            if self.__pos < len(self.__buffer):
+                return self.__buffer[self.__pos]
+            self.__more()
+
+    def __expect(self, characters):
+        """
+        Consumes the next character of the document.
+
+        :raises ValueError: if the character is not one of the expected ones
+
+        :param characters: the expected characters
+        :type characters: str
+        :returns: the consumed character
+        :rtype: str
+        """
+        character = self.__peek()
+        if character not in characters:
+            raise ValueError('Expected one of {expected} but got {got} in JSON '
+                             'document'.format(expected=list(characters),
+                                               got=character))
+        self.__pos += 1
+        return character
+
+    def value(self):
+        """
+        Parses the next complete value of the document.
+
+        :returns: the parsed value
+        :rtype: any
+        """
+        self.__peek()
+        while True:
+            try:
+                value, end = self.__DECODER.raw_decode(self.__buffer,
+                                                       self.__pos)
+                # a number at the end of the buffer may still be incomplete
+                if end < len(self.__buffer) or self.__eof:
+                    self.__pos = end
+                    return value
+            except ValueError:
+                if self.__eof:
+                    raise
+            # double the available input to keep re-parsing linear
+            self.__more(2 * (len(self.__buffer) - self.__pos))
+
+    def descend(self, path):
+        """
+        Moves to the value at the end of a path of object keys.
+
+        :raises KeyError: if the document doesn't include the path
+
+        :param path: a list of object keys
+        :type path: list
+        """
+        for attr in path:
+            self.__expect('{')
+            separator = ',' if self.__peek() != '}' else '}'
+            while separator == ',':
+                key = self.value()
+                self.__expect(':')
+                if key == attr:
+                    break
+                self.value()
+                separator = self.__expect(',}')
+            else:
+                raise KeyError('JSON document does not include {path}, misses '
+                               'attribute {attr}'
+                               .format(path=', '.join(path), attr=attr))
+
+    @property
+    def at_array(self):
+        """
+        Indicates if the next value of the document is an array.
+
+        :rtype: bool
+        """
+        return self.__peek() == '['
+
+    def items(self):
+        """
+        Yields the items of the array which is the next value of the document
+        one at a time.
+
+        :returns: a generator of the array items
+        :rtype: generator
+        """
+        self.__expect('[')
+        if self.__peek() == ']':
+            self.__pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.__expect(',]') == ']':
+                return
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from collections.abc import Sequence
+
+
+class IndexedCollection(Sequence):
+    """
+    A read-only view of a collection of UniFi objects which answers lookups
+    by attribute values with hash indexes. An index is built on first use
+    for each combination of filtered attributes, so that repeated lookups
+    only cost a single hash access.
+
+    Integers and strings are normalized to the same key, i.e. a filter value
+    of 503 matches the attribute values 503 and '503' and vice versa. Missing
+    attributes match None. Lookups return the items in collection order, so
+    that the first match is the same as with a linear scan.
+
+    Example:
+
+    * networks = IndexedCollection(unifi.get_networkconfs())
+    * networks.find(vlan=503)
+    * networks.find_all(purpose='corporate')
+
+    :ivar __indexes: maps tuples of attribute names to their index, which
+        maps tuples of normalized values to the positions of the items
+    :vartype __indexes: dict
+    """
+
+    def __init__(self, items):
+        """
+        Initialize self.
+
+        :param items: the objects of the collection
+        :type items: iterable
+        """
+        self.__items = list(items)
+        self.__indexes = {}
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __getitem__(self, position):
+        return self.__items[position]
+
+    @classmethod
+    def normalize(cls, value):
+        """
+        Normalizes an attribute value to its index key.
+
+        :param value: the attribute value
+        :type value: any
+        :returns: the index key, strings for integers and strings
+        :rtype: any
+        """
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, (int, str)):
+            return str(value)
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return value
+
+    def __index(self, fields):
+        """
+        Returns the index for a combination of attributes, building it if
+        needed. Items with values which can't be hashed (e.g. lists) are not
+        indexed, they can't be equal to a hashable filter value anyway.
+
+        :param fields: the sorted attribute names
+        :type fields: tuple
+        :rtype: dict
+        """
+        index = self.__indexes.get(fields)
+        if index is None:
+            index = self.__indexes[fields] = {}
+            for position, item in enumerate(self.__items):
+                key = tuple(self.normalize(item.get(field)) for field in fields)
+                try:
+                    index.setdefault(key, []).append(position)
+                except TypeError:
+                    pass
+        return index
+
+    def find_all(self, **filters):
+        """
+        Looks up all items which have the given attribute values.
+
+        :param \\**filters: the required attribute values
+        :type \\**filters: any
+        :returns: the matching items in collection order
+        :rtype: list
+        """
+        if not filters:
+            return list(self.__items)
+        fields = tuple(sorted(filters))
+        key = tuple(self.normalize(filters[field]) for field in fields)
+        try:
+            positions = self.__index(fields).get(key, [])
+        except TypeError:
+            # unhashable filter values can only be compared one by one
+            return [item for item in self.__items
+                    if all(item.get(field) == value
+                           for field, value in filters.items())]
+        return [self.__items[position] for position in positions]
+
+    def find(self, **filters):
+        """
+        Looks up the first item which has the given attribute values.
+
+        :param \\**filters: the required attribute values
+        :type \\**filters: any
+        :returns: the first matching item or None
+        :rtype: dict
+        """
+        items = self.find_all(**filters) if filters else self.__items
+        return items[0] if items else None
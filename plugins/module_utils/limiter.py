@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from threading import Condition
+
+
+class AimdLimiter(object):
+    """
+    A concurrency limit which adapts to the load of the server with additive
+    increase and multiplicative decrease (AIMD). Every successful request
+    raises the limit by 1/limit, i.e. by about one per round of requests.
+    An error or a latency above a multiple of the lowest latency seen so far
+    is taken as a sign of congestion and cuts the limit, at most once per
+    round of requests.
+
+    Example:
+
+    * limiter.acquire()
+    * ... send the request ...
+    * limiter.release(latency, error)
+
+    :ivar __since_decrease: number of requests which completed since the
+        limit was decreased last
+    :vartype __since_decrease: int
+    """
+
+    def __init__(self, maximum, initial=1, minimum=1, decrease_factor=0.5,
+                 latency_tolerance=2.0):
+        """
+        Initialize self.
+
+        :param maximum: the upper bound of the limit
+        :type maximum: int
+        :param initial: the initial limit
+        :type initial: int
+        :param minimum: the lower bound of the limit
+        :type minimum: int
+        :param decrease_factor: the factor which is applied to the limit on
+            congestion
+        :type decrease_factor: float
+        :param latency_tolerance: latencies above this multiple of the lowest
+            latency indicate congestion
+        :type latency_tolerance: float
+        """
+        self.__maximum = max(maximum, minimum)
+        self.__minimum = minimum
+        self.__limit = float(min(max(initial, minimum), self.__maximum))
+        self.__decrease_factor = decrease_factor
+        self.__latency_tolerance = latency_tolerance
+        self.__min_latency = None
+        self.__since_decrease = 0
+        self.__active = 0
+        self.__peak = 0
+        self.__condition = Condition()
+
+    @property
+    def limit(self):
+        """
+        The current number of requests which may be active concurrently.
+
+        :rtype: int
+        """
+        return int(self.__limit)
+
+    @property
+    def peak(self):
+        """
+        The highest number of requests which were active concurrently.
+
+        :rtype: int
+        """
+        return self.__peak
+
+    def acquire(self):
+        """
+        Waits until another request may be started.
+        """
+        with self.__condition:
+            while self.__active >= int(self.__limit):
+                self.__condition.wait()
+            self.__active += 1
+            self.__peak = max(self.__peak, self.__active)
+
+    def release(self, latency=None, error=False):
+        """
+        Marks a request as completed and adapts the limit.
+
+        :param latency: the duration of the request in seconds
+        :type latency: float
+        :param error: True if the request failed
+        :type error: bool
+        """
+        with self.__condition:
+            self.__active -= 1
+            congested = error
+            if latency is not None:
+                if self.__min_latency is None or latency < self.__min_latency:
+                    self.__min_latency = latency
+                elif latency > self.__min_latency * self.__latency_tolerance:
+                    congested = True
+
+            if not congested:
+                self.__limit = min(self.__maximum,
+                                   self.__limit + 1.0 / self.__limit)
+            elif self.__since_decrease >= int(self.__limit):
+                self.__limit = max(self.__minimum,
+                                   self.__limit * self.__decrease_factor)
+                self.__since_decrease = 0
+            self.__since_decrease += 1
+            self.__condition.notify_all()
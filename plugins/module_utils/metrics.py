@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from threading import Lock
+
+
+class MetricsRegistry(object):
+    """
+    A lightweight registry for request metrics which are aggregated per
+    endpoint. A disabled registry ignores all records, callers should check
+    `enabled` before collecting any values that are expensive to obtain.
+
+    :ivar __endpoints: maps endpoint names to their raw metrics
+    :vartype __endpoints: dict
+    """
+
+    def __init__(self, enabled=False):
+        """
+        Initialize self.
+
+        :param enabled: whether metrics should be recorded
+        :type enabled: bool
+        """
+        self.enabled = enabled
+        self.__endpoints = {}
+        self.__lock = Lock()
+
+    def __endpoint(self, endpoint):
+        metrics = self.__endpoints.get(endpoint)
+        if metrics is None:
+            metrics = self.__endpoints[endpoint] = {
+                'durations': [], 'status': {}, 'counters': {},
+                'request_bytes': 0, 'response_bytes': 0
+            }
+        return metrics
+
+    def record(self, endpoint, duration, status, request_bytes=0,
+               response_bytes=0):
+        """
+        Records a request which was sent to the controller.
+
+        :param endpoint: the name of the endpoint, e.g. 'GET /rest/networkconf'
+        :type endpoint: str
+        :param duration: the wall time of the request in seconds
+        :type duration: float
+        :param status: the HTTP status of the response or None if the
+            request failed without a response
+        :type status: int
+        :param request_bytes: the size of the request body
+        :type request_bytes: int
+        :param response_bytes: the size of the response body
+        :type response_bytes: int
+        """
+        if not self.enabled:
+            return
+        with self.__lock:
+            metrics = self.__endpoint(endpoint)
+            metrics['durations'].append(duration)
+            metrics['status'][status] = metrics['status'].get(status, 0) + 1
+            metrics['request_bytes'] += request_bytes
+            metrics['response_bytes'] += response_bytes
+
+    def count(self, endpoint, counter, value=1):
+        """
+        Increments a counter of an endpoint, e.g. for cache hits or retries.
+
+        :param endpoint: the name of the endpoint
+        :type endpoint: str
+        :param counter: the name of the counter
+        :type counter: str
+        :param value: the increment
+        :type value: float
+        """
+        if not self.enabled:
+            return
+        with self.__lock:
+            counters = self.__endpoint(endpoint)['counters']
+            counters[counter] = counters.get(counter, 0) + value
+
+    @classmethod
+    def percentile(cls, values, percent):
+        """
+        Calculates a percentile with the nearest rank method.
+
+        :param values: the sorted values
+        :type values: list
+        :param percent: the percentile, between 0 and 100
+        :type percent: float
+        :returns: the percentile or None if there are no values
+        :rtype: float
+        """
+        if not values:
+            return None
+        rank = max(int(-(-percent * len(values) // 100)), 1)
+        return values[rank - 1]
+
+    def summary(self):
+        """
+        Aggregates the recorded metrics per endpoint. Durations are given in
+        milliseconds, requests which failed without a response are counted
+        under the status 'failed'.
+
+        :returns: a dict which maps endpoint names to their aggregated metrics
+        :rtype: dict
+        """
+        result = {}
+        with self.__lock:
+            for endpoint, metrics in self.__endpoints.items():
+                durations = sorted(metrics['durations'])
+                result[endpoint] = dict(
+                    metrics['counters'],
+                    count=len(durations),
+                    total_ms=round(sum(durations) * 1000, 3),
+                    p50_ms=round(self.percentile(durations, 50) * 1000, 3)
+                    if durations else None,
+                    p95_ms=round(self.percentile(durations, 95) * 1000, 3)
+                    if durations else None,
+                    status={'failed' if status is None else str(status):
+                            count for status, count
+                            in metrics['status'].items()},
+                    request_bytes=metrics['request_bytes'],
+                    response_bytes=metrics['response_bytes']
+                )
+        return result
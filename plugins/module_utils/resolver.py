@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from ansible_collections.gmeiner.unifi.plugins.module_utils.collection import \
+    IndexedCollection
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi_api import \
+    apgroups, ccode, networkconf, portconf
+
+
+class Resolver(object):
+    """
+    Resolves references to UniFi objects (names, VLANs or ids) to their ids
+    with lookup_ids of the UniFi helper, i.e. with the hash indexes of the
+    connection plugin or of collections which have already been fetched by
+    this module run, so that only the ids are passed on to the module.
+
+    References which can't be resolved don't fail immediately, they are
+    collected instead so that all missing references of a batch of items can
+    be reported at once by `check`.
+
+    Example:
+
+    * resolver = unifi.resolver
+    * wlan['networkconf_id'] = resolver.network_id(wlan.pop('networkconf'))
+    * wlan['ap_group_ids'] = resolver.apgroup_ids(wlan.pop('ap_groups'))
+    * resolver.check()
+
+    In check mode, objects which would be created or updated can be
+    registered with `plan`, so that later references to them are resolved
+    (to placeholder ids for new objects) as if they had been written.
+
+    :ivar __missing: the references which could not be resolved since the
+        last check, as tuples of kind and reference
+    :vartype __missing: list
+    :ivar __planned: the planned objects by kind of reference
+    :vartype __planned: dict
+    """
+
+    #: the API descriptors of the collections by kind of reference
+    APIS = {
+        'network': networkconf,
+        'apgroup': apgroups,
+        'portconf': portconf,
+        'country code': ccode
+    }
+
+    #: the format of the ids of planned objects which don't exist yet
+    PLACEHOLDER_ID = '<planned {kind} {number}>'
+
+    def __init__(self, unifi):
+        """
+        Initialize self.
+
+        :param unifi: the UniFi helper object
+        :type unifi: UniFi
+        """
+        self.__unifi = unifi
+        self.__missing = []
+        self.__planned = {}
+
+    @property
+    def missing(self):
+        """
+        The references which could not be resolved since the last check.
+
+        :rtype: list
+        """
+        return list(self.__missing)
+
+    def prefetch(self, *kinds):
+        """
+        Fetches the collections for several kinds of references concurrently.
+
+        :param \\*kinds: the kinds of references, see APIS
+        :type \\*kinds: str
+        """
+        self.__unifi.prefetch([Resolver.APIS[kind] for kind in kinds])
+
+    def plan(self, api, item):
+        """
+        Registers an object which is not written because of check mode, so
+        that later references to it are resolved. New objects get a
+        placeholder id, see PLACEHOLDER_ID.
+
+        :param api: the API descriptor of the object
+        :type api: ApiDescriptor
+        :param item: the object as it would be written
+        :type item: dict
+        :returns: the id or placeholder id of the object or None if objects
+            of the API descriptor are not referenced
+        :rtype: str
+        """
+        kind = next((kind for kind, kind_api in Resolver.APIS.items()
+                     if kind_api is api), None)
+        if kind is None:
+            return None
+        planned = self.__planned.setdefault(kind, [])
+        item = dict(item)
+        item.setdefault('_id', Resolver.PLACEHOLDER_ID.format(
+            kind=kind, number=len(planned) + 1))
+        planned.append(item)
+        return item['_id']
+
+    def check(self):
+        """
+        Verifies that all references since the last check could be resolved
+        and resets the missing references.
+
+        :raises Exception: if any reference could not be resolved, the
+            message contains all missing references
+        """
+        missing, self.__missing = self.__missing, []
+        if missing:
+            raise Exception('Could not resolve ' + ', '.join(
+                '{kind} {reference!r}'.format(kind=kind, reference=reference)
+                for kind, reference in missing))
+
+    def __collection(self, kind):
+        return self.__unifi.collection(Resolver.APIS[kind])
+
+    def __resolve(self, kind, reference, item):
+        """
+        Records a reference as missing if it could not be resolved.
+
+        :returns: the item
+        :rtype: dict
+        """
+        if item is None and (kind, reference) not in self.__missing:
+            self.__missing.append((kind, reference))
+        return item
+
+    def __lookup(self, kind, references, keys=None, filters=None):
+        """
+        Resolves references to ids with a single lookup and records the ones
+        which could not be resolved as missing.
+
+        :returns: the ids in the order of the references, None for missing
+            ones
+        :rtype: list
+        """
+        ids = self.__unifi.lookup_ids(Resolver.APIS[kind], references,
+                                      keys=keys, filters=filters) \
+            if references else []
+        if kind in self.__planned and None in ids:
+            ids = [self.__lookup_planned(kind, reference, keys, filters)
+                   if _id is None else _id
+                   for reference, _id in zip(references, ids)]
+        return [self.__resolve(kind, reference, _id)
+                for reference, _id in zip(references, ids)]
+
+    def __lookup_planned(self, kind, reference, keys, filters):
+        """
+        Resolves a reference to the id of a planned object like lookup_ids.
+
+        :returns: the id or None
+        :rtype: str
+        """
+        planned = IndexedCollection(self.__planned[kind])
+        for key in keys or ('_id', 'name'):
+            item = planned.find(**dict(filters or {}, **{key: reference}))
+            if item:
+                return item['_id']
+        return None
+
+    def network(self, reference, purpose=None):
+        """
+        Resolves a network by its id or name (strings) or its VLAN (integers).
+
+        :param reference: the id, name or VLAN of the network
+        :type reference: any
+        :param purpose: optional, the required purpose of the network,
+            networks without purpose are considered 'corporate'
+        :type purpose: str
+        :returns: the network or None
+        :rtype: dict
+        """
+        collection = self.__collection('network')
+        if isinstance(reference, str):
+            candidates = collection.find_all(_id=reference) or \
+                collection.find_all(name=reference)
+        elif isinstance(reference, int) and not isinstance(reference, bool):
+            candidates = collection.find_all(vlan=reference)
+        else:
+            candidates = []
+        if purpose is not None:
+            candidates = [network for network in candidates
+                          if network.get('purpose', 'corporate') == purpose]
+        return self.__resolve('network', reference,
+                              candidates[0] if candidates else None)
+
+    def network_id(self, reference, purpose=None):
+        """
+        Resolves the id of a network, see `network_ids`.
+
+        :returns: the id of the network or None
+        :rtype: str
+        """
+        return self.__network_ids([reference], purpose)[0]
+
+    def network_ids(self, references, purpose=None):
+        """
+        Resolves the ids of several networks by their ids or names (strings)
+        or their VLANs (integers).
+
+        :param references: the ids, names or VLANs of the networks
+        :type references: list
+        :param purpose: optional, the required purpose of the networks
+        :type purpose: str
+        :returns: the ids of the networks which could be resolved
+        :rtype: list
+        """
+        return [_id for _id in self.__network_ids(references, purpose)
+                if _id is not None]
+
+    def __network_ids(self, references, purpose):
+        # ids and names are looked up with one request, VLANs with another
+        filters = {'purpose': purpose} if purpose is not None else None
+        names = [position for position, reference in enumerate(references)
+                 if isinstance(reference, str)]
+        vlans = [position for position, reference in enumerate(references)
+                 if isinstance(reference, int) and
+                 not isinstance(reference, bool)]
+        ids = [None] * len(references)
+        for positions, keys in ((names, None), (vlans, ['vlan'])):
+            found = self.__lookup(
+                'network', [references[position] for position in positions],
+                keys=keys, filters=filters)
+            for position, _id in zip(positions, found):
+                ids[position] = _id
+        # references of other types can't be resolved
+        looked_up = set(names) | set(vlans)
+        for position, reference in enumerate(references):
+            if position not in looked_up:
+                self.__resolve('network', reference, None)
+        return ids
+
+    def apgroup_ids(self, references):
+        """
+        Resolves the ids of several AP groups by their ids or names.
+
+        :param references: the ids or names of the AP groups
+        :type references: list
+        :returns: the ids of the AP groups which could be resolved
+        :rtype: list
+        """
+        return [_id for _id in self.__lookup('apgroup', list(references))
+                if _id is not None]
+
+    def default_apgroup_ids(self):
+        """
+        Returns the ids of the default AP groups.
+
+        :rtype: list
+        """
+        return [group['_id'] for group in self.__collection('apgroup')
+                .find_all(attr_hidden_id='default')]
+
+    def portconf_id(self, reference):
+        """
+        Resolves the id of a switch port profile by its id or name.
+
+        :param reference: the id or name of the port profile
+        :type reference: str
+        :returns: the id of the port profile or None
+        :rtype: str
+        """
+        return self.__lookup('portconf', [reference])[0]
+
+    def country_code(self, reference):
+        """
+        Resolves the numeric code of a country by its key (e.g. 'DE').
+
+        :param reference: the key of the country
+        :type reference: str
+        :returns: the numeric code of the country or None
+        :rtype: int
+        """
+        country = self.__collection('country code').find(key=reference)
+        code = country.get('code') if country else None
+        self.__resolve('country code', reference, code)
+        return code
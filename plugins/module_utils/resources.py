@@ -0,0 +1,535 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from ipaddress import ip_interface, ip_address
+from re import compile as re_compile
+
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi import UniFi
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi_api import \
+    ApiDescriptor, device as device_api
+
+
+# networks
+
+def preprocess_networkconf(unifi, networks):
+    for network in networks:
+        if 'vlan' in network:
+            network['vlan_enabled'] = True
+            network['vlan'] = str(network['vlan'])
+        if 'purpose' not in network:
+            network['purpose'] = 'corporate'
+        if 'networkgroup' not in network:
+            network['networkgroup'] = 'LAN'
+    return networks
+
+
+def networkconf_key(net):
+    # networks with VLAN are identified by purpose and VLAN, networks with
+    # disabled VLAN all match each other, networks without VLAN information
+    # are identified by their name
+    purpose = net.get('purpose', 'corporate')
+    if 'vlan_enabled' not in net:
+        name = UniFi.name_key(net)
+        return (purpose, None, name) if name is not None else None
+    if not net['vlan_enabled']:
+        return (purpose, False)
+    return (purpose, True, str(net.get('vlan')))
+
+compare_networkconf = UniFi.key_comparator(networkconf_key)
+
+def host_bounds(network):
+    """
+    Returns the first and the last host address of a network as integers,
+    like the first and last address of network.hosts() but in constant time.
+
+    :param network: the network
+    :type network: IPv4Network or IPv6Network
+    :rtype: tuple
+    """
+    first = int(network.network_address)
+    last = int(network.broadcast_address)
+    if network.num_addresses <= 2:
+        # point-to-point (/31, /127) and host (/32, /128) networks
+        return first, last
+    if network.version == 4:
+        return first + 1, last - 1
+    return first + 1, last
+
+
+def rebase_range(old_subnet, new_subnet, start, stop, default_start=None,
+                 default_stop=None):
+    """
+    Moves an address range (e.g. a DHCP range) from one subnet to another.
+    The start keeps its offset from the network address and the stop keeps
+    its offset from the broadcast (last) address, the result is limited to
+    the host addresses of the new subnet. If the offsets don't fit into the
+    new subnet, the range covers all of its host addresses except for the
+    gateway (the address of the subnet). Only integer arithmetic is used, so
+    that the duration doesn't depend on the size of the subnets.
+
+    :param old_subnet: the previous subnet (e.g. '192.168.1.1/24') or None,
+        a subnet of the other address family counts as None
+    :type old_subnet: str
+    :param new_subnet: the new subnet
+    :type new_subnet: str
+    :param start: the previous start address or None
+    :type start: str
+    :param stop: the previous stop address or None
+    :type stop: str
+    :param default_start: the offset of the start from the network address
+        if the previous start is unknown or outside of the previous subnet,
+        None leaves the range unchanged in that case
+    :type default_start: int
+    :param default_stop: the offset of the stop from the broadcast address
+        (zero or negative) if the previous stop is unknown or outside of the
+        previous subnet, None leaves the range unchanged in that case
+    :type default_stop: int
+    :returns: a tuple of the new start and stop address or None if the new
+        subnet can't hold a range of at least two addresses
+    :rtype: tuple
+    """
+    old_network = ip_interface(old_subnet).network if old_subnet else None
+    new_interface = ip_interface(new_subnet)
+    new_network = new_interface.network
+    if old_network is not None and old_network.version != new_network.version:
+        # offsets can't be carried over to another address family
+        old_network = None
+
+    def offset(address, base, default):
+        if address is None or old_network is None:
+            return default
+        address = ip_address(address)
+        if address.version != old_network.version or \
+                address not in old_network:
+            return default
+        return int(address) - int(base)
+
+    start_offset = offset(start, old_network and old_network.network_address,
+                          default_start)
+    stop_offset = offset(stop, old_network and old_network.broadcast_address,
+                         default_stop)
+    if start_offset is None or stop_offset is None:
+        return None
+
+    first, last = host_bounds(new_network)
+    new_start = min(max(int(new_network.network_address) + start_offset,
+                        first), last)
+    new_stop = min(max(int(new_network.broadcast_address) + stop_offset,
+                       first), last)
+    if new_start >= new_stop:
+        new_start, new_stop = first, last
+        if int(new_interface.ip) == new_start:
+            new_start += 1
+        elif int(new_interface.ip) == new_stop:
+            new_stop -= 1
+        if new_start >= new_stop:
+            return None
+    address_class = type(new_network.network_address)
+    return str(address_class(new_start)), str(address_class(new_stop))
+
+
+def prepare_update_networkconf(input, existing):
+    # keep the DHCP ranges at the same offsets when a subnet is changed
+    for subnet, start, stop, defaults in (
+            ('ip_subnet', 'dhcpd_start', 'dhcpd_stop', (6, -1)),
+            ('ipv6_subnet', 'dhcpdv6_start', 'dhcpdv6_stop', (None, None))):
+        if subnet not in input or start in input or stop in input or \
+                input[subnet] == existing.get(subnet):
+            continue
+        dhcp_range = rebase_range(existing.get(subnet), input[subnet],
+                                  existing.get(start), existing.get(stop),
+                                  *defaults)
+        if dhcp_range:
+            input[start], input[stop] = dhcp_range
+
+
+# wireless networks
+
+def preprocess_wlanconf(unifi: UniFi, wlans):
+
+    resolver = unifi.resolver
+    resolver.prefetch('apgroup', 'network')
+
+    for wlan in wlans:
+        if 'ap_group_ids' in wlan or 'ap_groups' in wlan:
+            wlan['ap_group_ids'] = resolver.apgroup_ids(
+                wlan.pop('ap_group_ids', None) or wlan.pop('ap_groups', []))
+            wlan.pop('ap_groups', None)
+        else:
+            wlan['ap_group_ids'] = resolver.default_apgroup_ids()
+
+        if 'networkconf_id' in wlan or 'networkconf' in wlan:
+            network = wlan.pop('networkconf_id', None) or \
+                wlan.pop('networkconf', None)
+            wlan.pop('networkconf', None)
+            network_id = resolver.network_id(network)
+            if network_id:
+                wlan['networkconf_id'] = network_id
+
+    # report all missing references at once
+    resolver.check()
+    return wlans
+
+
+# switch port profiles
+
+def preprocess_portconf(unifi, portconf):
+    site_id = unifi.lookup_site_id()
+    if site_id is None:
+        unifi.fail('Could not determine site for port profile {portconf}',
+                   portconf=portconf['name'])
+    portconf['site_id'] = site_id
+
+    resolver = unifi.resolver
+
+    portconf['forward'] = 'disabled'
+
+    # lookup native network
+    native_networkconf = portconf.pop('native_networkconf', None)
+    if native_networkconf:
+        portconf['native_networkconf_id'] = resolver.network_id(
+            native_networkconf, purpose='corporate')
+        portconf['forward'] = 'native'
+    else:
+        portconf['native_networkconf_id'] = ''
+
+    # lookup tagged networks
+    tagged_networkconfs = portconf.pop('tagged_networkconfs', None)
+    if tagged_networkconfs:
+        if tagged_networkconfs == 'all':
+            # tagged_networkconf_ids = [n['_id'] for n in networkconfs
+            #                           if n['purpose'] == 'corporate']
+            # portconf['tagged_networkconf_ids'] = tagged_networkconf_ids
+            portconf['forward'] = 'all'
+        else:
+            tagged_networkconf_ids = resolver.network_ids(
+                tagged_networkconfs, purpose='corporate')
+            if 'native_networkconf_id' in portconf and \
+                    portconf['native_networkconf_id'] in tagged_networkconf_ids:
+                tagged_networkconf_ids.remove(portconf['native_networkconf_id'])
+            portconf['tagged_networkconf_ids'] = tagged_networkconf_ids
+            portconf['forward'] = 'customize'
+    else:
+        portconf['tagged_networkconf_ids'] = []
+
+    # report all missing networks of the port profile at once
+    try:
+        resolver.check()
+    except Exception as e:
+        raise Exception('Port profile {portconf}: {error}'.format(
+            portconf=portconf['name'], error=e))
+
+    # update the PoE mode
+    if 'poe_mode' not in portconf:
+      UniFi.set_missing(portconf, 'poe_mode')
+
+    return portconf
+
+
+# settings
+
+def preprocess_settings(unifi: UniFi, settings):
+    result = []
+    for key, value in settings.items():
+        value['key'] = key
+
+        if key == 'country' and 'code' in value:
+            value['code'] = unifi.resolver.country_code(value['code'])
+
+        result.append(value)
+
+    unifi.resolver.check()
+    return result
+
+compare_settings = UniFi.key_comparator(lambda setting: setting.get('key'))
+
+
+# device ports
+
+MAC_ADDRESS = re_compile(r'^[0-9a-fA-F]{2}([:-][0-9a-fA-F]{2}){5}$')
+
+port_override_api = ApiDescriptor(
+            param_name='ports',
+            request_kwargs=device_api.request_kwargs,
+            id_extractor=lambda port: port['port_idx']
+        )
+
+
+DEVICE_FIELDS = ['_id', 'mac', 'name', 'port_table', 'port_overrides']
+
+#: attributes of a port override which are removed if they are not given
+PORT_OVERRIDE_RESETS = ['name', 'autoneg', 'full_duplex', 'poe_mode', 'speed']
+
+
+def get_device(unifi, device):
+    if MAC_ADDRESS.match(device):
+        devices = unifi.fetch_items(device_api,
+                                    macs=[device.replace('-', ':')],
+                                    fields=DEVICE_FIELDS)
+    else:
+        devices = unifi.fetch_items(device_api, filters={'name': device},
+                                    fields=DEVICE_FIELDS)
+    return devices[0] if devices else None
+
+
+def get_port_idx(port, device):
+    port_idx = None
+    port_name = None
+    if isinstance(port, int) or (isinstance(port, str) and port.isnumeric()):
+        port_idx = int(port)
+    else:
+        port_name = port
+
+    for device_port in device['port_table']:
+        if device_port['port_idx'] == port_idx or \
+                device_port['name'] == port_name:
+            return device_port['port_idx']
+
+
+def index_ports(device):
+    """
+    Indexes the ports of a device by index and name, so that several ports
+    of the same device can be looked up without scanning its port table.
+
+    :param device: the device including its 'port_table'
+    :type device: dict
+    :returns: a dict which maps the index (int) and the name (str) of each
+        port to its index, the first port wins for duplicate names
+    :rtype: dict
+    """
+    index = {}
+    for device_port in device['port_table']:
+        index.setdefault(device_port.get('name'), device_port['port_idx'])
+    for device_port in device['port_table']:
+        index[device_port['port_idx']] = device_port['port_idx']
+    return index
+
+
+def lookup_port_idx(port, index):
+    """
+    Looks up a port in the index of `index_ports`, numeric strings are
+    considered port indexes like in `get_port_idx`.
+
+    :param port: the index or name of the port
+    :type port: any
+    :param index: the port index of the device
+    :type index: dict
+    :returns: the index of the port or None
+    :rtype: int
+    """
+    if isinstance(port, int) or (isinstance(port, str) and port.isnumeric()):
+        return index.get(int(port))
+    return index.get(port)
+
+
+def update_port_overrides(unifi, port_overrides, port, state,
+                          changed_keys=None):
+    """
+    Applies the desired override of a single port to the port overrides of a
+    device.
+
+    :param unifi: the UniFi helper object
+    :type unifi: UniFi
+    :param port_overrides: the port overrides of the device, changed in place
+    :type port_overrides: list
+    :param port: the desired override, including 'port_idx' and optionally
+        'portconf_id'
+    :type port: dict
+    :param state: the requested state of the override
+    :type state: str
+    :param changed_keys: optional list which receives the names of the
+        changed attributes
+    :type changed_keys: list
+    :returns: True if the port overrides were changed
+    :rtype: bool
+    """
+    port_idx = port['port_idx']
+    require_absent = [key for key in PORT_OVERRIDE_RESETS if key not in port]
+
+    found = False
+    change_required = False
+    remove_items = []
+    for port_override in port_overrides:
+        if port_override['port_idx'] == port_idx:
+            found = True
+            if state == 'present':
+                change_required = unifi.update_item(port_override_api, port,
+                                                    port_override,
+                                                    require_absent, None,
+                                                    changed_keys)
+            elif state == 'absent':
+                remove_items.append(port_override)
+                change_required = True
+
+    if state == 'present':
+        if not found:
+            port_overrides.append(port)
+            change_required = True
+    else:
+        for item in remove_items:
+            port_overrides.remove(item)
+
+    return change_required
+
+
+def apply_port_overrides(unifi, port_overrides, ports):
+    """
+    Applies the desired overrides of several ports of a device to its port
+    overrides in a single pass.
+
+    :param unifi: the UniFi helper object
+    :type unifi: UniFi
+    :param port_overrides: the port overrides of the device, the contained
+        overrides are updated in place
+    :type port_overrides: list
+    :param ports: maps the index of each port to a tuple of its desired
+        override (including 'port_idx') and its requested state
+    :type ports: dict
+    :returns: the resulting port overrides and a list of tuples of the
+        affected overrides, their action (see UniFi.RESULT_ACTIONS) and the
+        names of the changed attributes
+    :rtype: tuple
+    """
+    result = []
+    actions = []
+    found = set()
+    for port_override in port_overrides:
+        port_idx = port_override['port_idx']
+        port, state = ports.get(port_idx, (None, None))
+        if state == 'absent':
+            found.add(port_idx)
+            actions.append((port_override, 'deleted', None))
+            continue
+        if state == 'present':
+            found.add(port_idx)
+            changed_keys = []
+            require_absent = [key for key in PORT_OVERRIDE_RESETS
+                              if key not in port]
+            if unifi.update_item(port_override_api, port, port_override,
+                                 require_absent, None, changed_keys):
+                actions.append((port_override, 'updated', changed_keys))
+            else:
+                actions.append((port_override, 'unchanged', None))
+        result.append(port_override)
+
+    for port_idx, (port, state) in ports.items():
+        if state == 'present' and port_idx not in found:
+            result.append(port)
+            actions.append((port, 'created', None))
+    return result, actions
+
+
+def get_devices(unifi, references):
+    """
+    Looks up several devices by MAC address or name with at most two
+    requests, one for all MAC addresses and one for all names.
+
+    :param unifi: the UniFi helper object
+    :type unifi: UniFi
+    :param references: the MAC addresses or names of the devices
+    :type references: list
+    :returns: a dict which maps each reference to its device or None
+    :rtype: dict
+    """
+    macs = {reference: reference.replace('-', ':').lower()
+            for reference in references if MAC_ADDRESS.match(reference)}
+    names = [reference for reference in references if reference not in macs]
+
+    devices = {}
+    if macs:
+        by_mac = {device['mac']: device for device in unifi.fetch_items(
+            device_api, macs=list(set(macs.values())), fields=DEVICE_FIELDS)}
+        devices.update((reference, by_mac.get(mac))
+                       for reference, mac in macs.items())
+    if names:
+        by_name = {}
+        for device in unifi.fetch_items(device_api, fields=DEVICE_FIELDS):
+            by_name.setdefault(device.get('name'), device)
+        devices.update((name, by_name.get(name)) for name in names)
+    return devices
+
+
+def ensure_ports(unifi, ports, state):
+    """
+    Applies port overrides to device ports. The ports are grouped by device,
+    the ports of each device are looked up in an index and its overrides are
+    computed in a single pass, so that each changed device is updated with a
+    single request. The devices are updated concurrently, adapting the
+    concurrency to the controller.
+
+    :raises Exception: if a device, a port or a port profile could not be
+        found or a port is given more than once
+
+    :param unifi: the UniFi helper object
+    :type unifi: UniFi
+    :param ports: the desired ports, each one a dict with the keys 'device'
+        (MAC address or name), 'port' (index or name) and optionally
+        'portconf' (name of a port profile), 'override' (further attributes
+        of the port override) and 'state' (overrides the state parameter)
+    :type ports: list
+    :param state: the requested state of the ports
+    :type state: str
+    :returns: a list with one dict per device which contains the reference
+        of the 'device', its '_id', the resulting 'port_overrides', the
+        affected overrides with their actions as 'ports' (see
+        `apply_port_overrides`) and whether it was 'changed'
+    :rtype: list
+    """
+    references = []
+    for port in ports:
+        if port['device'] not in references:
+            references.append(port['device'])
+    devices = get_devices(unifi, references)
+
+    missing = [reference for reference in references
+               if devices[reference] is None]
+    if missing:
+        raise Exception('Could not find devices: ' + ', '.join(missing))
+
+    # the desired overrides per device id, keyed by port index
+    groups = {}
+    for port in ports:
+        device = devices[port['device']]
+        group = groups.get(device['_id'])
+        if group is None:
+            group = groups[device['_id']] = {
+                'device': port['device'], 'index': index_ports(device),
+                'port_overrides': device['port_overrides'], 'ports': {}
+            }
+
+        port_idx = lookup_port_idx(port['port'], group['index'])
+        if port_idx is None:
+            raise Exception('Could not find port {port} of device {device}'
+                            .format(port=port['port'], device=port['device']))
+        if port_idx in group['ports']:
+            raise Exception('Port {port} of device {device} is given more '
+                            'than once'.format(port=port['port'],
+                                               device=port['device']))
+        override = dict(port.get('override') or {}, port_idx=port_idx)
+        if port.get('portconf') is not None:
+            override['portconf_id'] = unifi.resolver.portconf_id(
+                port['portconf'])
+        group['ports'][port_idx] = (override, port.get('state') or state)
+
+    # all port profiles need to be resolved before any device is updated
+    unifi.resolver.check()
+
+    results = []
+    for _id, group in groups.items():
+        port_overrides, actions = apply_port_overrides(
+            unifi, group['port_overrides'], group['ports'])
+        results.append({
+            'device': group['device'], '_id': _id,
+            'port_overrides': port_overrides, 'ports': actions,
+            'changed': any(action != 'unchanged' for _, action, _ in actions)
+        })
+
+    changed = [result for result in results if result['changed']]
+    if changed and not unifi.check_mode:
+        unifi.send_many([{'api': device_api, '_id': result['_id'],
+                          'data': {'port_overrides': result['port_overrides']}}
+                         for result in changed], adaptive=True)
+    return results
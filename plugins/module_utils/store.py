@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from contextlib import contextmanager
+from fcntl import flock, LOCK_EX, LOCK_UN
+from hashlib import sha256
+from os import makedirs, replace, chmod, path as os_path
+from threading import RLock
+from time import time
+
+from ansible_collections.gmeiner.unifi.plugins.module_utils.codec import \
+    dumps as json_dumps, loads as json_loads
+
+
+class FileStore(object):
+    """
+    A file based store for entries with an expiry which is shared by all
+    connection processes on the local machine, e.g. for authenticated
+    sessions or controller metadata. Access to the store is serialized with a
+    file lock, so that only one process at a time e.g. logs in to a
+    controller while all others reuse its session.
+
+    :ivar __path: the expanded path of the store file
+    :vartype __path: str
+    :ivar __depth: nesting depth of the lock held by this process
+    :vartype __depth: int
+    """
+
+    def __init__(self, store_path):
+        """
+        Initialize self.
+
+        :param store_path: path of the store file, a lock file with the
+            additional suffix '.lock' will be created next to it
+        :type store_path: str
+        """
+        self.__path = os_path.expanduser(store_path)
+        self.__lock = RLock()
+        self.__lock_file = None
+        self.__depth = 0
+
+    @classmethod
+    def key(cls, *parts):
+        """
+        Builds a store key, e.g. from the controller URL and the username.
+
+        :param \\*parts: the parts which identify an entry
+        :type \\*parts: str
+        :returns: the store key
+        :rtype: str
+        """
+        return sha256('|'.join(str(part) for part in parts)
+                      .encode('utf-8')).hexdigest()
+
+    @contextmanager
+    def locked(self):
+        """
+        Context manager which holds the exclusive lock on the store. The lock
+        may be acquired repeatedly by the same process.
+        """
+        with self.__lock:
+            if self.__depth == 0:
+                makedirs(os_path.dirname(self.__path) or '.', mode=0o700,
+                         exist_ok=True)
+                self.__lock_file = open(self.__path + '.lock', 'a')
+                flock(self.__lock_file, LOCK_EX)
+            self.__depth += 1
+            try:
+                yield self
+            finally:
+                self.__depth -= 1
+                if self.__depth == 0:
+                    flock(self.__lock_file, LOCK_UN)
+                    self.__lock_file.close()
+                    self.__lock_file = None
+
+    def __read(self):
+        try:
+            with open(self.__path, 'rb') as store_file:
+                entries = json_loads(store_file.read())
+        except (OSError, ValueError):
+            return {}
+        now = time()
+        return {key: entry for key, entry in entries.items()
+                if entry.get('expires', 0) > now}
+
+    def __write(self, entries):
+        temp_path = self.__path + '.tmp'
+        with open(temp_path, 'w') as store_file:
+            chmod(temp_path, 0o600)
+            store_file.write(json_dumps(entries))
+        replace(temp_path, self.__path)
+
+    def load(self, key):
+        """
+        Looks up an entry which has not expired yet.
+
+        :param key: the store key
+        :type key: str
+        :returns: the entry including its 'expires' timestamp or None if there
+            is no valid entry
+        :rtype: dict
+        """
+        with self.locked():
+            return self.__read().get(key)
+
+    def save(self, key, expires, **values):
+        """
+        Stores an entry, replacing any previous entry for the same key.
+
+        :param key: the store key
+        :type key: str
+        :param expires: the timestamp when the entry expires
+        :type expires: float
+        :param \\**values: the values of the entry, e.g. the auth 'headers'
+            of a session
+        :type \\**values: any
+        """
+        with self.locked():
+            entries = self.__read()
+            entries[key] = dict(values, expires=expires)
+            self.__write(entries)
+
+    def discard(self, key, **match):
+        """
+        Removes an entry from the store.
+
+        :param key: the store key
+        :type key: str
+        :param \\**match: optional, only remove the entry if it still has
+            these values, e.g. a session which was not renewed by another
+            process in the meantime
+        :type \\**match: any
+        :returns: True if the entry was removed
+        :rtype: bool
+        """
+        with self.locked():
+            entries = self.__read()
+            entry = entries.get(key)
+            if entry is None or any(entry.get(name) != value
+                                    for name, value in match.items()):
+                return False
+            del entries[key]
+            self.__write(entries)
+            return True
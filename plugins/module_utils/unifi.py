@@ -10,9 +10,28 @@ from os import environ
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.connection import Connection
 
-from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi_api import ApiDescriptor
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi_api import ApiDescriptor, \
+    DESCRIPTORS
+from ansible_collections.gmeiner.unifi.plugins.module_utils.codec import Pretty
+from ansible_collections.gmeiner.unifi.plugins.module_utils.collection import \
+    IndexedCollection
 from ansible_collections.gmeiner.unifi.plugins.module_utils.logging import \
     Logger, LogLevel
+from ansible_collections.gmeiner.unifi.plugins.module_utils.resolver import \
+    Resolver
+
+
+class TaskExit(Exception):
+    """
+    Carries the result of a module which was run by an action plugin, raised
+    instead of exiting the process (see the TaskModule of the action plugin).
+    Like the SystemExit of AnsibleModule, it must not be handled as an error
+    of the module.
+    """
+
+    def __init__(self, result):
+        super(TaskExit, self).__init__(result.get('msg'))
+        self.result = result
 
 
 
@@ -28,6 +47,11 @@ class UniFi(object):
     :vartype __connection: Connection
     :ivar __logger: logging facility, only used for log_levels > 0
     :vartype __logger: Logger
+    :ivar __collections: indexed collections which have been fetched by this
+        module run, keyed by getter API descriptor and site
+    :vartype __collections: dict
+    :ivar __resolver: the reference resolver, created on first use
+    :vartype __resolver: Resolver
     :ivar error: shorthand to the same method of the logger
     :vartype error: function
     :ivar info: shorthand to the same method of the logger
@@ -42,9 +66,25 @@ class UniFi(object):
     DEFAULT_ARGS = dict(
         debug=dict(type='str', default=LogLevel.DISABLED.name),
         state=dict(choices=['present','absent','ignore'], default='present'),
-        site=dict(type='str', required=False, default='default')
+        site=dict(type='str', required=False, default='default'),
+        result_mode=dict(choices=['full', 'changed_only', 'summary'],
+                         default='full'),
+        return_fields=dict(type='list', elements='str', required=False)
+    )
+
+    #: parameters of modules which support the state 'exclusive', i.e. which
+    #: delete all existing items that don't match any input item
+    EXCLUSIVE_ARGS = dict(
+        state=dict(choices=['present','absent','ignore','exclusive'],
+                   default='present'),
+        max_deletions=dict(type='int', default=10)
     )
 
+    #: the attributes which identify items in projected results
+    IDENTITY_FIELDS = ('_id', 'key', 'name', 'device', 'port_idx')
+    #: the actions which are counted in the summary of the result
+    RESULT_ACTIONS = ('created', 'updated', 'deleted', 'unchanged')
+
     #: the default result structure
     __RESULT_STUB = {'changed': False}
     #: the key that identifies attributes which are missing
@@ -69,26 +109,99 @@ class UniFi(object):
         return 'name' in item_a and 'name' in item_b and \
             item_a['name'].lower() == item_b['name'].lower()
 
+    @classmethod
+    def name_key(cls, item):
+        """
+        Shorthand method which returns the case invariant name of an item
+
+        :param item: the item
+        :type item: dict:
+
+        :returns: the lower case name or None if the item has no name
+        :rtype: str
+        """
+        name = item.get('name')
+        return name.lower() if isinstance(name, str) else None
+
+    @classmethod
+    def key_comparator(cls, key_function):
+        """
+        Shorthand method which builds a comparator that considers two items
+        equal if they have the same key. Unlike other comparators, these
+        allow ensure_item to match all items via a dict index instead of
+        comparing each pair of items.
+
+        Example:
+
+        * key_comparator(lambda item: (item.get('purpose'), item.get('vlan')))
+
+        :param key_function: callback function which returns a hashable key
+            of an item or None if the item has no key (i.e. it does not match
+            any item)
+        :type key_function: function
+
+        :returns: the comparator, its key function is available as attribute
+            'key'
+        :rtype: function
+        """
+        def key_comparator(item_a, item_b):
+            key_a = key_function(item_a)
+            return key_a is not None and key_a == key_function(item_b)
+
+        key_comparator.key = key_function
+        return key_comparator
+
     @classmethod
     def build_id_comparator(cls, id_extractor):
         """
         Shorthand method which compares two items by their id's
 
-        :param item_a: the first item
-        :type item_a: dict:
-        'param item_b: the second item
-        :type item_b: dict:
+        :param id_extractor: callback function which returns the id of an item
+        :type id_extractor: function
 
-        :rtype: bool
+        :returns: a key comparator, see key_comparator
+        :rtype: function
         """
-        def id_comparator(item_a, item_b):
+        def id_key(item):
             try:
-                return id_extractor(item_a) == id_extractor(item_b)
+                return id_extractor(item)
             except:
-                return False
+                return None
 
-        return id_comparator
-    
+        return cls.key_comparator(id_key)
+
+    @classmethod
+    def is_protected(cls, item):
+        """
+        Shorthand method which identifies built-in objects of the controller,
+        e.g. the default LAN, which must not be deleted
+
+        :param item: the item
+        :type item: dict:
+
+        :returns: True if the item must not be deleted
+        :rtype: bool
+        """
+        return bool(item.get('attr_no_delete')) or 'attr_hidden_id' in item
+
+    @classmethod
+    def project(cls, item, fields):
+        """
+        Shorthand method which reduces an item to its identifying attributes
+        and the given attributes
+
+        :param item: the item
+        :type item: dict:
+        :param fields: the names of the attributes to keep
+        :type fields: iterable:
+
+        :returns: a new dict with the attributes which are present
+        :rtype: dict
+        """
+        projection = {key: item[key] for key in cls.IDENTITY_FIELDS
+                      if key in item}
+        projection.update((key, item[key]) for key in fields if key in item)
+        return projection
 
     @classmethod
     def set_missing(cls, item, attribute):
@@ -124,13 +237,16 @@ class UniFi(object):
         return item.pop(UniFi.__MISSING_KEY, [])
 
 
-    def __init__(self, result=None, **module_specs):
+    def __init__(self, result=None, module_class=None, **module_specs):
         """
         Constructor for the UniFi API wrapper.
 
         :param result: A dictionary that may contain any data which will be used
             in the result that is returned by the Ansible module
         :type result: dict
+        :param module_class: optional replacement for AnsibleModule with the
+            same interface, e.g. to run the module in an action plugin
+        :type module_class: type
         :param \\**module_specs: Any parameter that can be passed to the
             constructor of AnsibleModule
         """
@@ -141,10 +257,13 @@ class UniFi(object):
                 argument_spec[key] = value
         module_specs['argument_spec'] = argument_spec
 
-        self.__module = AnsibleModule(**module_specs)
+        self.__module = (module_class or AnsibleModule)(**module_specs)
 
-        self.__result = result if result is not None else UniFi.__RESULT_STUB
+        self.__result = result if result is not None \
+            else dict(UniFi.__RESULT_STUB)
         self.__connection = None
+        self.__collections = {}
+        self.__resolver = None
         self.__logger = Logger(
             LogLevel[self.param('debug')],
             environ.get('ANSIBLE_UNIFI_LOG_PATH')
@@ -154,130 +273,6 @@ class UniFi(object):
         self.debug = self.__logger.debug
         self.trace = self.__logger.trace
 
-    def __generate_setter(self, name):
-        """
-        Factory for a setter method that allows to upload an object to the UniFi
-        REST API. The generated method passes all keyword arguments on to the
-        connection plugin.
-
-        Example:
-
-        * set_networkconf(_id=my_networkconf_id)
-        * set_portconf(data=my_portconf)
-
-        :param name: The name (or type) of a UniFi API object
-        :type name: str
-        :returns: A setter method
-        :rtype: function
-        """
-
-        def __item_setter(name, **item_kwargs):
-            """
-            Inner method that implements the actual setter
-
-            :param name: The name (or type) of a UniFi API object
-            :type name: str
-            :param \\**kwargs: Any parameter will be passed on to the connection
-                plugin
-            :returns: The resulting UniFi object
-            :rtype: dict
-            """
-            result = self.send(**UniFi.__API_CONFIG[name]['request_kwargs'],
-                               **item_kwargs)
-            return result
-
-        if name in UniFi.__API_CONFIG:
-            return lambda **item_kwargs: __item_setter(name, **item_kwargs)
-
-    def __generate_getter(self, name):
-        """
-        Factory for a getter method that allows the retrieval of an object via
-        the UniFi REST API. Depending on the usage of singular or plural of the
-        name parameter the generated method will return all objects or only a
-        single object that passes the filter test.
-        
-        In case of a single item all keyword arguments passed to the getter will
-        be used to filter the results. If multiple objects would match a filter,
-        then only the first match will be returned.
-
-        Example:
-        * get_networkconfs()
-        * get_networkconf(vlan=500)
-
-        :param name: The name (or type) of a UniFi API object
-        :type name: str
-        :returns: A setter method
-        :rtype: function
-        """
-        def __items_getter(name):
-            """
-            Inner method that implements the actual getter for a list of objects
-
-            :param name: The name (or type) of a UniFi API object
-            :type name: str
-            :returns: The resulting list of UniFi object
-            :rtype: list
-            """
-            items = self.send(**UniFi.__API_CONFIG[name]['request_kwargs'])
-            return items
-        
-        def __item_getter(name, **filter_kwargs):
-            """
-            Inner method that implements the actual getter for a single object
-
-            :param name: The name (or type) of a UniFi API object
-            :type name: str
-            :param \\**kwargs: All parameters will be used as filter
-            :returns: The resulting UniFi object
-            :rtype: dict
-            """
-            if not filter_kwargs:
-                default = self.param(name, default=None)
-                if default is not None:
-                    filter_kwargs['name'] = default
-
-            items = __items_getter(name)
-
-            for item in items:
-                match = True
-                for key, value in filter_kwargs.items():
-                    if item.get(key, None) != value and \
-                            item.get(key, None) != str(value):
-                        match = False
-                        break
-                if match:
-                    return item
-
-            return None
-
-        if name in UniFi.__API_CONFIG:
-            return lambda **filter_kwargs: __item_getter(name, **filter_kwargs)
-        if name[-1] == 's' and name[:-1] in UniFi.__API_CONFIG:
-            return lambda: __items_getter(name[:-1])
-        return None
-
-    def __getattribute__(self, name):
-        """
-        Override of the normal __getattribute__ method to return UniFi getter
-        and setter methods.
-
-        :param name: The name (or type) of a UniFi API object
-        :type name: str
-        :returns: the generated getter or setter or the appropriate attribute
-        :rtype: any
-        """
-        if name.startswith('get_'):
-            getter = self.__generate_getter(name[4:])
-            if getter:
-                return getter
-        if name.startswith('set_'):
-            setter = self.__generate_setter(name[4:])
-            if setter:
-                return setter
-        
-        return super(UniFi, self).__getattribute__(name)
-
-
     @property
     def connection(self):
         """
@@ -293,9 +288,30 @@ class UniFi(object):
 
         self.__connection = Connection(self.__module._socket_path)
         self.__connection.set_logging(self.__logger.level.value,
-                                      environ.get('ANSIBLE_UNIFI_LOG_PATH'))
+                                      environ.get('ANSIBLE_UNIFI_LOG_PATH'),
+                                      self.metrics_enabled)
         return self.__connection
 
+    @property
+    def resolver(self):
+        """
+        The resolver for references to networks, AP groups, port profiles and
+        country codes, shared by all callers of this module run
+        """
+        if self.__resolver is None:
+            self.__resolver = Resolver(self)
+        return self.__resolver
+
+    @property
+    def metrics_enabled(self):
+        """
+        Shorthand property to identify if request metrics should be returned
+        in the result of the Ansible module (environment variable
+        ANSIBLE_UNIFI_METRICS)
+        """
+        return environ.get('ANSIBLE_UNIFI_METRICS', '').lower() in \
+            ('1', 'true', 'yes', 'on')
+
     @property
     def result(self):
         """
@@ -354,6 +370,53 @@ class UniFi(object):
         else:
             raise KeyError('No such module parameter: {key}'.format(key=key))
 
+    def report(self, key, item, action, changed=None, changed_keys=None):
+        """
+        Adds an item to the result structure under the given key, according to
+        the module parameters result_mode and return_fields:
+
+        - full: all items are returned (default)
+        - changed_only: only created, updated and deleted items are returned
+        - summary: no items are returned
+
+        The actions are counted per key in the field 'summary' of the result
+        in any mode. If return_fields is set, the items are reduced to their
+        identifying attributes, the requested attributes and the attributes
+        which were changed.
+
+        :param key: the key of the result list, e.g. the param name of the API
+            descriptor
+        :type key: str
+        :param item: the item or a list of items
+        :type item: any
+        :param action: the action which was applied to the item, one of
+            RESULT_ACTIONS
+        :type action: str
+        :param changed: indicates that the item was changed on the controller,
+            defaults to True for all actions except 'unchanged'
+        :type changed: bool
+        :param changed_keys: the names of the attributes which were changed
+        :type changed_keys: list
+        """
+        items = item if isinstance(item, list) else [item]
+        if changed is None:
+            changed = action != 'unchanged'
+        self.__result['changed'] = changed or self.__result.get('changed', False)
+
+        summary = self.__result.setdefault('summary', {}).setdefault(
+            key, dict.fromkeys(UniFi.RESULT_ACTIONS, 0))
+        summary[action] += len(items)
+
+        result_mode = self.param('result_mode', default='full')
+        if result_mode == 'summary' or \
+                (result_mode == 'changed_only' and action == 'unchanged'):
+            return
+        fields = self.param('return_fields', default=None)
+        if fields:
+            fields = fields + (changed_keys or [])
+            items = [UniFi.project(item, fields) for item in items]
+        self.__result.setdefault(key, []).extend(items)
+
     def exit(self):
         """
         This method concludes the Ansible module operation and provides the
@@ -362,6 +425,8 @@ class UniFi(object):
         if self.__logger.enabled:
             self.__result['logs'] = Logger.join(
                 self.connection.get_logs(), self.__logger.logs)
+        if self.metrics_enabled and self.__connection:
+            self.__result['metrics'] = self.connection.get_metrics()
 
         self.__module.exit_json(**self.__result)
     
@@ -378,6 +443,8 @@ class UniFi(object):
         if self.__logger.enabled:
             self.__result['logs'] = Logger.join(
                 self.connection.get_logs(), self.__logger.logs)
+        if self.metrics_enabled and self.__connection:
+            self.__result['metrics'] = self.connection.get_metrics()
 
         try:
             message = message.format(**message_kwargs)
@@ -385,7 +452,8 @@ class UniFi(object):
             pass
         self.__module.fail_json(msg=message, **self.__result)
 
-    def update_item(self, api: ApiDescriptor, input_item, existing_item, require_absent, prepare_update):
+    def update_item(self, api: ApiDescriptor, input_item, existing_item, require_absent, prepare_update,
+                    changed_keys=None):
         """
         Convenience method to verify if an (existing) item matches another
         (input) item by all attributes of the (input) item and update the former
@@ -400,6 +468,9 @@ class UniFi(object):
             the existing item
         :type require_absent: list
         :param preprocess_update: perform operations to prepare input item
+        :param changed_keys: optional list which receives the names of the
+            changed attributes
+        :type changed_keys: list
         :returns: True if the existing item was changed, else False
         :rtype: bool
         """
@@ -408,25 +479,37 @@ class UniFi(object):
         if prepare_update:
             prepare_update(input_item, existing_item)
 
+        # compare the input item with the same slice of the existing item
+        # first, so that unchanged items skip all field work
+        if all(key in existing_item for key in input_item) and \
+                not any(key in existing_item for key in require_absent) and \
+                {key: existing_item[key] for key in input_item} == input_item:
+            return False
+
         for key, value in input_item.items():
             if key not in existing_item or existing_item[key] != value:
                 changed = True
                 self.debug('Field {id}.{key} ({type}) differs on controller: '
                            'expected {expected} but got {value}',
-                           id=api.extract_id(input_item), type=api.param_name,
+                           id=api.extract_id(existing_item), type=api.param_name,
                            key=key, expected=value,
                            value=existing_item.get(key, '<missing>'))
                 existing_item[key] = value
+                if changed_keys is not None:
+                    changed_keys.append(key)
         for key in require_absent:
             if key in existing_item:
                 changed = True
                 self.debug('Field {key} exists on controller '
                            'but it should be absent', key=key)
                 del existing_item[key]
+                if changed_keys is not None:
+                    changed_keys.append(key)
         return changed
 
 
-    def ensure_item(self, api: ApiDescriptor, preprocess_item=None, compare_items=None, prepare_update=None):
+    def ensure_item(self, api: ApiDescriptor, preprocess_item=None, compare_items=None, prepare_update=None,
+                    items=None):
         """
         Convenience method to ensure the provided item state is reflected by the
         corresponding object on the UniFi controller.
@@ -447,31 +530,23 @@ class UniFi(object):
         :type preprocess_item: function
         :param compare_items: optional callback function that compares two items
             based on custom attributes, if ommitted the default comparison checks
-            two items based on their name attributes (case invariant)
+            two items based on their name attributes (case invariant). Items
+            are matched via dict indexes if the comparator was built with
+            key_comparator.
         :type compare: function
+        :param items: optional input items, if ommitted they are taken from
+            the Ansible module parameter named by the API descriptor
+        :type items: any
+
+        With state 'exclusive' the input items are ensured like with state
+        'present' and all existing items which don't match any input item are
+        deleted, except for protected built-in items (see is_protected). The
+        module fails without any changes if more items would be deleted than
+        allowed by the module parameter max_deletions (negative values disable
+        the limit). The deletions are completed before any item is created or
+        updated.
         """
 
-        def _set_result(result_item, changed):
-            """
-            Inner shorthand method which appends a resulting item to the
-            appropriate list in the result structure. Creates the list if it is
-            not already present
-
-            :param result_item: the result item that should be appended to the
-                result list
-            :type result_item: dict:
-            :param changed: indicates that the item was changed
-            :type changed: bool:
-            """
-            result_data = self.__result.get(api.param_name, [])
-            if isinstance(result_item, list):
-                result_data.extend(result_item)
-            else:
-                result_data.append(result_item)
-            self.__result[api.param_name] = result_data
-            self.__result['changed'] = (changed or self.__result.get('changed', False))
-
-
         def _state_ignore(input_item, matching_items):
             """
             Handles item operation for state 'ignore'.
@@ -484,8 +559,54 @@ class UniFi(object):
             :type matching_items: list:
             """
             for matching_item in matching_items:
-                _set_result(matching_item, False)
-        
+                slots.append((matching_item, 'unchanged', None, None))
+
+        # writes are planned while the input items are processed and sent as
+        # a single batch afterwards, slots keep the order of the results as
+        # tuples of (item, action, write index, changed keys)
+        writes = []
+        write_indexes = {}
+        slots = []
+        unchanged = []
+        simulated = []
+
+        def _write(item, _id=None, delete=False, changed_keys=None):
+            """
+            Inner shorthand method which plans a write of an item. Writes of
+            the same object are only sent once, since the object already
+            contains all updates.
+
+            :param item: the item to create or update, or the item to delete
+            :type item: dict:
+            :param _id: the id of an existing item
+            :type _id: str:
+            :param delete: delete the item instead of updating it
+            :type delete: bool:
+            :param changed_keys: the names of the changed attributes
+            :type changed_keys: list:
+            """
+            action = 'deleted' if delete else 'updated' if _id is not None \
+                else 'created'
+            if self.check_mode:
+                # later references to the item resolve as if it was written
+                if not delete:
+                    self.resolver.plan(api, item)
+                simulated.append(item)
+                slots.append((item, action, None, changed_keys))
+                return
+            key = ('DELETE' if delete else 'PUT', _id) \
+                if _id is not None else None
+            index = write_indexes.get(key) if key else None
+            if index is None:
+                index = len(writes)
+                request = {'api': api, '_id': _id}
+                if not delete:
+                    request['data'] = item
+                writes.append((request, item))
+                if key:
+                    write_indexes[key] = index
+            slots.append((item, action, index, changed_keys))
+
         def _state_present(input_item, matching_items):
             """
             Handles item operation for state 'present'.
@@ -501,18 +622,20 @@ class UniFi(object):
 
             if matching_items:
                 for matching_item in matching_items:
+                    changed_keys = []
                     changed = self.update_item(api, input_item, matching_item,
-                                            require_absent, prepare_update)
-            
-                    if changed and not self.check_mode:
-                        matching_item = self.send(api=api, data=matching_item,
-                                                _id=api.extract_id(matching_item))
-                    _set_result(matching_item, changed and not self.check_mode)
+                                            require_absent, prepare_update,
+                                            changed_keys)
+
+                    if changed:
+                        _write(matching_item, _id=api.extract_id(matching_item),
+                               changed_keys=changed_keys)
+                    else:
+                        unchanged.append(matching_item)
+                        slots.append((matching_item, 'unchanged', None, None))
             else:
-                if not self.check_mode:
-                    input_item = self.send(api=api, data=input_item)
-                _set_result(input_item, not self.check_mode)
-        
+                _write(input_item)
+
         def _state_absent(input_item, matching_items):
             """
             Handles item operation for state 'absent'.
@@ -525,52 +648,208 @@ class UniFi(object):
             :type matching_items: list:
             """
             for matching_item in matching_items:
-                if not self.check_mode:
-                    self.send(api=api, _id=api.extract_id(matching_item))
-                _set_result(matching_item, not self.check_mode)
+                _write(matching_item, _id=api.extract_id(matching_item),
+                       delete=True)
+
+        def _flush():
+            """
+            Sends the planned writes concurrently and sets the results in the
+            order of the input items. Deletions are sent as a batch of their
+            own before all other writes, so that created and updated items
+            may take over e.g. the names or VLANs of deleted items.
+
+            :raises Exception: if any write failed, the message contains the
+                errors of all failed writes in the order of the input items
+            """
+            responses = [None] * len(writes)
+            for delete in (True, False):
+                indexes = [index for index, (request, _) in enumerate(writes)
+                           if ('data' not in request) is delete]
+                if not indexes:
+                    continue
+                for index, response in zip(indexes, self.__send_batch(
+                        [writes[index][0] for index in indexes],
+                        adaptive=True)):
+                    responses[index] = response
+            # existing items may have been changed in place
+            if writes or simulated:
+                self.__forget_collections(api)
+
+            if unchanged:
+                self.info('{count} of {total} {type} unchanged',
+                          count=len(unchanged), total=len(slots),
+                          type=api.param_name)
+
+            errors = []
+            for item, action, index, changed_keys in slots:
+                if index is None:
+                    self.report(api.param_name, item, action, changed=False,
+                                changed_keys=changed_keys)
+                    continue
+                response = responses[index]
+                if 'error' in response:
+                    request, _ = writes[index]
+                    error = '{action} {type} {item}: {error}'.format(
+                        action='delete' if 'data' not in request else
+                        'update' if request['_id'] is not None else 'create',
+                        type=api.param_name,
+                        item=item.get('name') or request['_id'],
+                        error=response['error'])
+                    if error not in errors:
+                        errors.append(error)
+                    continue
+                self.report(api.param_name,
+                            item if action == 'deleted' else response['result'],
+                            action, changed_keys=changed_keys)
+
+            if errors:
+                raise Exception('{count} of {total} writes failed: {errors}'
+                                .format(count=len(errors), total=len(writes),
+                                        errors='; '.join(errors)))
 
         try:
             match self.param('state'):
                 case 'ignore' | None:
                     state_handler = _state_ignore
-                case 'present' | True:
+                case 'present' | 'exclusive' | True:
                     state_handler = _state_present
                 case 'absent' | False:
                     state_handler = _state_absent
                 case other_state:
                     raise ValueError(f'Got unexpected value for requested state: {other_state}')
 
-            existing_items = self.send(api=api.getter)
-
+            if items is None:
+                items = self.param(api.param_name)
             if preprocess_item:
-                input_items = preprocess_item(self, self.param(api.param_name))
+                input_items = preprocess_item(self, items)
                 if not isinstance(input_items, list):
                     input_items = [input_items]
             else:
-                input_items = [self.param(api.param_name)]
+                input_items = [items]
 
+            try:
+                ids = [api.extract_id(input_item) for input_item in input_items]
+            except (KeyError, TypeError):
+                ids = None
+            exclusive = self.param('state') == 'exclusive'
+            # unchanged objects are only needed in full for full results
+            trimmed = self.param('result_mode', default='full') != 'full' or \
+                bool(self.param('return_fields', default=None))
+            prefetched = self.__collections.get((api.getter, None))
+            # only the id comparator applies as long as all ids are found,
+            # otherwise the items are matched by name against the whole
+            # collection
+            by_id = ids and api.getter.id_lookup and not exclusive and \
+                compare_items is None
+            if prefetched is not None:
+                existing_items = list(prefetched)
+            elif by_id and \
+                    (found := self.__fetch_ids(api, ids)) is not None:
+                existing_items = found
+            elif trimmed and not exclusive and compare_items is None and \
+                    prepare_update is None and api.default_id:
+                # the connection plugin matches by id and name like the
+                # comparators below and only passes on the matched objects
+                self.debug('Matching {count} {type} in the connection',
+                           count=len(input_items), type=api.param_name)
+                matches = self.diff(
+                    api, [{key: value for key, value in item.items()
+                           if key != UniFi.__MISSING_KEY}
+                          for item in input_items],
+                    absent=[item.get(UniFi.__MISSING_KEY, [])
+                            for item in input_items],
+                    fields=self.param('return_fields', default=None))
+                existing_items = list({existing['_id']: existing
+                                       for found in matches
+                                       for existing in found}.values())
+            else:
+                existing_items = self.send(api=api.getter)
+
+            comparators = [UniFi.key_comparator(UniFi.name_key),
+                           UniFi.build_id_comparator(api.extract_id)]
+            if compare_items:
+                comparators.append(compare_items)
+            comparators.reverse()
+            key_indexes = {}
+
+            def _match(comparator, input_item):
+                """
+                Finds the existing items which match an input item. Key
+                comparators use an index of the existing items which is built
+                on first use, other comparators are applied to every item.
+                """
+                key_function = getattr(comparator, 'key', None)
+                if key_function is None:
+                    return [existing_item for existing_item in existing_items
+                            if comparator(input_item, existing_item)]
+                key = key_function(input_item)
+                if key is None:
+                    return []
+                index = key_indexes.get(comparator)
+                if index is None:
+                    index = key_indexes[comparator] = {}
+                    for existing_item in existing_items:
+                        existing_key = key_function(existing_item)
+                        if existing_key is not None:
+                            index.setdefault(existing_key, []).append(
+                                existing_item)
+                return list(index.get(key, []))
+
+            matched = set()
             for input_item in input_items:
-                self.trace(f'Preparing input item {input_item}')
-                comparators = [UniFi.name_comparator, UniFi.build_id_comparator(api.extract_id)]
-                if compare_items:
-                    comparators.append(compare_items)
+                self.trace('Preparing input item {item}',
+                           item=Pretty(input_item))
 
                 matching_items = []
-                while not matching_items and comparators:
-                    comparator = comparators.pop()
-                    self.trace(f'Comparing items using {comparator}')
-                    matching_items = list(filter(lambda existing_item: 
-                        comparator(input_item, existing_item), existing_items))
+                for comparator in comparators:
+                    self.trace('Comparing items using {comparator}',
+                               comparator=comparator)
+                    matching_items = _match(comparator, input_item)
+                    if matching_items:
+                        break
+                matched.update(id(item) for item in matching_items)
+
+                keys = {comparator: [comparator.key(item)
+                                     for item in matching_items]
+                        for comparator in key_indexes}
 
                 self.trace('Processing input item')
                 state_handler(input_item, matching_items)
 
+                # updates may change the keys of existing items
+                for comparator, item_keys in keys.items():
+                    if item_keys != [comparator.key(item)
+                                     for item in matching_items]:
+                        del key_indexes[comparator]
+
+            if exclusive:
+                stale = [existing_item for existing_item in existing_items
+                         if id(existing_item) not in matched and
+                         not UniFi.is_protected(existing_item)]
+                max_deletions = self.param('max_deletions', default=-1)
+                if 0 <= max_deletions < len(stale):
+                    raise Exception(
+                        'Refusing to delete {count} {type} (max_deletions is '
+                        '{max}): {names}'.format(
+                            count=len(stale), type=api.param_name,
+                            max=max_deletions,
+                            names=', '.join(str(item.get('name') or
+                                                api.extract_id(item))
+                                            for item in stale)))
+                for existing_item in stale:
+                    _write(existing_item, _id=api.extract_id(existing_item),
+                           delete=True)
+
+            _flush()
+
+        except TaskExit:
+            raise
         except Exception as e:
             if self.__logger.enabled:
                 self.__result['trace'] = format_exc()
             self.fail(str(e))
 
-    def send(self, api: ApiDescriptor, site=None, result_path=['data'], **kwargs):
+    def send(self, api: ApiDescriptor, site=None, result_path=None, **kwargs):
         """
         Convenience method that sends a request to the UniFi REST API.
 
@@ -578,8 +857,8 @@ class UniFi(object):
         the path here usually contains the one or two last path elements, e.g.
         /rest/networkconf
 
-        :raises KeyError: if the UniFi response object doesn't match the
-            expected structure
+        :raises ConnectionError: if the UniFi response object doesn't match
+            the expected structure
 
         :param api: the API descriptor
         :type api: ApiDescriptor
@@ -588,7 +867,8 @@ class UniFi(object):
         :type site: str
         :param result_path: a list of path elements to navigate the response
             from the UniFi REST API (typically contains the actual response data
-            under the attribute 'data' of the response object)
+            under the attribute 'data' of the response object), if ommitted
+            the result path of the API descriptor applies
         :type result_path: list
         :param \\**kwargs: any further keyword arguments will be passed on to
             the UniFi connection plugin
@@ -596,24 +876,494 @@ class UniFi(object):
         :returns: the UniFi response object
         :rtype: dict
         """
+        if result_path is not None:
+            kwargs['result_path'] = result_path
+        if not kwargs.get('readonly') and kwargs.get('method') != 'GET' and \
+                (kwargs.get('data') is not None or kwargs.get('_id')):
+            self.__forget_collections(api)
+        return self.connection.send_request(
+            **self.__request_kwargs(api, site, kwargs))
+
+    def collection(self, api: ApiDescriptor, site=None):
+        """
+        Convenience method that retrieves all objects of a collection as an
+        indexed view, so that lookups by attribute values don't scan the
+        collection. The collection is only fetched once per module run and
+        fetched again after it was modified via `send`.
+
+        Example:
+
+        * collection(networkconf).find(vlan=503)
+
+        :param api: the API descriptor, its getter is used to fetch the
+            collection
+        :type api: ApiDescriptor
+        :param site: the optional name of the site, if ommitted will be taken
+            from the API descriptor or the Ansible module param
+        :type site: str
+        :returns: the objects of the collection
+        :rtype: IndexedCollection
+        """
+        key = (api.getter, site)
+        collection = self.__collections.get(key)
+        if collection is None:
+            collection = self.__collections[key] = IndexedCollection(
+                self.send(api.getter, site=site))
+        return collection
+
+    def find(self, api: ApiDescriptor, filters=None, fields=None, limit=None,
+             site=None):
+        """
+        Convenience method that queries a collection by attribute values.
+        The query is answered by the hash indexes of the connection plugin,
+        so that only the matching objects are passed on to the module, or
+        locally if the collection has already been fetched by this module
+        run.
+
+        Example:
+
+        * find(portconf, filters={'name': 'LAN access'}, limit=1)
+
+        :param api: the API descriptor, its getter is queried
+        :type api: ApiDescriptor
+        :param filters: optional, required attribute values of the objects,
+            integer and string values match each other
+        :type filters: dict
+        :param fields: optional, the attributes of the objects to return
+        :type fields: list
+        :param limit: optional, the maximum number of objects to return
+        :type limit: int
+        :param site: the optional name of the site, if ommitted will be taken
+            from the API descriptor or the Ansible module param
+        :type site: str
+        :returns: the matching objects
+        :rtype: list
+        """
+        collection = self.__collections.get((api.getter, site))
+        if collection is None:
+            return self.connection.find(
+                self.__request_kwargs(api.getter, site, {}), filters, fields,
+                limit)
+        items = collection.find_all(**(filters or {}))
+        if limit:
+            items = items[:limit]
+        if fields:
+            items = [{key: item[key] for key in fields if key in item}
+                     for item in items]
+        return items
+
+    def lookup_ids(self, api: ApiDescriptor, values, keys=None, filters=None,
+                   site=None):
+        """
+        Convenience method that resolves references (e.g. names) to the ids
+        of the referenced objects with the hash indexes of the connection
+        plugin, so that only the ids are passed on to the module, or locally
+        if the collection has already been fetched by this module run.
+
+        Example:
+
+        * lookup_ids(networkconf, ['LAN', 'IoT'])
+        * lookup_ids(networkconf, [503], keys=['vlan'])
+
+        :param api: the API descriptor, its getter is queried
+        :type api: ApiDescriptor
+        :param values: the references
+        :type values: list
+        :param keys: optional, the attributes which are looked up in order,
+            defaults to '_id' and 'name'
+        :type keys: list
+        :param filters: optional, further required attribute values
+        :type filters: dict
+        :param site: the optional name of the site, if ommitted will be taken
+            from the API descriptor or the Ansible module param
+        :type site: str
+        :returns: the ids in the order of the values, None for values which
+            don't match any object
+        :rtype: list
+        """
+        collection = self.__collections.get((api.getter, site))
+        if collection is None:
+            return self.connection.lookup_ids(
+                self.__request_kwargs(api.getter, site, {}), values, keys,
+                filters)
+        ids = []
+        for value in values:
+            items = []
+            for key in keys or ('_id', 'name'):
+                items = collection.find_all(**dict(filters or {},
+                                                   **{key: value}))
+                if items:
+                    break
+            ids.append(items[0].get('_id') if items else None)
+        return ids
+
+    def diff(self, api: ApiDescriptor, items, absent=None, fields=None,
+             site=None):
+        """
+        Convenience method that matches desired items with the objects of a
+        collection by id and name (case invariant) within the connection
+        plugin. Objects which need to be updated are returned complete,
+        objects which already match are reduced to the attributes which
+        verify that (see diff of the connection plugin).
+
+        :param api: the API descriptor, its getter is queried
+        :type api: ApiDescriptor
+        :param items: the desired items
+        :type items: list
+        :param absent: optional, for each desired item the attributes which
+            must not occur on its objects
+        :type absent: list
+        :param fields: optional, further attributes of unchanged objects to
+            return
+        :type fields: list
+        :param site: the optional name of the site, if ommitted will be taken
+            from the API descriptor or the Ansible module param
+        :type site: str
+        :returns: for each desired item the list of its matching objects
+        :rtype: list
+        """
+        return self.connection.diff(
+            self.__request_kwargs(api.getter, site, {}), items,
+            absent=absent, fields=fields)
+
+    def prefetch(self, apis, site=None):
+        """
+        Convenience method that fetches the collections of several API
+        descriptors concurrently with a single call to the connection plugin,
+        so that the following calls of `collection` (and `ensure_item`) for
+        these descriptors don't require further requests. Collections which
+        have already been fetched are skipped.
+
+        Example:
+
+        * prefetch([apgroups, networkconf])
+
+        :param apis: the API descriptors, their getters are used to fetch the
+            collections
+        :type apis: list
+        :param site: the optional name of the site, if ommitted will be taken
+            from the API descriptors or the Ansible module param
+        :type site: str
+        """
+        getters = []
+        for api in apis:
+            if (api.getter, site) not in self.__collections and \
+                    api.getter not in getters:
+                getters.append(api.getter)
+        if not getters:
+            return
+        self.debug('Prefetching {count} collections', count=len(getters))
+        responses = self.send_many([{'api': getter, 'site': site}
+                                    for getter in getters])
+        for getter, items in zip(getters, responses):
+            self.__collections[(getter, site)] = IndexedCollection(items)
+
+    def __forget_collections(self, api: ApiDescriptor):
+        """
+        Drops the fetched collections of an API descriptor after a request
+        which modifies it.
+
+        :param api: the API descriptor
+        :type api: ApiDescriptor
+        """
+        for key in [key for key in self.__collections
+                    if key[0] in (api, api.getter)]:
+            del self.__collections[key]
+
+    def select(self, api: ApiDescriptor, filters=None, fields=None, limit=None,
+               site=None):
+        """
+        Convenience method that retrieves only selected items of a collection
+        from the UniFi REST API. The connection plugin parses the response
+        incrementally and only passes the selected items on to the module.
+
+        Example:
+
+        * select(networkconf, fields=['_id', 'name', 'vlan'])
+        * select(device, filters={'mac': mac}, limit=1)
+
+        :param api: the API descriptor
+        :type api: ApiDescriptor
+        :param filters: optional, required attribute values of the items,
+            values also match their string representation
+        :type filters: dict
+        :param fields: optional, the attributes of the items to return
+        :type fields: list
+        :param limit: optional, the maximum number of items to return
+        :type limit: int
+        :param site: the optional name of the site, if ommitted will be taken
+            from the API descriptor or the Ansible module param
+        :type site: str
+        :returns: the selected items
+        :rtype: list
+        """
+        return self.send(api, site=site, filters=filters, fields=fields,
+                         limit=limit)
+
+    def lookup_site_id(self, site=None):
+        """
+        Convenience method to look up the id of a site. The connection plugin
+        shares the site ids between all connections to the same controller,
+        so this usually does not require a request to the controller.
+
+        :param site: the optional name of the site, if ommitted will be taken
+            from the Ansible module param
+        :type site: str
+        :returns: the id of the site or None if there is no such site
+        :rtype: str
+        """
+        return self.connection.get_site_id(
+            site or self.param('site', default='default'))
+
+    def fetch_items(self, api: ApiDescriptor, ids=None, macs=None,
+                    filters=None, fields=None, site=None):
+        """
+        Convenience method that retrieves only particular objects of a
+        collection. If the caller knows the ids or MACs of the objects and the
+        getter of the API descriptor supports it, only these objects are
+        requested from the controller (i.e. GET <path>/<_id> or
+        POST <path> {"macs": [...]}). Otherwise the whole collection is listed
+        and filtered by the connection plugin.
 
-        request_kwargs = api.request_kwargs
+        Example:
+
+        * fetch_items(networkconf, ids=[network_id])
+        * fetch_items(device, macs=['f0:9f:c2:00:00:01'])
+        * fetch_items(device, filters={'name': 'Core switch'})
+
+        :param api: the API descriptor
+        :type api: ApiDescriptor
+        :param ids: optional, the ids of the objects
+        :type ids: list
+        :param macs: optional, the MAC addresses of the objects
+        :type macs: list
+        :param filters: optional, further required attribute values of the
+            objects, values also match their string representation
+        :type filters: dict
+        :param fields: optional, the attributes of the objects to return
+        :type fields: list
+        :param site: the optional name of the site, if ommitted will be taken
+            from the API descriptor or the Ansible module param
+        :type site: str
+        :returns: the matching objects
+        :rtype: list
+        """
+        getter = api.getter
+        filters = dict(filters or {})
+        local_filters = {}
+
+        if ids is not None and getter.id_lookup:
+            items = [item for items in self.send_many([
+                {'api': getter, 'site': site, '_id': _id, 'method': 'GET',
+                 'fields': fields} for _id in ids
+            ]) for item in items]
+        elif macs is not None and getter.mac_lookup:
+            items = self.send(getter, site=site, method='POST', readonly=True,
+                              data={'macs': [mac.lower() for mac in macs]},
+                              fields=fields)
+        else:
+            for key, values in (('_id', ids), ('mac', macs)):
+                if values is None:
+                    continue
+                if len(values) == 1:
+                    filters[key] = values[0].lower() if key == 'mac' \
+                        else values[0]
+                else:
+                    local_filters[key] = set(values)
+            if local_filters and fields:
+                fields = list(set(fields) | set(local_filters))
+            items = self.select(getter, filters=filters or None, fields=fields,
+                                site=site)
+            filters = {}
+
+        return [item for item in items
+                if all(item.get(key) == value or item.get(key) == str(value)
+                       for key, value in filters.items()) and
+                all(item.get(key) in values
+                    for key, values in local_filters.items())]
+
+    def __fetch_ids(self, api: ApiDescriptor, ids):
+        """
+        Requests objects by their ids (i.e. GET <path>/<_id>) for ensure_item.
+
+        :param api: the API descriptor, its getter must support id lookups
+        :type api: ApiDescriptor
+        :param ids: the ids of the objects
+        :type ids: list
+        :returns: the objects or None if not all ids were found
+        :rtype: list
+        """
+        if not all(isinstance(_id, str) and _id for _id in ids):
+            return None
+        self.debug('Fetching {count} {type} by id',
+                   count=len(ids), type=api.param_name)
+        responses = self.__send_batch(
+            [{'api': api.getter, '_id': _id, 'method': 'GET'}
+             for _id in dict.fromkeys(ids)])
+        if not all('error' not in response and response['result']
+                   for response in responses):
+            self.debug('Not all {type} found by id', type=api.param_name)
+            return None
+        return [item for response in responses
+                for item in response['result']]
+
+    def send_many(self, requests, adaptive=False):
+        """
+        Convenience method that sends a batch of independent requests to the
+        UniFi REST API with a single call to the connection plugin, which in
+        turn processes the requests concurrently.
+
+        Example:
+
+        * send_many([{'api': apgroups}, {'api': networkconf}])
+
+        :raises Exception: if any of the requests failed, the message contains
+            the errors of all failed requests
+
+        :param requests: a list of dicts, each one containing the keyword
+            arguments for a call to `send`, including the API descriptor under
+            the key 'api'
+        :type requests: list
+        :param adaptive: adapt the concurrency to the controller, see
+            send_requests of the connection plugin
+        :type adaptive: bool
+        :returns: the UniFi response objects in the same order as the requests
+        :rtype: list
+        """
+        responses = self.__send_batch(requests, adaptive)
+
+        errors = ['{path}: {error}'.format(path=request['api'].request_kwargs['path'],
+                                           error=response['error'])
+                  for request, response in zip(requests, responses)
+                  if 'error' in response]
+        if errors:
+            raise Exception('Batch request failed: ' + '; '.join(errors))
+
+        return [response['result'] for response in responses]
+
+    def __send_batch(self, requests, adaptive=False):
+        """
+        Sends a batch of requests with a single call to the connection plugin
+        and returns the raw responses.
+
+        :param requests: a list of dicts, each one containing the keyword
+            arguments for a call to `send`, including the API descriptor under
+            the key 'api'
+        :type requests: list
+        :param adaptive: adapt the concurrency to the controller, see
+            send_requests of the connection plugin
+        :type adaptive: bool
+        :returns: a list with one dict per request (in the same order) which
+            either contains the response under the key 'result' or an error
+            message under the key 'error'
+        :rtype: list
+        """
+        requests = [dict(request) for request in requests]
+        apis = [request.pop('api') for request in requests]
+        kwargs = [self.__request_kwargs(api, request.pop('site', None), request)
+                  for api, request in zip(apis, requests)]
+        return self.connection.send_requests(kwargs, adaptive)
+
+    def __request_kwargs(self, api: ApiDescriptor, site, kwargs):
+        """
+        Assembles the keyword arguments for a request to the connection plugin
+        from the API descriptor and the keyword arguments of the caller.
 
-        for key, value in request_kwargs.items():
+        :param api: the API descriptor
+        :type api: ApiDescriptor
+        :param site: the optional name of the site, if ommitted will be taken
+            from the API descriptor or the Ansible module param
+        :type site: str
+        :param kwargs: the keyword arguments of the caller, these take
+            precedence over the ones of the API descriptor
+        :type kwargs: dict
+        :returns: the keyword arguments for the connection plugin
+        :rtype: dict
+        """
+        if site:
+            kwargs['site'] = site
+        for key, value in api.request_kwargs.items():
             if key not in kwargs:
                 kwargs[key] = value
-        path = kwargs.pop('path')
-
-        if not site:
-            site = self.param('site', default='default')
-
-        result_item = self.connection.send_request(path=path,
-                                                   site=site,
-                                                   **kwargs)
-        for attr in api.result_path:
-            if attr not in result_item:
-                raise KeyError('UniFi API response does not include {path}, '
-                               'misses attribute {attr}'
-                               .format(path=', '.join(api.result_path), attr=attr))
-            result_item = result_item.get(attr, None)
-        return result_item
+        if not kwargs.get('site'):
+            kwargs['site'] = self.param('site', default='default')
+        kwargs.setdefault('cache_ttl', api.cache_ttl)
+        kwargs.setdefault('result_path', api.result_path)
+        if api.getter is not api:
+            kwargs.setdefault('invalidates',
+                              [api.getter.request_kwargs['path']])
+        return kwargs
+
+
+def _generate_api_methods(name, api: ApiDescriptor):
+    """
+    Factory for the getter and setter methods of an API descriptor. Names
+    which end with an 's' (e.g. 'settings') are taken as plural.
+
+    Example:
+
+    * get_networkconfs()
+    * get_networkconf(vlan=500)
+    * set_portconf(data=my_portconf)
+
+    :param name: The name (or type) of a UniFi API object
+    :type name: str
+    :param api: the API descriptor
+    :type api: ApiDescriptor
+    :returns: a dict which maps the method names to the methods
+    :rtype: dict
+    """
+    singular, plural = (name[:-1], name) if name.endswith('s') \
+        else (name, name + 's')
+
+    def items_getter(self, **kwargs) -> list:
+        """
+        Returns all {plural} objects, keyword arguments are passed on to send.
+        """
+        return self.send(api.getter, **kwargs)
+
+    def item_getter(self, **filter_kwargs) -> dict:
+        """
+        Returns the first {singular} object which matches all keyword
+        arguments, integer and string values match each other. Without
+        keyword arguments the object named by the module param '{singular}'
+        is returned. Lookups are answered by hash indexes of the connection
+        or of a collection which has already been fetched, see find.
+        """
+        if not filter_kwargs:
+            default = self.param(singular, default=None)
+            if default is not None:
+                filter_kwargs['name'] = default
+        items = self.find(api, filters=filter_kwargs, limit=1)
+        return items[0] if items else None
+
+    def item_setter(self, **item_kwargs) -> dict:
+        """
+        Sends a {singular} object, keyword arguments are passed on to send.
+        """
+        return self.send(api, **item_kwargs)
+
+    methods = {}
+    for prefix, method_name, method in (('get_', plural, items_getter),
+                                        ('get_', singular, item_getter),
+                                        ('set_', singular, item_setter)):
+        method.__name__ = prefix + method_name
+        method.__qualname__ = 'UniFi.' + method.__name__
+        method.__doc__ = method.__doc__.format(singular=singular,
+                                               plural=plural)
+        methods[method.__name__] = method
+    return methods
+
+
+def _install_api_methods():
+    """
+    Adds the getter and setter methods of all API descriptors to the UniFi
+    class, methods which are already defined take precedence.
+    """
+    for name, api in DESCRIPTORS.items():
+        for method_name, method in _generate_api_methods(name, api).items():
+            if not hasattr(UniFi, method_name):
+                setattr(UniFi, method_name, method)
+
+
+_install_api_methods()
@@ -6,12 +6,16 @@
 
 class ApiDescriptor(object):
 
-    def __init__(self, param_name, request_kwargs, id_extractor=None, getter=None, result_path=None):
+    def __init__(self, param_name, request_kwargs, id_extractor=None, getter=None, result_path=None, cache_ttl=None,
+                 id_lookup=False, mac_lookup=False):
         self.__param_name = param_name
         self.__request_kwargs = request_kwargs
         self.__id_extractor = id_extractor
         self.__getter = getter
         self.__result_path = result_path
+        self.__cache_ttl = cache_ttl
+        self.__id_lookup = id_lookup
+        self.__mac_lookup = mac_lookup
 
     @property
     def param_name(self):
@@ -21,6 +25,11 @@ class ApiDescriptor(object):
     def request_kwargs(self):
         return self.__request_kwargs
 
+    @property
+    def default_id(self):
+        # objects are identified by their attribute _id
+        return self.__id_extractor is None
+
     def extract_id(self, item):
         from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi import UniFi
 
@@ -35,6 +44,20 @@ class ApiDescriptor(object):
     def result_path(self):
         return self.__result_path if self.__result_path is not None else ['data']
 
+    @property
+    def cache_ttl(self):
+        return self.__cache_ttl
+
+    @property
+    def id_lookup(self):
+        # supports GET <path>/<_id> for a single object
+        return self.__id_lookup
+
+    @property
+    def mac_lookup(self):
+        # supports POST <path> {"macs": [...]} for selected devices
+        return self.__mac_lookup
+
 site = ApiDescriptor(
             param_name='site',
             request_kwargs={
@@ -42,7 +65,8 @@ site = ApiDescriptor(
                 'path_prefix': '/api/',
                 'site': 'self',
                 'proxy': 'network'
-            }
+            },
+            cache_ttl=300
         )
 
 __key_id_extractor = lambda x: x['key']
@@ -66,9 +90,18 @@ settings = ApiDescriptor(
 device = ApiDescriptor(
             param_name='device',
             request_kwargs={
-                'path': '/stat/device',
+                'path': '/rest/device',
                 'proxy': 'network'
-            }
+            },
+            getter=ApiDescriptor(
+                param_name='device',
+                request_kwargs={
+                    'path': '/stat/device',
+                    'proxy': 'network'
+                },
+                cache_ttl=10,
+                mac_lookup=True
+            )
         )
 
 networkconf = ApiDescriptor(
@@ -76,7 +109,8 @@ networkconf = ApiDescriptor(
             request_kwargs={
                 'path': '/rest/networkconf',
                 'proxy': 'network'
-            }
+            },
+            id_lookup=True
         )
 
 apgroups = ApiDescriptor(
@@ -93,7 +127,8 @@ wlanconf = ApiDescriptor(
             request_kwargs={
                 'path': '/rest/wlanconf',
                 'proxy': 'network'
-            }
+            },
+            id_lookup=True
         )
 
 portconf = ApiDescriptor(
@@ -101,7 +136,8 @@ portconf = ApiDescriptor(
             request_kwargs={
                 'path': '/rest/portconf',
                 'proxy': 'network'
-            }
+            },
+            id_lookup=True
         )
     
 ccode = ApiDescriptor(
@@ -109,5 +145,11 @@ ccode = ApiDescriptor(
             request_kwargs={
                 'path': '/stat/ccode',
                 'proxy': 'network'
-            }
+            },
+            cache_ttl=3600
         )
+
+#: all API descriptors of this module by name, the UniFi helper provides
+#: get_<name>, get_<name>s and set_<name> methods for each of them
+DESCRIPTORS = {name: value for name, value in list(globals().items())
+               if isinstance(value, ApiDescriptor)}
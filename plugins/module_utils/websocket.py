@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from base64 import b64encode
+from hashlib import sha1
+from os import urandom
+from socket import create_connection, timeout as SocketTimeout
+from struct import pack, unpack_from
+from threading import Event, Thread
+from time import monotonic
+
+
+class WebSocket(object):
+    """
+    A minimal websocket client (RFC 6455) which is sufficient to receive the
+    event stream of a UniFi controller. Only unfragmented messages are sent,
+    received messages may be fragmented.
+    """
+
+    #: the GUID which is used to verify the handshake of the server
+    GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+    OPCODE_CONTINUATION = 0x0
+    OPCODE_TEXT = 0x1
+    OPCODE_BINARY = 0x2
+    OPCODE_CLOSE = 0x8
+    OPCODE_PING = 0x9
+    OPCODE_PONG = 0xA
+
+    def __init__(self, host, port, path, headers=None, ssl_context=None,
+                 timeout=None):
+        """
+        Initialize self.
+
+        :param host: the host name of the server
+        :type host: str
+        :param port: the port of the server
+        :type port: int
+        :param path: the path of the websocket endpoint
+        :type path: str
+        :param headers: optional additional headers of the handshake request,
+            e.g. cookies
+        :type headers: dict
+        :param ssl_context: optional SSL context, if set the connection uses
+            TLS (wss)
+        :type ssl_context: ssl.SSLContext
+        :param timeout: optional socket timeout in seconds
+        :type timeout: float
+        """
+        self.__host = host
+        self.__port = port
+        self.__path = path
+        self.__headers = headers or {}
+        self.__ssl_context = ssl_context
+        self.__timeout = timeout
+        self.__socket = None
+        self.__buffer = bytearray()
+        self.__fragments = []
+        self.__opcode = None
+        self.__last_received = None
+        self.__pinged = None
+
+    @property
+    def last_received(self):
+        """
+        The monotonic time when the last frame (including control frames)
+        was received.
+
+        :rtype: float
+        """
+        return self.__last_received
+
+    @property
+    def responsive(self):
+        """
+        Indicates if the server has sent anything since the last ping.
+
+        :rtype: bool
+        """
+        return self.__pinged is None or self.__last_received >= self.__pinged
+
+    def connect(self):
+        """
+        Opens the connection and performs the websocket handshake.
+
+        :raises ConnectionError: if the server rejects the handshake
+        """
+        sock = create_connection((self.__host, self.__port), self.__timeout)
+        if self.__ssl_context:
+            sock = self.__ssl_context.wrap_socket(
+                sock, server_hostname=self.__host)
+        self.__socket = sock
+
+        key = b64encode(urandom(16)).decode('ascii')
+        headers = dict({
+            'Host': '{host}:{port}'.format(host=self.__host, port=self.__port),
+            'Upgrade': 'websocket',
+            'Connection': 'Upgrade',
+            'Sec-WebSocket-Key': key,
+            'Sec-WebSocket-Version': '13'
+        }, **self.__headers)
+        request = 'GET {path} HTTP/1.1\r\n{headers}\r\n\r\n'.format(
+            path=self.__path,
+            headers='\r\n'.join('{name}: {value}'.format(name=name,
+                                                        value=value)
+                                for name, value in headers.items()))
+        sock.sendall(request.encode('utf-8'))
+
+        while b'\r\n\r\n' not in self.__buffer:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise ConnectionError('Websocket handshake was interrupted')
+            self.__buffer += chunk
+        head, rest = bytes(self.__buffer).split(b'\r\n\r\n', 1)
+        self.__buffer = bytearray(rest)
+        self.__last_received = monotonic()
+        lines = head.decode('iso-8859-1').split('\r\n')
+        status = lines[0].split(' ', 2)
+        if len(status) < 2 or status[1] != '101':
+            raise ConnectionError('Websocket handshake failed: ' + lines[0])
+        response_headers = dict((name.strip().lower(), value.strip())
+                                for name, _, value in
+                                (line.partition(':') for line in lines[1:]))
+        accept = b64encode(sha1((key + self.GUID).encode('ascii')).digest())
+        if response_headers.get('sec-websocket-accept') != \
+                accept.decode('ascii'):
+            raise ConnectionError('Websocket handshake returned an invalid '
+                                  'accept key')
+
+    def __fill(self, size):
+        while len(self.__buffer) < size:
+            chunk = self.__socket.recv(max(size - len(self.__buffer), 4096))
+            if not chunk:
+                raise ConnectionError('Websocket connection was closed')
+            self.__buffer += chunk
+
+    def __read_frame(self):
+        """
+        Reads the next frame. The frame is only removed from the buffer once
+        it is complete, so that a socket timeout leaves the stream intact.
+
+        :returns: a tuple of the fin flag, the opcode and the payload
+        :rtype: tuple
+        """
+        self.__fill(2)
+        first, second = self.__buffer[0], self.__buffer[1]
+        length = second & 0x7F
+        offset = 2
+        if length == 126:
+            self.__fill(4)
+            length = unpack_from('!H', self.__buffer, 2)[0]
+            offset = 4
+        elif length == 127:
+            self.__fill(10)
+            length = unpack_from('!Q', self.__buffer, 2)[0]
+            offset = 10
+        mask = None
+        if second & 0x80:
+            self.__fill(offset + 4)
+            mask = bytes(self.__buffer[offset:offset + 4])
+            offset += 4
+        self.__fill(offset + length)
+        payload = bytes(self.__buffer[offset:offset + length])
+        del self.__buffer[:offset + length]
+        self.__last_received = monotonic()
+        if mask:
+            payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+        return bool(first & 0x80), first & 0x0F, payload
+
+    def send(self, payload, opcode=OPCODE_TEXT):
+        """
+        Sends a single, masked frame.
+
+        :param payload: the payload of the frame
+        :type payload: bytes or str
+        :param opcode: the opcode of the frame
+        :type opcode: int
+        """
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        length = len(payload)
+        if length < 126:
+            header = pack('!BB', 0x80 | opcode, 0x80 | length)
+        elif length < 65536:
+            header = pack('!BBH', 0x80 | opcode, 0x80 | 126, length)
+        else:
+            header = pack('!BBQ', 0x80 | opcode, 0x80 | 127, length)
+        mask = urandom(4)
+        self.__socket.sendall(header + mask + bytes(
+            byte ^ mask[i % 4] for i, byte in enumerate(payload)))
+
+    def ping(self):
+        """
+        Sends a ping, the pong of the server updates last_received.
+        """
+        self.__pinged = monotonic()
+        self.send(b'', self.OPCODE_PING)
+
+    def recv(self):
+        """
+        Receives the next message. Pings are answered and control frames are
+        handled transparently.
+
+        :raises socket.timeout: if no message arrived within the timeout, the
+            connection remains usable
+
+        :returns: the message (str for text, bytes for binary messages) or
+            None if the server closed the connection
+        :rtype: str
+        """
+        while True:
+            fin, opcode, payload = self.__read_frame()
+            if opcode == self.OPCODE_PING:
+                self.send(payload, self.OPCODE_PONG)
+                continue
+            if opcode == self.OPCODE_PONG:
+                continue
+            if opcode == self.OPCODE_CLOSE:
+                try:
+                    self.send(payload[:2], self.OPCODE_CLOSE)
+                except OSError:
+                    pass
+                self.close()
+                return None
+            if opcode != self.OPCODE_CONTINUATION:
+                self.__opcode = opcode
+            self.__fragments.append(payload)
+            if fin:
+                message = b''.join(self.__fragments)
+                self.__fragments = []
+                return message.decode('utf-8') \
+                    if self.__opcode == self.OPCODE_TEXT else message
+
+    def close(self):
+        """
+        Closes the connection.
+        """
+        if self.__socket is not None:
+            try:
+                self.__socket.close()
+            finally:
+                self.__socket = None
+
+
+class EventListener(Thread):
+    """
+    Background thread which keeps a websocket connection open, reconnects
+    with a delay if it is lost and passes all received messages on to a
+    callback.
+
+    The websocket should have a timeout, whenever it expires without any
+    message the listener sends a ping and the connection is considered lost
+    if the server hasn't responded by the next timeout.
+    """
+
+    def __init__(self, connect, on_message, on_disconnect=None,
+                 reconnect_delay=5):
+        """
+        Initialize self.
+
+        :param connect: callable without arguments which returns a connected
+            WebSocket
+        :type connect: function
+        :param on_message: callable which accepts each received message
+        :type on_message: function
+        :param on_disconnect: optional callable which accepts the error (or
+            None) whenever the connection is lost or could not be established
+        :type on_disconnect: function
+        :param reconnect_delay: delay in seconds before reconnecting
+        :type reconnect_delay: float
+        """
+        super(EventListener, self).__init__(daemon=True)
+        self.__connect = connect
+        self.__on_message = on_message
+        self.__on_disconnect = on_disconnect
+        self.__reconnect_delay = reconnect_delay
+        self.__stopped = Event()
+        self.__connected = Event()
+        self.__websocket = None
+
+    @property
+    def connected(self):
+        """
+        Indicates if the listener is currently receiving messages.
+
+        :rtype: bool
+        """
+        return self.__connected.is_set()
+
+    def run(self):
+        while not self.__stopped.is_set():
+            error = None
+            try:
+                self.__websocket = self.__connect()
+                self.__connected.set()
+                while not self.__stopped.is_set():
+                    try:
+                        message = self.__websocket.recv()
+                    except SocketTimeout:
+                        if not self.__websocket.responsive:
+                            raise ConnectionError('Websocket server did not '
+                                                  'respond to ping')
+                        self.__websocket.ping()
+                        continue
+                    if message is None:
+                        break
+                    self.__on_message(message)
+            except Exception as e:
+                error = e
+            finally:
+                self.__connected.clear()
+                if self.__websocket is not None:
+                    self.__websocket.close()
+                    self.__websocket = None
+            if self.__stopped.is_set():
+                break
+            if self.__on_disconnect:
+                self.__on_disconnect(error)
+            self.__stopped.wait(self.__reconnect_delay)
+
+    def stop(self):
+        """
+        Stops the listener and closes its connection.
+        """
+        self.__stopped.set()
+        websocket = self.__websocket
+        if websocket is not None:
+            websocket.close()
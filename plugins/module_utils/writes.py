@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from collections import OrderedDict
+from threading import Lock
+
+
+class WriteQueue(object):
+    """
+    A queue of deferred updates of objects on the UniFi controller. Updates
+    of the same object are merged field-wise, so that a single request per
+    object is sent when the queue is flushed.
+
+    Entries are keyed by (proxy, path_prefix, site, path, _id). Each entry
+    keeps the merged fields, a snapshot of the object as it was on the
+    controller when it was queued first (to detect concurrent changes) and
+    the paths of all collections which list the object (to present pending
+    updates in responses of later requests).
+
+    :ivar __entries: the queued entries in the order of their first update
+    :vartype __entries: OrderedDict
+    """
+
+    def __init__(self):
+        """
+        Initialize self.
+        """
+        self.__entries = OrderedDict()
+        self.__lock = Lock()
+
+    @property
+    def pending(self):
+        """
+        Indicates if there are any queued updates.
+
+        :rtype: bool
+        """
+        return bool(self.__entries)
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+    def put(self, key, data, base, paths):
+        """
+        Queues an update of an object. The fields of the update are merged
+        with the fields of previous updates of the same object.
+
+        :param key: the queue key of the object
+        :type key: tuple
+        :param data: the fields to update
+        :type data: dict
+        :param base: the object as it is on the controller, only used if the
+            object is queued for the first time
+        :type base: dict
+        :param paths: the paths of the collections which list the object
+        :type paths: list
+        :returns: the object including all queued updates
+        :rtype: dict
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                entry = self.__entries[key] = {
+                    'data': {}, 'base': base or {}, 'paths': set(), 'count': 0
+                }
+            entry['data'].update((field, value) for field, value in data.items()
+                                 if field != '_id')
+            entry['paths'].update(paths)
+            entry['count'] += 1
+            return dict(entry['base'], **entry['data'])
+
+    def discard(self, key):
+        """
+        Drops the queued updates of an object, e.g. because it was deleted.
+
+        :param key: the queue key of the object
+        :type key: tuple
+        :returns: True if updates were dropped
+        :rtype: bool
+        """
+        with self.__lock:
+            return self.__entries.pop(key, None) is not None
+
+    def affects(self, site, path):
+        """
+        Indicates if there are queued updates of objects which are listed by a
+        collection.
+
+        :param site: the name of the site
+        :type site: str
+        :param path: the path of the collection
+        :type path: str
+        :rtype: bool
+        """
+        with self.__lock:
+            return any(key[2] == site and path in entry['paths']
+                       for key, entry in self.__entries.items())
+
+    def overlay(self, site, path, items):
+        """
+        Applies the queued updates to the objects of a collection, so that
+        later requests see the state the controller will have after a flush.
+
+        :param site: the name of the site
+        :type site: str
+        :param path: the path of the collection
+        :type path: str
+        :param items: the objects of the collection, updated in place
+        :type items: list
+        :returns: the number of updated objects
+        :rtype: int
+        """
+        with self.__lock:
+            updates = {key[4]: entry['data']
+                       for key, entry in self.__entries.items()
+                       if key[2] == site and path in entry['paths']}
+        count = 0
+        for item in items:
+            data = updates.get(item.get('_id')) if isinstance(item, dict) \
+                else None
+            if data:
+                item.update(data)
+                count += 1
+        return count
+
+    def drain(self):
+        """
+        Removes all entries from the queue.
+
+        :returns: a list of tuples of queue keys and entries
+        :rtype: list
+        """
+        with self.__lock:
+            entries = list(self.__entries.items())
+            self.__entries.clear()
+            return entries
+
+    @classmethod
+    def conflicts(cls, entry, current):
+        """
+        Determines the fields of a queued entry which have been changed on the
+        controller since the entry was queued, unless they already have the
+        queued value.
+
+        :param entry: the queued entry
+        :type entry: dict
+        :param current: the object as it is on the controller now
+        :type current: dict
+        :returns: the names of the conflicting fields
+        :rtype: list
+        """
+        return sorted(field for field, value in entry['data'].items()
+                      if current.get(field) != entry['base'].get(field) and
+                      current.get(field) != value)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: unifi_config
+version_added: "1.0"
+author: "Sebastian Gmeiner (@bastig)"
+short_description: Defines the configuration of a whole UniFi site
+description:
+  - This module takes the desired state of several resource types of a site
+    at once and reconciles them in a single module run.
+  - All required collections are fetched once and concurrently, references
+    between the resources (e.g. the network of a wlan or the port profile of
+    a device port) are resolved in memory.
+  - Resources are written in dependency order, i.e. settings and networks
+    first, then wlans and port profiles and finally device ports. Deletions
+    (state absent) are applied in reverse order, settings are not deleted.
+  - In check mode, references to resources which would be created resolve
+    to placeholder ids, e.g. C(<planned network 1>).
+extends_documentation_fragment: gmeiner.unifi
+options:
+  state:
+    description:
+      - Specifies if the resources need to be added (default) or deleted
+    required: false
+    choices: ['present','absent','ignore']
+  settings:
+    description:
+      - The global settings, see unifi_settings
+    type: dict
+    required: false
+  networks:
+    description:
+      - The network configurations, see unifi_networkconf
+    type: list
+    required: false
+  wlans:
+    description:
+      - The wlan configurations, see unifi_wlanconf
+    type: list
+    required: false
+  portconfs:
+    description:
+      - The switch port profiles, see unifi_portconf
+    type: list
+    required: false
+  ports:
+    description:
+      - The device ports, each one with the keys device (MAC address or
+        name), port (index or name), portconf (name of a port profile) and
+        optionally override (further attributes of the port override) and
+        state
+    type: list
+    required: false
+'''
+
+EXAMPLES = r'''
+- name: Configure the site
+  gmeiner.unifi.unifi_config:
+    networks:
+      - name: IoT
+        vlan: 510
+        ip_subnet: 172.20.110.1/24
+    wlans:
+      - name: IoT
+        networkconf: IoT
+        x_passphrase: "{{ iot_passphrase }}"
+    portconfs:
+      - name: IoT access
+        native_networkconf: 510
+    ports:
+      - device: Core switch
+        port: 7
+        portconf: IoT access
+'''
+
+RETURN = r'''
+settings:
+    description: The resulting global settings
+    type: list
+    returned: if settings were given
+networks:
+    description: The resulting network configurations
+    type: list
+    returned: if networks were given
+wlans:
+    description: The resulting wlan configurations
+    type: list
+    returned: if wlans were given
+portconf:
+    description: The resulting switch port profiles
+    type: list
+    returned: if portconfs were given
+ports:
+    description: The resulting port overrides, one entry per device
+    type: list
+    returned: if ports were given
+summary:
+    description: The number of created, updated, deleted and unchanged items
+      per result key
+    type: dict
+    returned: always
+'''
+
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi import UniFi
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi_api import \
+    apgroups, ccode, networkconf, portconf, settings, wlanconf
+from ansible_collections.gmeiner.unifi.plugins.module_utils.resources import \
+    preprocess_networkconf, compare_networkconf, prepare_update_networkconf, \
+    preprocess_wlanconf, preprocess_portconf, preprocess_settings, \
+    compare_settings, ensure_ports
+
+
+def preprocess_portconfs(unifi, portconfs):
+    return [preprocess_portconf(unifi, item) for item in portconfs]
+
+
+def required_apis(unifi):
+    # the collections which are needed to reconcile the given resources
+    apis = []
+    if unifi.param('settings') and unifi.param('state') != 'absent':
+        apis.append(settings)
+        if 'code' in unifi.param('settings').get('country', {}):
+            apis.append(ccode)
+    if unifi.param('networks'):
+        apis.append(networkconf)
+    if unifi.param('wlans'):
+        apis.extend([wlanconf, apgroups, networkconf])
+    if unifi.param('portconfs'):
+        apis.extend([portconf, networkconf])
+    if unifi.param('ports'):
+        apis.append(portconf)
+    return apis
+
+
+def main(module_class=None):
+    # define available arguments/parameters a user can pass to the module
+    module_args = dict(
+        settings=dict(type='dict', required=False),
+        networks=dict(type='list', elements='dict', required=False),
+        wlans=dict(type='list', elements='dict', required=False),
+        portconfs=dict(type='list', elements='dict', required=False),
+        ports=dict(type='list', elements='dict', required=False)
+    )
+
+    # initialize UniFi helper object
+    unifi = UniFi(argument_spec=module_args, module_class=module_class)
+    state = unifi.param('state')
+
+    # fetch all required collections at once
+    try:
+        unifi.prefetch(required_apis(unifi))
+    except Exception as e:
+        unifi.fail(str(e))
+
+    def ensure_ports_phase(ports):
+        try:
+            results = ensure_ports(unifi, ports, state)
+        except Exception as e:
+            unifi.fail(str(e))
+        for result in results:
+            del result['ports']
+            unifi.report('ports', result,
+                         'updated' if result['changed'] else 'unchanged',
+                         changed=result['changed'] and not unifi.check_mode)
+
+    # phases in dependency order, each one with the name of its parameter
+    phases = [
+        ('settings', lambda items: unifi.ensure_item(
+            settings, preprocess_item=preprocess_settings,
+            compare_items=compare_settings, items=items)),
+        ('networks', lambda items: unifi.ensure_item(
+            networkconf, preprocess_item=preprocess_networkconf,
+            compare_items=compare_networkconf,
+            prepare_update=prepare_update_networkconf, items=items)),
+        ('wlans', lambda items: unifi.ensure_item(
+            wlanconf, preprocess_item=preprocess_wlanconf, items=items)),
+        ('portconfs', lambda items: unifi.ensure_item(
+            portconf, preprocess_item=preprocess_portconfs, items=items)),
+        ('ports', ensure_ports_phase)
+    ]
+    if state == 'absent':
+        phases = [phase for phase in reversed(phases)
+                  if phase[0] != 'settings']
+
+    for name, phase in phases:
+        items = unifi.param(name)
+        if items:
+            unifi.debug('Reconciling {name}', name=name)
+            phase(items)
+
+    # return the results
+    unifi.exit()
+
+
+if __name__ == '__main__':
+    main()
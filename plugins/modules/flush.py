@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: unifi_flush
+version_added: "1.0"
+author: "Sebastian Gmeiner (@bastig)"
+short_description: Flushes deferred updates to the UniFi controller
+description:
+  - This module sends all updates which have been deferred by the UniFi
+    connection plugin (ansible_unifi_defer_writes) to the controller, so that
+    multiple updates of the same object result in a single request.
+  - Remaining deferred updates are also flushed when the connection is
+    closed, use this module to control the point in time and to get notified
+    about conflicts.
+extends_documentation_fragment: gmeiner.unifi
+options:
+  fail_on_conflict:
+    description:
+      - Fail if an object could not be updated, e.g. because a queued field
+        has been changed on the controller in the meantime
+    type: bool
+    required: false
+    default: true
+'''
+
+EXAMPLES = r'''
+- name: Assign port profiles to many ports of a switch
+  gmeiner.unifi.unifi_port:
+    device: Core switch
+    port: "{{ item }}"
+    portconf: LAN access with PoE
+  loop: "{{ range(1, 25) | list }}"
+  vars:
+    ansible_unifi_defer_writes: true
+
+- name: Provision the switch once
+  gmeiner.unifi.unifi_flush:
+'''
+
+RETURN = r'''
+writes:
+    description: The deferred updates, one per object, with their status
+    type: list
+    returned: always
+'''
+
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi import UniFi
+
+
+def main(module_class=None):
+    # define available arguments/parameters a user can pass to the module
+    module_args = dict(
+        fail_on_conflict=dict(type='bool', required=False, default=True)
+    )
+
+    # initialize UniFi helper object
+    unifi = UniFi(argument_spec=module_args, module_class=module_class)
+
+    # deferred updates are only queued outside of check mode
+    writes = [] if unifi.check_mode else unifi.connection.flush_writes()
+    unifi.result['writes'] = writes
+    unifi.result['changed'] = any(write['status'] == 'flushed'
+                                  for write in writes)
+
+    failed = [write for write in writes if write['status'] != 'flushed']
+    if failed and unifi.param('fail_on_conflict'):
+        unifi.fail('{count} deferred updates could not be flushed: {writes}',
+                   count=len(failed),
+                   writes=', '.join('{path}/{_id} ({status})'.format(**write)
+                                    for write in failed))
+
+    # return the results
+    unifi.exit()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,6 @@
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 
 from __future__ import (absolute_import, division, print_function)
-from ipaddress import ip_interface, ip_address
 from itertools import islice
 
 __metaclass__ = type
@@ -23,10 +22,19 @@ extends_documentation_fragment: gmeiner.unifi
 options:
   state:
     description:
-      - Specifies if the network configuration needs to be added (default) or
+      - Specifies if the network configurations need to be added (default) or
         deleted
+      - With C(exclusive) the network configurations are added and all other
+        existing ones are deleted, except for built-in ones
     required: false
-    choices: ['present','absent','ignore']
+    choices: ['present','absent','ignore','exclusive']
+  max_deletions:
+    description:
+      - The maximum number of items which may be deleted with state
+        C(exclusive), the module fails without any changes if more items
+        would be deleted. A negative value disables the limit.
+    type: int
+    default: 10
   networks:
     description:
       - A list of network configurations that will be submitted to the
@@ -63,6 +71,15 @@ EXAMPLES = r'''
     networks:
       - vlan: 504
 
+- name: Define all networks and remove any other one
+  gmeiner.unifi.unifi_networkconf:
+    state: exclusive
+    max_deletions: 2
+    result_mode: changed_only
+    networks:
+      - name: Test network 503
+        vlan: 503
+        ip_subnet: 172.20.100.1/24
 '''
 
 RETURN = r'''
@@ -70,72 +87,30 @@ networks:
     description: The resulting network configurations
     type: list
     returned: always
+summary:
+    description: The number of created, updated, deleted and unchanged items
+      per result key
+    type: dict
+    returned: always
 '''
 
 from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi import UniFi
 from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi_api import networkconf
+from ansible_collections.gmeiner.unifi.plugins.module_utils.resources import \
+    preprocess_networkconf, compare_networkconf, prepare_update_networkconf
 
 
-def preprocess_networkconf(unifi, networks):
-    for network in networks:
-        if 'vlan' in network:
-            network['vlan_enabled'] = True
-            network['vlan'] = str(network['vlan'])
-        if 'purpose' not in network:
-            network['purpose'] = 'corporate'
-        if 'networkgroup' not in network:
-            network['networkgroup'] = 'LAN'
-    return networks
-        
-
-def compare_networkconf(net_a, net_b):
-    if net_a.get('purpose', 'corporate') != net_b.get('purpose', 'corporate'):
-        return False
-
-    has_vlan_a = 'vlan_enabled' in net_a
-    has_vlan_b = 'vlan_enabled' in net_b
-
-    if has_vlan_a != has_vlan_b:
-        return False
-
-    if has_vlan_a and has_vlan_b:
-        return (
-            (not net_a['vlan_enabled'] and not net_b['vlan_enabled']) or
-            (net_a['vlan_enabled'] and net_b['vlan_enabled'] and
-             net_a['vlan'] == net_b['vlan'])
-        )
-
-    return net_a['name'].lower() == net_b['name'].lower()
-
-def prepare_update_networkconf(input, existing):
-  if 'ip_subnet' in input and \
-      'dhcpd_start' not in input and \
-      'dhcpd_stop' not in input and \
-      input['ip_subnet'] != existing.get('ip_subnet'):
-    dhcpd_start = 6
-    dhcpd_stop = -1
-    if 'ip_subnet' in existing and 'dhcpd_start' in existing:
-      dhcpd_start = int(ip_address(existing['dhcpd_start'])) \
-                    - int(ip_interface(existing['ip_subnet']).network.network_address)
-    if 'ip_subnet' in existing and 'dhcpd_stop' in existing:
-      dhcpd_stop = int(ip_address(existing['dhcpd_stop'])) \
-                   - int(ip_interface(existing['ip_subnet']).network.broadcast_address)
-
-    hosts = list(ip_interface(input['ip_subnet']).network.hosts())
-    if dhcpd_start < len(hosts) + dhcpd_stop:
-      input['dhcpd_start'] = format(hosts[dhcpd_start - 1])
-      input['dhcpd_stop'] = format(hosts[dhcpd_stop])
-
-def main():
+def main(module_class=None):
     # define available arguments/parameters a user can pass to the module
     module_args = {
         networkconf.param_name: {
             'type': 'list', 'required': True
-        }
+        },
+        **UniFi.EXCLUSIVE_ARGS
     }
 
     # initialize UniFi helper object
-    unifi = UniFi(argument_spec=module_args)
+    unifi = UniFi(argument_spec=module_args, module_class=module_class)
 
     # ensure that the input item will be reflected in the requested state
     # on the UniFi controller
@@ -67,71 +67,25 @@ EXAMPLES = r'''
 '''
 
 RETURN = r'''
-portconf:
-    description: The resulting switch port profile (typically one)
+ports:
+    description: The resulting port overrides of the device
     type: list
     returned: always
+summary:
+    description: The number of created, updated, deleted and unchanged items
+      per result key
+    type: dict
+    returned: always
 '''
 
 from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi import UniFi
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi_api import \
+    device as device_api
+from ansible_collections.gmeiner.unifi.plugins.module_utils.resources import \
+    get_device, get_port_idx, update_port_overrides
 
 
-def get_port_idx(port, device):
-    port_idx = None
-    port_name = None
-    if isinstance(port, int) or (isinstance(port, str) and port.isnumeric()):
-        port_idx = int(port)
-    else:
-        port_name = port
-
-    for device_port in device['port_table']:
-        if device_port['port_idx'] == port_idx or \
-                device_port['name'] == port_name:
-            return device_port['port_idx']
-
-def update_port_overrides(unifi, port_overrides, port_idx):
-    port = unifi.param('override')
-    port['port_idx'] = port_idx
-
-    portconf = unifi.param('portconf', default=None)
-    if portconf is not None:
-        portconf = unifi.get_portconf(name=portconf)
-        if not portconf:
-            unifi.fail('Could not find portconf {portconf}',
-                       portconf=unifi.param('portconf'))
-        port['portconf_id'] = portconf['_id']
-
-    require_absent = []
-
-    for key in ['name', 'autoneg', 'full_duplex', 'poe_mode', 'speed']:
-        if key not in port:
-            require_absent.append(key)
-
-    found = False
-    change_required = False
-    remove_items = []
-    for port_override in port_overrides:
-        if port_override['port_idx'] == port_idx:
-            found = True
-            if unifi.param('state') == 'present':
-                change_required = UniFi.update_item(port, port_override,
-                                                    require_absent,
-                                                    log=unifi.log)
-            elif unifi.param('state') == 'absent':
-                remove_items.append(port_override)
-                change_required = True
-    
-    if unifi.param('state') == 'present':
-        if not found:
-            port_overrides.append(port)
-            change_required = True
-    else:
-        for item in remove_items:
-            port_overrides.remove(item)
-
-    return change_required
-
-def main():
+def main(module_class=None):
     # define available arguments/parameters a user can pass to the module
     module_args = dict(
         port=dict(required=True),
@@ -146,19 +100,51 @@ def main():
     ]
 
     # initialize UniFi helper object
-    unifi = UniFi(argument_spec=module_args,
+    unifi = UniFi(argument_spec=module_args, module_class=module_class,
                   required_if=required_if)
 
-    device = unifi.get_device()
-    port_idx = get_port_idx(unifi.param('port'), device)
+    device = get_device(unifi, unifi.param('device'))
+    if device is None:
+        unifi.fail('Could not find device {device}',
+                   device=unifi.param('device'))
+    port = dict(unifi.param('override'),
+                port_idx=get_port_idx(unifi.param('port'), device))
+
+    portconf = unifi.param('portconf', default=None)
+    if portconf is not None:
+        port['portconf_id'] = unifi.resolver.portconf_id(portconf)
+        try:
+            unifi.resolver.check()
+        except Exception as e:
+            unifi.fail(str(e))
+
     port_overrides = device['port_overrides']
-    change_required = update_port_overrides(unifi, port_overrides, port_idx)
+    previous = next((port_override for port_override in port_overrides
+                     if port_override['port_idx'] == port['port_idx']), None)
+    changed_keys = []
+    change_required = update_port_overrides(unifi, port_overrides, port,
+                                            unifi.param('state'), changed_keys)
     if change_required and not unifi.check_mode:
-        unifi.send('/rest/device', _id=device['_id'], data={
+        unifi.send(api=device_api, _id=device['_id'], data={
             'port_overrides': port_overrides
         })
-        unifi.result['changed'] = True
-    unifi.result['ports'] = port_overrides
+
+    # report the affected override with its action and all others unchanged
+    if not change_required:
+        action = 'unchanged'
+    elif unifi.param('state') == 'absent':
+        action = 'deleted'
+        unifi.report('ports', previous, action,
+                     changed=not unifi.check_mode)
+    else:
+        action = 'updated' if previous else 'created'
+    for port_override in port_overrides:
+        affected = port_override['port_idx'] == port['port_idx']
+        unifi.report('ports', port_override,
+                     action if affected else 'unchanged',
+                     changed=affected and change_required and
+                     not unifi.check_mode,
+                     changed_keys=changed_keys if affected else None)
 
     # return the results
     unifi.exit()
@@ -63,76 +63,21 @@ portconf:
     description: The resulting switch port profile (typically one)
     type: list
     returned: always
+summary:
+    description: The number of created, updated, deleted and unchanged items
+      per result key
+    type: dict
+    returned: always
 '''
 
 from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi import UniFi
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi_api import \
+    portconf as portconf_api
+from ansible_collections.gmeiner.unifi.plugins.module_utils.resources import \
+    preprocess_portconf
 
 
-def get_networkconf_id(network, networks):
-    network_filter = (lambda x: x.get('purpose', 'corporate') == 'corporate' and
-                      x['name'] == network) if isinstance(network, str) else \
-                     (lambda x: x.get('purpose', 'corporate') == 'corporate' and
-                      x.get('vlan', None) == str(network))
-    for n in networks:
-        if network_filter(n):
-            return n['_id']
-    return None
-
-
-def preprocess_portconf(unifi, portconf):
-    site = unifi.get_site()
-    if site is None:
-        unifi.fail('Could not determine site for port profile {portconf}',
-                   portconf=portconf['name'])
-    portconf['site_id'] = site['_id']
-
-    networkconfs = unifi.get_networkconfs()
-
-    portconf['forward'] = 'disabled'
-
-    # lookup native network
-    native_networkconf = portconf.pop('native_networkconf', None)
-    if native_networkconf:
-        native_networkconf_id = get_networkconf_id(native_networkconf,
-                                                   networkconfs)
-        if native_networkconf_id is None:
-            unifi.fail('Could not determine native network for port '
-                       'profile {portconf}', portconf=portconf['name'])
-        portconf['native_networkconf_id'] = native_networkconf_id
-        portconf['forward'] = 'native'
-    else:
-        portconf['native_networkconf_id'] = ''
-
-    # lookup tagged networks
-    tagged_networkconfs = portconf.pop('tagged_networkconfs', None)
-    if tagged_networkconfs:
-        if tagged_networkconfs == 'all':
-            # tagged_networkconf_ids = [n['_id'] for n in networkconfs
-            #                           if n['purpose'] == 'corporate']
-            # portconf['tagged_networkconf_ids'] = tagged_networkconf_ids
-            portconf['forward'] = 'all'
-        else:
-            tagged_networkconf_ids = [
-                get_networkconf_id(tagged_networkconf, networkconfs)
-                for tagged_networkconf in tagged_networkconfs
-            ]
-            if None in tagged_networkconf_ids:
-                unifi.fail('Could not determine all tagged networks for '
-                           'port profile {portconf}', portconf=portconf['name'])
-            if 'native_networkconf_id' in portconf and \
-                    portconf['native_networkconf_id'] in tagged_networkconf_ids:
-                tagged_networkconf_ids.remove(portconf['native_networkconf_id'])
-            portconf['tagged_networkconf_ids'] = tagged_networkconf_ids
-            portconf['forward'] = 'customize'
-    else:
-        portconf['tagged_networkconf_ids'] = []
-
-    # update the PoE mode
-    if 'poe_mode' not in portconf:
-      UniFi.set_missing(portconf, 'poe_mode')
-
-
-def main():
+def main(module_class=None):
     # define available arguments/parameters a user can pass to the module
     module_args = dict(
         portconf=dict(type='dict', required=True),
@@ -140,11 +85,11 @@ def main():
     )
 
     # initialize UniFi helper object
-    unifi = UniFi(argument_spec=module_args)
+    unifi = UniFi(argument_spec=module_args, module_class=module_class)
 
     # ensure that the input item will be reflected in the requested state
     # on the UniFi controller
-    unifi.ensure_item('portconf',
+    unifi.ensure_item(portconf_api,
                       preprocess_item=preprocess_portconf)
 
     # return the results
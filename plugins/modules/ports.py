@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: unifi_ports
+version_added: "1.0"
+author: "Sebastian Gmeiner (@bastig)"
+short_description: Assigns port profiles to many UniFi device ports at once
+description:
+  - This module assigns switch port profiles and further port overrides to
+    any number of ports on any number of UniFi devices in a single run.
+  - The devices are fetched once, the ports are grouped by device and each
+    changed device is updated with a single request.
+extends_documentation_fragment: gmeiner.unifi
+options:
+  state:
+    description:
+      - Specifies if the port overrides need to be added or deleted, may be
+        overridden per port
+    required: false
+    choices: ['present','absent','ignore']
+  ports:
+    description:
+      - The device ports, each port may be given only once
+    type: list
+    elements: dict
+    required: true
+    suboptions:
+      device:
+        description:
+          - The device where the port is located (MAC address or name)
+        type: str
+        required: true
+      port:
+        description:
+          - The index or name of the port
+        type: raw
+        required: true
+      portconf:
+        description:
+          - The switch port profile that will be assigned to the port
+        type: str
+        required: false
+      override:
+        description:
+          - Further attributes of the port override
+        type: dict
+        required: false
+      state:
+        description:
+          - Specifies if the port override needs to be added or deleted,
+            defaults to the state of the module
+        type: str
+        required: false
+        choices: ['present','absent','ignore']
+'''
+
+EXAMPLES = r'''
+- name: Assign profiles to the ports of two switches
+  gmeiner.unifi.unifi_ports:
+    ports:
+      - device: Core switch
+        port: 1
+        portconf: DMZ networks trunk
+      - device: Core switch
+        port: 2
+        portconf: LAN access with PoE
+        override:
+          name: Printer
+      - device: 74:83:c2:00:00:01
+        port: Port 8
+        portconf: LAN access with PoE
+
+- name: Remove the override of a port
+  gmeiner.unifi.unifi_ports:
+    state: absent
+    ports:
+      - device: Core switch
+        port: 2
+'''
+
+RETURN = r'''
+devices:
+    description: The resulting port overrides, one entry per device
+    type: list
+    returned: always
+ports:
+    description: The affected port overrides, each one with its device
+    type: list
+    returned: always
+summary:
+    description: The number of created, updated, deleted and unchanged items
+      per result key
+    type: dict
+    returned: always
+'''
+
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi import UniFi
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi_api import \
+    portconf
+from ansible_collections.gmeiner.unifi.plugins.module_utils.resources import \
+    ensure_ports
+
+
+def main(module_class=None):
+    # define available arguments/parameters a user can pass to the module
+    module_args = dict(
+        ports=dict(type='list', elements='dict', required=True, options=dict(
+            device=dict(type='str', required=True),
+            port=dict(type='raw', required=True),
+            portconf=dict(type='str', required=False),
+            override=dict(type='dict', required=False),
+            state=dict(type='str', required=False,
+                       choices=['present', 'absent', 'ignore'])
+        )),
+
+        **UniFi.DEFAULT_ARGS
+    )
+
+    # initialize UniFi helper object
+    unifi = UniFi(argument_spec=module_args, module_class=module_class)
+    state = unifi.param('state')
+
+    try:
+        if any(port.get('portconf') is not None
+               for port in unifi.param('ports')):
+            unifi.prefetch([portconf])
+        results = ensure_ports(unifi, unifi.param('ports'), state)
+    except Exception as e:
+        unifi.fail(str(e))
+
+    changed = not unifi.check_mode
+    for result in results:
+        device = result['device']
+        for port_override, action, changed_keys in result.pop('ports'):
+            unifi.report('ports', dict(port_override, device=device), action,
+                         changed=action != 'unchanged' and changed,
+                         changed_keys=changed_keys)
+        unifi.report('devices', result,
+                     'updated' if result['changed'] else 'unchanged',
+                     changed=result['changed'] and changed)
+
+    # return the results
+    unifi.exit()
+
+
+if __name__ == '__main__':
+    main()
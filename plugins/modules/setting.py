@@ -39,33 +39,20 @@ settings:
     description: The resulting global settings (typically one)
     type: list
     returned: always
+summary:
+    description: The number of created, updated, deleted and unchanged items
+      per result key
+    type: dict
+    returned: always
 '''
 
 from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi import UniFi
-from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi_api import settings, ccode
-
-
-def preprocess_settings(unifi: UniFi, settings):
-    result = []
-    for key, value in settings.items():
-        value['key'] = key
-
-        if key == 'country' and 'code' in value:
-            ccodes = unifi.send(api=ccode)
-            code = next(filter(lambda x: x.get('key', None)
-                        == value['code'], ccodes), {}).get('code')
-            if code is None:
-                raise Exception('No such country code: ' + value)
-            value['code'] = code
-
-        result.append(value)
-    return result
-
-def compare_settings(setting_a, setting_b):
-    return 'key' in setting_a and 'key' in setting_b and setting_a['key'] == setting_b['key']
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi_api import settings
+from ansible_collections.gmeiner.unifi.plugins.module_utils.resources import \
+    preprocess_settings, compare_settings
 
 
-def main():
+def main(module_class=None):
     # define available arguments/parameters a user can pass to the module
     module_args = {
         settings.param_name: {
@@ -74,7 +61,7 @@ def main():
     }
 
     # initialize UniFi helper object
-    unifi = UniFi(argument_spec=module_args)
+    unifi = UniFi(argument_spec=module_args, module_class=module_class)
 
     unifi.ensure_item(settings,
                       preprocess_item=preprocess_settings,
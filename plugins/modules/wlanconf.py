@@ -21,10 +21,19 @@ extends_documentation_fragment: gmeiner.unifi
 options:
   state:
     description:
-      - Specifies if the wlan configuration needs to be added (default) or
+      - Specifies if the wlan configurations need to be added (default) or
         deleted
+      - With C(exclusive) the wlan configurations are added and all other
+        existing ones are deleted, except for built-in ones
     required: false
-    choices: ['present','absent','ignore']
+    choices: ['present','absent','ignore','exclusive']
+  max_deletions:
+    description:
+      - The maximum number of items which may be deleted with state
+        C(exclusive), the module fails without any changes if more items
+        would be deleted. A negative value disables the limit.
+    type: int
+    default: 10
   wlans:
     description:
       - A list of wlan configurations that will be submitted to the controller
@@ -67,54 +76,30 @@ wlans:
     description: The resulting wlan configurations
     type: list
     returned: always
+summary:
+    description: The number of created, updated, deleted and unchanged items
+      per result key
+    type: dict
+    returned: always
 '''
 
 from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi import UniFi
-from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi_api import wlanconf, apgroups, networkconf
-
-def preprocess_wlanconf(unifi: UniFi, wlans):
-
-    ap_groups = unifi.send(api=apgroups)
-    networkconfs = unifi.send(api=networkconf)
-
-    for wlan in wlans:
-        if 'ap_group_ids' in wlan or 'ap_groups' in wlan:
-            ap_group_ids = []
-            for ap_group_id in wlan.get('ap_group_ids', wlan.get('ap_groups', [])):
-                ap_group = next(filter(lambda x: x['_id'] == ap_group_id or x['name'] == ap_group_id, ap_groups), None)
-                ap_group_ids.append(ap_group['_id'] if ap_group else ap_group_id)
-            wlan.pop('ap_groups', None)
-            wlan['ap_group_ids'] = ap_group_ids
-        else:
-            wlan['ap_group_ids'] = [ap_group['_id'] for ap_group in filter(lambda x: x.get('attr_hidden_id') == 'default', ap_groups)]
-
-        if 'networkconf_id' in wlan or 'networkconf' in wlan:
-            network = wlan.get('networkconf_id', wlan.get('networkconf', None))
-            if isinstance(network, str):
-                network = next(filter(lambda networkconf: networkconf['_id'] == network or networkconf['name'] == network, networkconfs), None)
-            elif isinstance(network, int):
-                network = next(filter(lambda networkconf: networkconf['vlan'] == network, networkconfs), None)
-            else:
-                network = None
-
-            wlan.pop('networkconf', None)
-            if network:
-                wlan['networkconf_id'] = network['_id']
-            else:
-                unifi.info(f'Could not identify network {wlan["networkconf_id"]}')
-
-    return wlans
-
-def main():
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi_api import wlanconf
+from ansible_collections.gmeiner.unifi.plugins.module_utils.resources import \
+    preprocess_wlanconf
+
+
+def main(module_class=None):
     # define available arguments/parameters a user can pass to the module
     module_args = {
         wlanconf.param_name: {
             'type': 'list', 'required': True
-        }
+        },
+        **UniFi.EXCLUSIVE_ARGS
     }
 
     # initialize UniFi helper object
-    unifi = UniFi(argument_spec=module_args)
+    unifi = UniFi(argument_spec=module_args, module_class=module_class)
 
     # ensure that the input item will be reflected in the requested state
     # on the UniFi controller
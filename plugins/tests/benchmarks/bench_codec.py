@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+'''
+Compares the json module of the standard library with orjson on a large
+synthetic /stat/device document, and the incremental selection of a few
+items with JsonStream with parsing the whole document.
+
+Usage: python plugins/tests/benchmarks/bench_codec.py [switches]
+'''
+
+import json
+import os
+import sys
+from itertools import islice
+from timeit import repeat
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from support import link_collection  # noqa: E402
+
+link_collection()
+
+from ansible_collections.gmeiner.unifi.plugins.module_utils import codec  # noqa: E402,E501
+
+
+def device(index):
+    '''
+    Generates a switch with 48 ports in the format of /stat/device.
+    '''
+    mac = '74:83:c2:{0:02x}:{1:02x}:{2:02x}'.format(
+        index >> 16 & 255, index >> 8 & 255, index & 255)
+    return {
+        '_id': '5f{0:022x}'.format(index), 'mac': mac, 'type': 'usw',
+        'model': 'US48P500', 'name': 'Switch {0}'.format(index),
+        'version': '6.5.59.14777', 'adopted': True, 'state': 1,
+        'uptime': 1234567 + index, 'ip': '10.0.{0}.{1}'.format(
+            index // 250, index % 250 + 2),
+        'sys_stats': {'loadavg_1': '0.12', 'mem_total': 262144000,
+                      'mem_used': 123456789},
+        'port_overrides': [{'port_idx': port, 'portconf_id':
+                            '5f{0:022x}'.format(port % 5)}
+                           for port in range(1, 49, 3)],
+        'port_table': [{
+            'port_idx': port, 'name': 'Port {0}'.format(port),
+            'media': 'GE', 'poe_caps': 7, 'poe_mode': 'auto',
+            'poe_power': '2.31', 'speed': 1000, 'full_duplex': True,
+            'up': port % 3 != 0, 'enable': True, 'rx_bytes': 123456789 * port,
+            'tx_bytes': 987654321 * port, 'rx_packets': 1234567 * port,
+            'tx_packets': 7654321 * port, 'stp_state': 'forwarding',
+            'mac_table': [{'mac': '00:11:22:33:{0:02x}:{1:02x}'.format(
+                port, i), 'age': i, 'vlan': 10 + i} for i in range(port % 4)],
+        } for port in range(1, 49)],
+    }
+
+
+def best(statement, number=5):
+    return min(repeat(statement, number=number, repeat=3)) / number * 1000
+
+
+def main(switches=300):
+    document = {'meta': {'rc': 'ok'},
+                'data': [device(i) for i in range(switches)]}
+    compact = json.dumps(document, separators=(',', ':')).encode('utf-8')
+    indented = json.dumps(document, indent=4)
+    print('/stat/device with {n} switches: {compact:.1f} MB compact, '
+          '{indented:.1f} MB indented'.format(
+              n=switches, compact=len(compact) / 1e6,
+              indented=len(indented) / 1e6))
+
+    print('stdlib json')
+    print('  dumps (indented, as before):  {0:7.1f} ms'.format(
+        best(lambda: json.dumps(document, indent=4))))
+    print('  dumps (compact):              {0:7.1f} ms'.format(
+        best(lambda: json.dumps(document, separators=(',', ':')))))
+    print('  loads:                        {0:7.1f} ms'.format(
+        best(lambda: json.loads(compact))))
+    print('  fingerprint of one device:    {0:7.3f} ms'.format(
+        _fingerprint(document, False)))
+
+    if codec.HAS_ORJSON:
+        print('orjson')
+        print('  dumps:                        {0:7.1f} ms'.format(
+            best(lambda: codec.dumps(document))))
+        print('  loads:                        {0:7.1f} ms'.format(
+            best(lambda: codec.loads(compact))))
+        print('  fingerprint of one device:    {0:7.3f} ms'.format(
+            _fingerprint(document, True)))
+    else:
+        print('orjson is not installed')
+
+    def select_first():
+        stream = codec.JsonStream(compact)
+        stream.descend(['data'])
+        return list(islice(stream.items(), 3))
+
+    print('first 3 devices')
+    print('  JsonStream:                   {0:7.1f} ms'.format(
+        best(select_first)))
+    print('  loads everything:             {0:7.1f} ms'.format(
+        best(lambda: codec.loads(compact)['data'][:3])))
+
+
+def _fingerprint(document, use_orjson):
+    has_orjson = codec.HAS_ORJSON
+    codec.HAS_ORJSON = use_orjson
+    try:
+        return best(lambda: codec.fingerprint(document['data'][0]), 200)
+    finally:
+        codec.HAS_ORJSON = has_orjson
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
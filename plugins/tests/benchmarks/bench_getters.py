@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+'''
+Compares the getters which are generated once at import time with the
+former per-call lookup, which intercepted every attribute access of the
+UniFi helper and matched objects with a linear scan of the whole
+collection. The helper talks to an in-process httpapi plugin with a
+synthetic collection of networks, calls are passed through JSON like the
+calls over the socket of the persistent connection.
+
+Usage: python plugins/tests/benchmarks/bench_getters.py [networks]
+'''
+
+import json
+import os
+import sys
+from timeit import repeat
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from support import Connection, Rpc, httpapi_plugin, \
+    link_collection  # noqa: E402
+
+link_collection()
+
+from ansible_collections.gmeiner.unifi.plugins.action.unifi import \
+    TaskModule  # noqa: E402
+from ansible_collections.gmeiner.unifi.plugins.module_utils import \
+    unifi  # noqa: E402
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi import \
+    UniFi  # noqa: E402
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi_api import \
+    DESCRIPTORS  # noqa: E402
+
+PREFIX = '/proxy/network/api/s/default'
+
+
+class PerCallUniFi(UniFi):
+    '''
+    The UniFi helper with the former getters and setters, which were built
+    by __getattribute__ on every access.
+    '''
+
+    def __generate_setter(self, name):
+        def __item_setter(name, **item_kwargs):
+            return self.send(DESCRIPTORS[name], **item_kwargs)
+
+        if name in DESCRIPTORS:
+            return lambda **item_kwargs: __item_setter(name, **item_kwargs)
+
+    def __generate_getter(self, name):
+        def __items_getter(name):
+            return self.send(DESCRIPTORS[name].getter)
+
+        def __item_getter(name, **filter_kwargs):
+            if not filter_kwargs:
+                default = self.param(name, default=None)
+                if default is not None:
+                    filter_kwargs['name'] = default
+            for item in __items_getter(name):
+                match = True
+                for key, value in filter_kwargs.items():
+                    if item.get(key, None) != value and \
+                            item.get(key, None) != str(value):
+                        match = False
+                        break
+                if match:
+                    return item
+            return None
+
+        if name in DESCRIPTORS:
+            return lambda **filter_kwargs: __item_getter(name, **filter_kwargs)
+        if name[-1] == 's' and name[:-1] in DESCRIPTORS:
+            return lambda: __items_getter(name[:-1])
+        return None
+
+    def __getattribute__(self, name):
+        if name.startswith('get_'):
+            getter = self.__generate_getter(name[4:])
+            if getter:
+                return getter
+        if name.startswith('set_'):
+            setter = self.__generate_setter(name[4:])
+            if setter:
+                return setter
+        return super(PerCallUniFi, self).__getattribute__(name)
+
+
+def controller(networks):
+    body = json.dumps({'meta': {'rc': 'ok'}, 'data': [
+        {'_id': '5f{0:022x}'.format(index), 'name': 'Network {0}'.format(index),
+         'purpose': 'corporate', 'vlan_enabled': True, 'vlan': 100 + index,
+         'ip_subnet': '10.{0}.{1}.1/24'.format(index // 250, index % 250),
+         'dhcpd_enabled': True, 'networkgroup': 'LAN'}
+        for index in range(networks)]}).encode('utf-8')
+
+    def handler(method, path, data):
+        if path == '/api/system':
+            return 200, {}, b'{}'
+        if path == PREFIX + '/rest/networkconf':
+            return 200, {}, body
+        return 404, {}, b'{"meta": {"rc": "error"}}'
+    return handler
+
+
+def helper(helper_class):
+    def module_class(**module_specs):
+        return TaskModule({'site': 'default'}, False, '/dev/null',
+                          **module_specs)
+    return helper_class(module_class=module_class)
+
+
+def best(statement, number):
+    return min(repeat(statement, number=number, repeat=5)) / number * 1e6
+
+
+def main(networks=500):
+    Rpc.plugin = httpapi_plugin(Connection(controller(networks)),
+                                unifi_pool_size=0)
+    unifi.Connection = Rpc
+    per_call = helper(PerCallUniFi)
+    generated = helper(UniFi)
+    # the last network, so that the linear scan passes all of them
+    vlan = 100 + networks - 1
+    assert per_call.get_networkconf(vlan=vlan) == \
+        generated.get_networkconf(vlan=vlan)
+
+    print('UniFi helper, {n} networks'.format(n=networks))
+    for name, statement, number in (
+            ('check_mode', lambda unifi: unifi.check_mode, 100000),
+            ("param('site')", lambda unifi: unifi.param('site'), 100000),
+            ('get_networkconf(vlan=...)',
+             lambda unifi: unifi.get_networkconf(vlan=vlan), 50)):
+        print('  {name:27} per call {old:10.2f} us   generated {new:10.2f} us'
+              .format(name=name,
+                      old=best(lambda: statement(per_call), number),
+                      new=best(lambda: statement(generated), number)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+'''
+Compares sequential GET requests over a new TLS connection per request with
+requests over the keep-alive connection pool, against a local TLS server.
+
+Usage: python plugins/tests/benchmarks/bench_pool.py [requests]
+'''
+
+import os
+import ssl
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from support import HttpServer, certificate, link_collection  # noqa: E402
+
+link_collection()
+
+from ansible_collections.gmeiner.unifi.plugins.module_utils.pool import \
+    ConnectionPool  # noqa: E402
+
+BODY = b'{"meta": {"rc": "ok"}, "data": []}'
+
+
+def run(pool, count):
+    started = perf_counter()
+    for _ in range(count):
+        pool.request('GET', '/api/s/default/rest/networkconf')
+    return (perf_counter() - started) / count * 1000
+
+
+def main(count=200):
+    directory = tempfile.mkdtemp()
+    cert_path, key_path = certificate(directory)
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_context.load_cert_chain(cert_path, key_path)
+    server = HttpServer(lambda method, path, body: (200, {}, BODY),
+                        ssl_context=server_context)
+    client_context = ConnectionPool.ssl_context(ca_path=cert_path)
+
+    # max_size 0 closes every connection after its request
+    unpooled = ConnectionPool('localhost', server.port, max_size=0,
+                              ssl_context=client_context)
+    pooled = ConnectionPool('localhost', server.port, max_size=4,
+                            ssl_context=client_context)
+    print('{count} sequential GETs'.format(count=count))
+    print('  new connection per request: {ms:.2f} ms/request, {n} handshakes'
+          .format(ms=run(unpooled, count), n=unpooled.connects))
+    print('  pooled keep-alive:          {ms:.2f} ms/request, {n} handshakes'
+          .format(ms=run(pooled, count), n=pooled.connects))
+    pooled.close()
+    server.close()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+'''
+Compares prepare_update_networkconf, which moves the DHCP range with integer
+arithmetic, with the former implementation, which built the list of all
+hosts of the new subnet. The former implementation is only measured up to
+the given prefix length, larger subnets don't fit into memory.
+
+Usage: python plugins/tests/benchmarks/bench_rebase.py [min_prefix]
+'''
+
+import os
+import sys
+from ipaddress import ip_address, ip_interface
+from timeit import repeat
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from support import link_collection  # noqa: E402
+
+link_collection()
+
+from ansible_collections.gmeiner.unifi.plugins.module_utils.resources import \
+    prepare_update_networkconf  # noqa: E402
+
+CHANGES = [
+    ('/24', {'ip_subnet': '192.168.1.1/24', 'dhcpd_start': '192.168.1.6',
+             'dhcpd_stop': '192.168.1.254'},
+     {'ip_subnet': '192.168.2.1/24'}),
+    ('/16', {'ip_subnet': '192.168.1.1/24', 'dhcpd_start': '192.168.1.6',
+             'dhcpd_stop': '192.168.1.254'},
+     {'ip_subnet': '172.16.0.1/16'}),
+    ('/8', {'ip_subnet': '172.16.0.1/16', 'dhcpd_start': '172.16.0.6',
+            'dhcpd_stop': '172.16.255.254'},
+     {'ip_subnet': '10.0.0.1/8'}),
+    ('IPv6 /64', {'ipv6_subnet': '2001:db8:1::1/64',
+                  'dhcpdv6_start': '2001:db8:1::100',
+                  'dhcpdv6_stop': '2001:db8:1::7d1'},
+     {'ipv6_subnet': '2001:db8:2::1/64'}),
+]
+
+
+def former_prepare_update_networkconf(input, existing):
+    '''
+    The former implementation, which only handled IPv4 subnets.
+    '''
+    if 'ip_subnet' in input and \
+            'dhcpd_start' not in input and \
+            'dhcpd_stop' not in input and \
+            input['ip_subnet'] != existing.get('ip_subnet'):
+        dhcpd_start = 6
+        dhcpd_stop = -1
+        if 'ip_subnet' in existing and 'dhcpd_start' in existing:
+            dhcpd_start = int(ip_address(existing['dhcpd_start'])) - \
+                int(ip_interface(existing['ip_subnet']).network.network_address)
+        if 'ip_subnet' in existing and 'dhcpd_stop' in existing:
+            dhcpd_stop = int(ip_address(existing['dhcpd_stop'])) - \
+                int(ip_interface(existing['ip_subnet']).network.broadcast_address)
+
+        hosts = list(ip_interface(input['ip_subnet']).network.hosts())
+        if dhcpd_start < len(hosts) + dhcpd_stop:
+            input['dhcpd_start'] = format(hosts[dhcpd_start - 1])
+            input['dhcpd_stop'] = format(hosts[dhcpd_stop])
+
+
+def best(function, existing, input, number):
+    return min(repeat(lambda: function(dict(input), existing),
+                      number=number, repeat=3)) / number * 1000
+
+
+def main(min_prefix=16):
+    print('prepare_update_networkconf per call')
+    for name, existing, input in CHANGES:
+        updated = dict(input)
+        prepare_update_networkconf(updated, existing)
+        new = best(prepare_update_networkconf, existing, input, 1000)
+        subnet = input.get('ip_subnet')
+        if subnet and ip_interface(subnet).network.prefixlen >= min_prefix:
+            old = '{0:9.3f} ms'.format(best(former_prepare_update_networkconf,
+                                            existing, input, 1))
+        else:
+            old = '      n/a   '
+        print('  {name:9} former {old}   integer {new:7.3f} ms   {start} - '
+              '{stop}'.format(name=name, old=old, new=new,
+                              start=updated.get('dhcpd_start',
+                                                updated.get('dhcpdv6_start')),
+                              stop=updated.get('dhcpd_stop',
+                                               updated.get('dhcpdv6_stop'))))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
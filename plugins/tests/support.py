@@ -0,0 +1,527 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+'''
+Helpers for the unit tests and benchmarks: makes the collection importable
+and provides local stand-ins for the controller, a proxy and the event
+websocket.
+'''
+
+import json
+import os
+import socket
+import sys
+import tempfile
+from base64 import b64encode
+from datetime import datetime, timedelta, timezone
+from hashlib import sha1
+from http.client import HTTPMessage
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from select import select
+from struct import pack, unpack
+from threading import Thread
+from time import monotonic, sleep
+from urllib.error import HTTPError
+
+# the collection root, i.e. the directory which contains galaxy.yml
+COLLECTION_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+
+def link_collection():
+    '''
+    Makes the plugins importable as ansible_collections.gmeiner.unifi by
+    linking the collection into a temporary collection path, unless it is
+    already installed or checked out in one.
+    '''
+    try:
+        import ansible_collections.gmeiner.unifi  # noqa: F401
+        return
+    except ImportError:
+        pass
+    collections_path = tempfile.mkdtemp(prefix='unifi-tests-')
+    os.makedirs(os.path.join(collections_path, 'ansible_collections',
+                             'gmeiner'))
+    os.symlink(COLLECTION_ROOT, os.path.join(
+        collections_path, 'ansible_collections', 'gmeiner', 'unifi'))
+    sys.path.insert(0, collections_path)
+
+
+def certificate(directory, hostname='localhost'):
+    '''
+    Creates a self-signed certificate for a host name, requires the
+    cryptography package.
+
+    :param directory: the directory where the PEM files are written
+    :type directory: str
+    :param hostname: the host name of the certificate
+    :type hostname: str
+    :returns: a tuple of the paths of the certificate and the private key
+    :rtype: tuple
+    '''
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, hostname)])
+    now = datetime.now(timezone.utc)
+    cert = x509.CertificateBuilder() \
+        .subject_name(name).issuer_name(name) \
+        .public_key(key.public_key()) \
+        .serial_number(x509.random_serial_number()) \
+        .not_valid_before(now - timedelta(days=1)) \
+        .not_valid_after(now + timedelta(days=1)) \
+        .add_extension(x509.SubjectAlternativeName(
+            [x509.DNSName(hostname)]), critical=False) \
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None),
+                       critical=True) \
+        .sign(key, hashes.SHA256())
+
+    cert_path = os.path.join(directory, 'cert.pem')
+    key_path = os.path.join(directory, 'key.pem')
+    with open(cert_path, 'wb') as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM,
+                                  serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return cert_path, key_path
+
+
+class HttpServer(object):
+    '''
+    A local HTTP/1.1 server with keep-alive support which answers requests
+    with a handler function and records them.
+
+    :ivar requests: tuples of method, path and headers of all requests
+    :vartype requests: list
+    :ivar connections: the number of accepted connections
+    :vartype connections: int
+    '''
+
+    def __init__(self, handler, ssl_context=None):
+        '''
+        Initialize self and start serving in a background thread.
+
+        :param handler: callable which accepts the method, the path and the
+            body of a request and returns a tuple of the status, a dict of
+            headers and the body
+        :type handler: function
+        :param ssl_context: optional, serve HTTPS with this server context
+        :type ssl_context: ssl.SSLContext
+        '''
+        self.requests = []
+        self.connections = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # headers and body are written separately, avoid delayed ACKs
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                server.connections += 1
+                BaseHTTPRequestHandler.setup(self)
+
+            def handle_one_request(self):
+                try:
+                    BaseHTTPRequestHandler.handle_one_request(self)
+                except (ConnectionError, OSError):
+                    self.close_connection = True
+
+            def respond(self):
+                length = int(self.headers.get('content-length') or 0)
+                body = self.rfile.read(length) if length else None
+                server.requests.append((self.command, self.path,
+                                        dict(self.headers)))
+                status, headers, data = handler(self.command, self.path, body)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_DELETE = respond
+
+            def log_message(self, *args):
+                pass
+
+        self.__server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.__server.daemon_threads = True
+        if ssl_context is not None:
+            self.__server.socket = ssl_context.wrap_socket(
+                self.__server.socket, server_side=True)
+        self.port = self.__server.server_address[1]
+        Thread(target=self.__server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+
+class ConnectProxy(object):
+    '''
+    A local HTTP proxy which only supports tunnels (CONNECT) and records the
+    request heads it receives.
+
+    :ivar requests: the request heads of all tunnels
+    :vartype requests: list
+    '''
+
+    def __init__(self):
+        self.requests = []
+        self.__socket = socket.socket()
+        self.__socket.bind(('127.0.0.1', 0))
+        self.__socket.listen()
+        self.port = self.__socket.getsockname()[1]
+        Thread(target=self.__accept, daemon=True).start()
+
+    def __accept(self):
+        while True:
+            try:
+                client, _ = self.__socket.accept()
+            except OSError:
+                return
+            Thread(target=self.__tunnel, args=(client,), daemon=True).start()
+
+    def __tunnel(self, client):
+        head = b''
+        while b'\r\n\r\n' not in head:
+            chunk = client.recv(4096)
+            if not chunk:
+                client.close()
+                return
+            head += chunk
+        head = head.decode('latin-1')
+        self.requests.append(head)
+        host, _, port = head.split(' ')[1].rpartition(':')
+        upstream = socket.create_connection((host, int(port)))
+        client.sendall(b'HTTP/1.1 200 Connection established\r\n\r\n')
+
+        sockets = [client, upstream]
+        try:
+            while True:
+                readable, _, _ = select(sockets, [], [])
+                for source in readable:
+                    data = source.recv(65536)
+                    if not data:
+                        return
+                    (upstream if source is client else client).sendall(data)
+        except OSError:
+            pass
+        finally:
+            client.close()
+            upstream.close()
+
+    def close(self):
+        self.__socket.close()
+
+
+class Response(object):
+    '''
+    A minimal stand-in for the response objects of open_url.
+    '''
+
+    def __init__(self, status, headers=None, body=b''):
+        self.status = status
+        self.reason = 'OK' if status < 400 else 'Error'
+        self.headers = HTTPMessage()
+        for name, value in (headers or {}).items():
+            self.headers[name] = value
+        self.__body = body
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+    def read(self):
+        return self.__body
+
+
+class Connection(object):
+    '''
+    A stand-in for the httpapi connection plugin which answers requests with
+    a handler function, following the conventions of its send method for
+    authentication and error handling.
+
+    :ivar requests: tuples of method, path and data of all requests
+    :vartype requests: list
+    '''
+
+    #: options of the connection plugin, unknown options raise KeyError
+    OPTIONS = {
+        'host': 'localhost', 'port': None, 'use_ssl': False,
+        'validate_certs': True, 'use_proxy': True,
+        'persistent_command_timeout': 30, 'remote_user': 'admin',
+        'password': 'secret'
+    }
+
+    def __init__(self, handler=None, **options):
+        '''
+        Initialize self.
+
+        :param handler: callable which accepts the method, the path and the
+            data of a request and returns a tuple of the status, a dict of
+            headers and the body
+        :type handler: function
+        :param \\**options: options of the connection plugin
+        :type \\**options: any
+        '''
+        self.handler = handler
+        self.options = dict(Connection.OPTIONS, **options)
+        self.requests = []
+        self.connected = False
+        self.httpapi = None
+        self._auth = None
+
+    @property
+    def _url(self):
+        return '{scheme}://{host}:{port}'.format(
+            scheme='https' if self.options['use_ssl'] else 'http',
+            host=self.options['host'], port=self.options['port'])
+
+    def get_option(self, option):
+        return self.options[option]
+
+    def _connect(self):
+        self.connected = True
+
+    def send(self, path, data, method='GET', **kwargs):
+        self.requests.append((method, path, data))
+        status, headers, body = self.handler(method, path, data)
+        response = Response(status, headers, body)
+        if status >= 400:
+            exc = HTTPError(self._url + path, status, response.reason,
+                            response.headers, BytesIO(body))
+            handled = self.httpapi.handle_httperror(exc)
+            if handled is True:
+                return self.send(path, data, method=method, **kwargs)
+            if handled is False:
+                raise exc
+            response = handled
+        self._auth = self.httpapi.update_auth(response, BytesIO(body)) or \
+            self._auth
+        return response, BytesIO(body)
+
+
+def httpapi_plugin(connection, **options):
+    '''
+    Creates the httpapi plugin for a connection with the default values of
+    its options. Sharing of sessions and metadata is disabled unless it is
+    enabled explicitly.
+
+    :param connection: the connection, see Connection
+    :type connection: Connection
+    :param \\**options: options of the plugin which differ from the defaults
+    :type \\**options: any
+    :rtype: HttpApi
+    '''
+    import yaml
+    from ansible_collections.gmeiner.unifi.plugins.httpapi.httpapi import \
+        DOCUMENTATION, HttpApi
+
+    plugin = HttpApi(connection)
+    defaults = dict((name, spec.get('default')) for name, spec in
+                    yaml.safe_load(DOCUMENTATION)['options'].items())
+    defaults.update(unifi_session_path='', unifi_metadata_path='')
+    plugin._options = dict(defaults, **options)
+    connection.httpapi = plugin
+    return plugin
+
+
+class Rpc(object):
+    '''
+    Stands in for the JSON-RPC proxy of the persistent connection and calls
+    the httpapi plugin directly, e.g. by replacing the Connection class of
+    the UniFi helper. Arguments and results are passed through JSON like in
+    a real remote call.
+    '''
+
+    plugin = None
+
+    def __init__(self, socket_path):
+        pass
+
+    def __getattr__(self, name):
+        method = getattr(Rpc.plugin, name)
+
+        def call(*args, **kwargs):
+            return json.loads(json.dumps(method(*args, **kwargs)))
+        return call
+
+
+class WebSocketServer(object):
+    '''
+    A local websocket server (RFC 6455) which sends frames on demand and
+    records the frames it receives. Pings are answered with pongs.
+
+    :ivar requests: the handshake request heads of all connections
+    :vartype requests: list
+    :ivar frames: tuples of the opcode, the payload and the mask flag of
+        all received frames
+    :vartype frames: list
+    '''
+
+    GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+    def __init__(self, status='101 Switching Protocols', accept_key=None):
+        '''
+        Initialize self and start accepting connections.
+
+        :param status: the status line of the handshake response
+        :type status: str
+        :param accept_key: optional, a wrong accept key to send instead of
+            the correct one
+        :type accept_key: str
+        '''
+        self.requests = []
+        self.frames = []
+        self.clients = []
+        self.__status = status
+        self.__accept_key = accept_key
+        self.__socket = socket.socket()
+        self.__socket.bind(('127.0.0.1', 0))
+        self.__socket.listen()
+        self.port = self.__socket.getsockname()[1]
+        Thread(target=self.__accept, daemon=True).start()
+
+    @classmethod
+    def frame(cls, payload, opcode=0x1, fin=True, mask=None):
+        '''
+        Encodes a frame.
+
+        :param payload: the payload
+        :type payload: bytes
+        :param opcode: the opcode
+        :type opcode: int
+        :param fin: the frame is the last one of its message
+        :type fin: bool
+        :param mask: optional, a masking key of 4 bytes
+        :type mask: bytes
+        :rtype: bytes
+        '''
+        length = len(payload)
+        masked = 0x80 if mask else 0
+        if length < 126:
+            header = pack('!BB', (0x80 if fin else 0) | opcode, masked | length)
+        elif length < 65536:
+            header = pack('!BBH', (0x80 if fin else 0) | opcode, masked | 126,
+                          length)
+        else:
+            header = pack('!BBQ', (0x80 if fin else 0) | opcode, masked | 127,
+                          length)
+        if mask:
+            payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+            return header + mask + payload
+        return header + payload
+
+    def __accept(self):
+        while True:
+            try:
+                client, _ = self.__socket.accept()
+            except OSError:
+                return
+            Thread(target=self.__serve, args=(client,), daemon=True).start()
+
+    def __serve(self, client):
+        data = b''
+        while b'\r\n\r\n' not in data:
+            chunk = client.recv(4096)
+            if not chunk:
+                return
+            data += chunk
+        head = data.decode('latin-1')
+        self.requests.append(head)
+        key = [line.split(':', 1)[1].strip() for line in head.split('\r\n')
+               if line.lower().startswith('sec-websocket-key:')][0]
+        accept = self.__accept_key or b64encode(
+            sha1((key + self.GUID).encode('ascii')).digest()).decode('ascii')
+        client.sendall('HTTP/1.1 {status}\r\nUpgrade: websocket\r\n'
+                       'Connection: Upgrade\r\nSec-WebSocket-Accept: {accept}'
+                       '\r\n\r\n'.format(status=self.__status, accept=accept)
+                       .encode('latin-1'))
+        self.clients.append(client)
+        try:
+            while True:
+                header = self.__read(client, 2)
+                opcode, length = header[0] & 0x0F, header[1] & 0x7F
+                if length == 126:
+                    length = unpack('!H', self.__read(client, 2))[0]
+                elif length == 127:
+                    length = unpack('!Q', self.__read(client, 8))[0]
+                mask = self.__read(client, 4) if header[1] & 0x80 else None
+                payload = self.__read(client, length)
+                if mask:
+                    payload = bytes(byte ^ mask[i % 4]
+                                    for i, byte in enumerate(payload))
+                self.frames.append((opcode, payload, mask is not None))
+                if opcode == 0x9:
+                    client.sendall(self.frame(payload, 0xA))
+        except OSError:
+            pass
+
+    @staticmethod
+    def __read(client, size):
+        data = b''
+        while len(data) < size:
+            chunk = client.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError('closed')
+            data += chunk
+        return data
+
+    def wait_for_client(self, count=1, timeout=5):
+        '''
+        Waits until a number of clients has connected.
+
+        :returns: the last connected client socket
+        :rtype: socket.socket
+        '''
+        wait_until(lambda: len(self.clients) >= count, timeout)
+        return self.clients[-1]
+
+    def send(self, data, client=None):
+        '''
+        Sends raw data, e.g. encoded frames, to a client.
+
+        :param data: the data
+        :type data: bytes
+        :param client: optional, the client socket, defaults to the last
+            connected client
+        :type client: socket.socket
+        '''
+        (client or self.clients[-1]).sendall(data)
+
+    def drop(self):
+        '''
+        Closes the connections of all clients without a close frame.
+        '''
+        for client in self.clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            client.close()
+
+    def close(self):
+        self.drop()
+        self.__socket.close()
+
+
+def wait_until(predicate, timeout=5):
+    '''
+    Waits until a condition is met.
+
+    :raises AssertionError: if the condition is not met within the timeout
+    '''
+    deadline = monotonic() + timeout
+    while not predicate():
+        if monotonic() > deadline:
+            raise AssertionError('Condition was not met within {timeout}s'
+                                 .format(timeout=timeout))
+        sleep(0.01)
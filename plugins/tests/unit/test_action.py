@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from support import Connection, Rpc, httpapi_plugin
+
+from ansible_collections.gmeiner.unifi.plugins.action.setting import \
+    ActionModule
+from ansible_collections.gmeiner.unifi.plugins.action.unifi import \
+    TaskExit, TaskModule
+from ansible_collections.gmeiner.unifi.plugins.module_utils import unifi
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi import UniFi
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi_api import \
+    settings
+
+PREFIX = '/proxy/network/api/s/default'
+
+
+class Controller(object):
+    '''
+    Answers the requests of the unifi_setting module on a unifi-os
+    controller and records the writes.
+    '''
+
+    def __init__(self):
+        self.settings = [{'_id': 's1', 'key': 'mgmt', 'led_enabled': True}]
+        self.writes = []
+
+    @staticmethod
+    def respond(data):
+        return 200, {}, json.dumps({'meta': {'rc': 'ok'},
+                                    'data': data}).encode('utf-8')
+
+    def __call__(self, method, path, data):
+        if path == '/api/system':
+            return 200, {}, b'{}'
+        if path == PREFIX + '/get/setting':
+            return self.respond(self.settings)
+        if path == PREFIX + '/set/setting/mgmt' and method == 'PUT':
+            self.writes.append(json.loads(data))
+            self.settings[0].update(json.loads(data))
+            return self.respond(self.settings)
+        return 404, {}, b'{"meta": {"rc": "error"}}'
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    controller = Controller()
+    Rpc.plugin = httpapi_plugin(Connection(controller), unifi_pool_size=0)
+    monkeypatch.setattr(unifi, 'Connection', Rpc)
+    return controller
+
+
+def action(args, check_mode=False, async_val=0, socket_path='/dev/null'):
+    '''
+    Creates the action plugin of unifi_setting for a task.
+    '''
+    task = SimpleNamespace(args=args, async_val=async_val,
+                           check_mode=check_mode, action='unifi_setting')
+    connection = SimpleNamespace(socket_path=socket_path,
+                                 _shell=SimpleNamespace(tmpdir='/tmp'))
+    play_context = SimpleNamespace(check_mode=check_mode)
+    return ActionModule(task, connection, play_context, None, None)
+
+
+def test_action_runs_module(controller):
+    result = action({'settings': {'mgmt': {'led_enabled': False}}}).run()
+    assert not result.get('failed'), result
+    assert result['changed']
+    assert result['summary']['settings']['updated'] == 1
+    assert controller.writes == [
+        {'_id': 's1', 'key': 'mgmt', 'led_enabled': False}]
+
+
+def test_action_propagates_check_mode(controller):
+    result = action({'settings': {'mgmt': {'led_enabled': False}}},
+                    check_mode=True).run()
+    assert not result.get('failed'), result
+    assert result['summary']['settings']['updated'] == 1
+    assert controller.writes == []
+
+
+@pytest.mark.parametrize('args, message', [
+    ({}, 'missing required arguments: settings'),
+    ({'settings': {}, 'state': 'unknown'}, 'value of state must be one of'),
+    ({'settings': {}, 'unknown': 1}, 'Unsupported parameters'),
+])
+def test_action_reports_invalid_arguments(controller, args, message):
+    result = action(args).run()
+    assert result['failed']
+    assert message in result['msg']
+    assert Rpc.plugin.connection.requests == []
+
+
+@pytest.mark.parametrize('async_val, socket_path', [(10, '/dev/null'),
+                                                    (0, None)])
+def test_action_executes_module_otherwise(monkeypatch, async_val, socket_path):
+    plugin = action({'settings': {}}, async_val=async_val,
+                    socket_path=socket_path)
+    calls = []
+
+    def execute_module(task_vars=None, wrap_async=False):
+        calls.append(wrap_async)
+        return {'changed': False, 'executed': True}
+
+    monkeypatch.setattr(plugin, '_execute_module', execute_module)
+    assert plugin.run(task_vars={})['executed']
+    assert calls == [async_val]
+
+
+def test_action_reports_unexpected_errors(monkeypatch):
+    def main(module_class=None):
+        raise ValueError('unexpected')
+
+    plugin = action({'settings': {}})
+    monkeypatch.setattr(plugin, 'module', SimpleNamespace(main=main))
+    result = plugin.run()
+    assert result['failed']
+    assert result['msg'] == 'unexpected'
+    assert 'ValueError' in result['exception']
+
+
+def test_task_module_validates_arguments():
+    with pytest.raises(TaskExit) as exit:
+        TaskModule({'vlan': 'x'}, False, '/dev/null',
+                   argument_spec={'vlan': {'type': 'int'}},
+                   supports_check_mode=True)
+    assert exit.value.result['failed']
+    assert 'vlan' in exit.value.result['msg']
+
+    module = TaskModule({'vlan': '503'}, True, '/dev/null',
+                        argument_spec={'vlan': {'type': 'int'}},
+                        supports_check_mode=True)
+    assert module.params == {'vlan': 503}
+    assert module.check_mode
+
+
+def test_task_module_skips_unsupported_check_mode():
+    with pytest.raises(TaskExit) as exit:
+        TaskModule({}, True, '/dev/null', argument_spec={})
+    assert exit.value.result['skipped']
+    assert not exit.value.result.get('failed')
+
+
+def helper(check_mode=False, **params):
+    def module_class(**module_specs):
+        return TaskModule(params, check_mode, '/dev/null', **module_specs)
+    return UniFi(module_class=module_class)
+
+
+@pytest.mark.parametrize('check_mode', [False, True])
+def test_helper_propagates_check_mode(check_mode):
+    assert helper(check_mode).check_mode is check_mode
+
+
+def test_task_exit_passes_ensure_item(controller):
+    # a module which exits while its items are preprocessed is not failed
+    def preprocess_item(unifi, items):
+        unifi.result['skipped'] = True
+        unifi.exit()
+
+    with pytest.raises(TaskExit) as exit:
+        helper(debug='TRACE').ensure_item(
+            settings, preprocess_item=preprocess_item, items={})
+    assert exit.value.result['skipped']
+    assert not exit.value.result.get('failed')
+    assert 'trace' not in exit.value.result
+
+
+def test_failure_in_ensure_item_is_kept(controller):
+    def preprocess_item(unifi, items):
+        unifi.fail('Item {name} is invalid', name='x')
+
+    with pytest.raises(TaskExit) as exit:
+        helper(debug='TRACE').ensure_item(
+            settings, preprocess_item=preprocess_item, items={})
+    assert exit.value.result['failed']
+    assert exit.value.result['msg'] == 'Item x is invalid'
+    assert 'trace' not in exit.value.result
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import json
+
+import pytest
+
+from support import Connection, Rpc, httpapi_plugin
+
+from ansible_collections.gmeiner.unifi.plugins.action.unifi import TaskModule
+from ansible_collections.gmeiner.unifi.plugins.module_utils import unifi, \
+    unifi_api
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi import UniFi
+
+PREFIX = '/proxy/network/api/s/default'
+
+#: the collections of the controller by their path
+COLLECTIONS = {
+    '/proxy/network/api/self/sites': [
+        {'_id': 's1', 'name': 'default'}, {'_id': 's2', 'name': 'branch'}],
+    PREFIX + '/get/setting': [
+        {'key': 'mgmt', 'led_enabled': True}, {'key': 'country', 'code': 276}],
+    PREFIX + '/stat/device': [
+        {'_id': 'd1', 'mac': 'aa:bb:cc:dd:ee:01', 'name': 'Core switch'},
+        {'_id': 'd2', 'mac': 'aa:bb:cc:dd:ee:02', 'name': 'Attic'}],
+    PREFIX + '/rest/networkconf': [
+        {'_id': 'n1', 'name': 'LAN', 'purpose': 'corporate'},
+        {'_id': 'n2', 'name': 'IoT', 'purpose': 'corporate', 'vlan': 503,
+         'vlan_enabled': True},
+        {'_id': 'n3', 'name': 'Guests', 'purpose': 'guest', 'vlan': '504'}],
+    '/v2/api/site/default/apgroups': [
+        {'_id': 'g1', 'name': 'All APs', 'device_macs': []}],
+    PREFIX + '/rest/wlanconf': [
+        {'_id': 'w1', 'name': 'Home', 'networkconf_id': 'n1'},
+        {'_id': 'w2', 'name': 'Things', 'networkconf_id': 'n2'}],
+    PREFIX + '/rest/portconf': [
+        {'_id': 'p1', 'name': 'All', 'native_networkconf_id': 'n1'},
+        {'_id': 'p2', 'name': 'Disabled', 'forward': 'disabled'}],
+    PREFIX + '/stat/ccode': [
+        {'code': '276', 'key': 'DE', 'name': 'Germany'},
+        {'code': '40', 'key': 'AT', 'name': 'Austria'}],
+}
+
+#: filters of the single object getters, checked against the linear scan
+FILTERS = [
+    ('site', {}),
+    ('site', {'name': 'branch'}),
+    ('setting', {'key': 'country'}),
+    ('setting', {'code': 276}),
+    ('device', {'mac': 'aa:bb:cc:dd:ee:02'}),
+    ('device', {'name': 'Core switch', '_id': 'd1'}),
+    ('networkconf', {'purpose': 'corporate'}),
+    ('networkconf', {'vlan': 503}),
+    ('networkconf', {'vlan': 504}),
+    ('networkconf', {'vlan': None}),
+    ('networkconf', {'vlan_enabled': True}),
+    ('networkconf', {'name': 'missing'}),
+    ('apgroup', {'name': 'All APs'}),
+    ('wlanconf', {'networkconf_id': 'n2'}),
+    ('portconf', {'forward': 'disabled'}),
+    ('ccode', {'code': 40}),
+]
+
+
+class Controller(object):
+    '''
+    Answers requests for the collections of a unifi-os controller and records
+    the writes.
+    '''
+
+    def __init__(self):
+        self.writes = []
+
+    def __call__(self, method, path, data):
+        if path == '/api/system':
+            return 200, {}, b'{}'
+        if method in ('PUT', 'POST'):
+            self.writes.append((method, path, json.loads(data)))
+            return 200, {}, b'{"meta": {"rc": "ok"}, "data": []}'
+        if path not in COLLECTIONS:
+            return 404, {}, b'{"meta": {"rc": "error"}}'
+        items = COLLECTIONS[path]
+        if path.startswith('/v2/'):
+            return 200, {}, json.dumps(items).encode('utf-8')
+        return 200, {}, json.dumps({'meta': {'rc': 'ok'},
+                                    'data': items}).encode('utf-8')
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    controller = Controller()
+    Rpc.plugin = httpapi_plugin(Connection(controller), unifi_pool_size=0)
+    monkeypatch.setattr(unifi, 'Connection', Rpc)
+    return controller
+
+
+def helper(**params):
+    def module_class(**module_specs):
+        return TaskModule(params, False, '/dev/null', **module_specs)
+    return UniFi(module_class=module_class)
+
+
+def scan(unifi, singular, **filter_kwargs):
+    '''
+    The per-call lookup which the getters replaced: a linear scan of the
+    whole collection which compares each filter value and its string.
+    '''
+    if not filter_kwargs:
+        default = unifi.param(singular, default=None)
+        if default is not None:
+            filter_kwargs['name'] = default
+    for item in getattr(unifi, 'get_{name}s'.format(name=singular))():
+        if all(item.get(key) == value or item.get(key) == str(value)
+               for key, value in filter_kwargs.items()):
+            return item
+    return None
+
+
+def test_methods_of_all_descriptors():
+    for name in unifi_api.DESCRIPTORS:
+        singular = name[:-1] if name.endswith('s') else name
+        for method_name in ('get_' + singular, 'get_' + singular + 's',
+                            'set_' + singular):
+            method = getattr(UniFi, method_name)
+            assert method.__name__ == method_name
+            assert '{' not in method.__doc__
+
+
+def test_defined_methods_are_not_replaced(monkeypatch):
+    def get_ccode(self):
+        return 'defined'
+    monkeypatch.setattr(UniFi, 'get_ccode', get_ccode)
+    unifi._install_api_methods()
+    assert UniFi.get_ccode is get_ccode
+
+
+@pytest.mark.parametrize('singular, filters', FILTERS)
+def test_getter_matches_linear_scan(controller, singular, filters):
+    expected = scan(helper(), singular, **filters)
+    item = getattr(helper(), 'get_' + singular)(**filters)
+    assert item == expected
+
+
+@pytest.mark.parametrize('singular', ['site', 'setting', 'device',
+                                      'networkconf', 'apgroup', 'wlanconf',
+                                      'portconf', 'ccode'])
+def test_collection_getters(controller, singular):
+    api = unifi_api.DESCRIPTORS.get(singular) or \
+        unifi_api.DESCRIPTORS[singular + 's']
+    path = api.getter.request_kwargs['path']
+    items = getattr(helper(), 'get_{name}s'.format(name=singular))()
+    expected = [items for collection_path, items in COLLECTIONS.items()
+                if collection_path.endswith(path)][0]
+    assert items == expected
+
+
+def test_getter_defaults_to_module_param(controller):
+    assert helper(site='branch').get_site() == \
+        {'_id': 's2', 'name': 'branch'}
+
+
+def test_string_filter_matches_integer_attribute(controller):
+    # the linear scan only matched integer filters with string attributes
+    assert helper().get_networkconf(vlan='503')['_id'] == 'n2'
+
+
+def test_setter_sends_through_descriptor(controller):
+    helper().set_portconf(data={'_id': 'p2', 'forward': 'all'})
+    assert controller.writes == [
+        ('PUT', PREFIX + '/rest/portconf/p2',
+         {'_id': 'p2', 'forward': 'all'})]
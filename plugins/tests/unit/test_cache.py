@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from threading import Event, Thread
+
+from ansible_collections.gmeiner.unifi.plugins.module_utils.cache import \
+    ResponseCache
+
+
+def test_fetch_loads_once_and_hits_afterwards():
+    cache = ResponseCache(1024, 60)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return b'value'
+
+    assert cache.fetch('key', loader) == (b'value', False)
+    assert cache.fetch('key', loader) == (b'value', True)
+    assert len(loads) == 1
+
+
+def test_byte_budget_evicts_least_recently_used():
+    cache = ResponseCache(10, 60)
+    cache.put('a', b'aaaa')
+    cache.put('b', b'bbbb')
+    cache.get('a')
+    cache.put('c', b'cccc')
+    assert cache.get('a') == b'aaaa'
+    assert cache.get('b') is None
+    assert cache.size == 8
+
+
+def test_zero_ttl_is_not_stored():
+    cache = ResponseCache(1024, 60)
+    cache.put('key', b'value', ttl=0)
+    assert cache.get('key') is None
+
+
+def test_invalidate_during_load_skips_store():
+    cache = ResponseCache(1024, 60)
+    loading, resume = Event(), Event()
+
+    def loader():
+        loading.set()
+        resume.wait(5)
+        return b'before write'
+
+    results = []
+    thread = Thread(target=lambda: results.append(cache.fetch('key', loader)))
+    thread.start()
+    assert loading.wait(5)
+    # a write of the same batch invalidates the key while the GET is pending
+    cache.invalidate(lambda key: key == 'key')
+    resume.set()
+    thread.join(5)
+
+    assert results == [(b'before write', False)]
+    assert cache.get('key') is None
+    assert cache.fetch('key', lambda: b'after write') == (b'after write', False)
+    assert cache.get('key') == b'after write'
+
+
+def test_update_during_load_skips_store():
+    cache = ResponseCache(1024, 60)
+
+    def loader():
+        cache.update(lambda key: True, lambda key, value: value)
+        return b'before event'
+
+    assert cache.fetch('key', loader) == (b'before event', False)
+    assert cache.get('key') is None
+
+
+def test_invalidate_of_other_key_keeps_store():
+    cache = ResponseCache(1024, 60)
+
+    def loader():
+        cache.invalidate(lambda key: key == 'other')
+        return b'value'
+
+    cache.fetch('key', loader)
+    assert cache.get('key') == b'value'
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import json
+
+import pytest
+
+from ansible_collections.gmeiner.unifi.plugins.module_utils import codec
+from ansible_collections.gmeiner.unifi.plugins.module_utils.codec import \
+    JsonStream, Pretty, dumps, fingerprint, loads
+
+DOCUMENT = {
+    'meta': {'rc': 'ok', 'count': 3},
+    'data': [
+        {'_id': 'a1', 'name': 'Büro', 'vlan': 10, 'ratio': 0.5,
+         'tags': [], 'enabled': True, 'note': None},
+        {'_id': 'b2', 'name': 'Lager ☃', 'vlan': 20, 'nested': {'x': [1, 2]}},
+        {'_id': 'c3', 'name': 'quote " and \\ backslash', 'vlan': 123456789},
+    ]
+}
+
+
+@pytest.fixture(params=[True, False], ids=['orjson', 'json'])
+def backend(request, monkeypatch):
+    if request.param:
+        pytest.importorskip('orjson')
+    monkeypatch.setattr(codec, 'HAS_ORJSON', request.param)
+    return request.param
+
+
+def test_dumps_is_compact_json(backend):
+    data = dumps(DOCUMENT)
+    assert isinstance(data, str)
+    assert ': ' not in data and ', ' not in data.replace('"quote " and', '')
+    assert json.loads(data) == DOCUMENT
+
+
+def test_dumps_falls_back_for_unsupported_values(backend):
+    # integers beyond 64 bit are not supported by orjson
+    assert json.loads(dumps({'big': 2 ** 70})) == {'big': 2 ** 70}
+
+
+def test_loads_accepts_bytes_and_str(backend):
+    data = json.dumps(DOCUMENT)
+    assert loads(data) == DOCUMENT
+    assert loads(data.encode('utf-8')) == DOCUMENT
+    with pytest.raises(ValueError):
+        loads(b'{"data": [')
+
+
+def test_fingerprint_ignores_key_order(backend):
+    reordered = {'data': [dict(reversed(list(item.items())))
+                          for item in DOCUMENT['data']],
+                 'meta': DOCUMENT['meta']}
+    assert fingerprint(reordered) == fingerprint(DOCUMENT)
+    assert len(fingerprint(DOCUMENT)) == 32
+
+
+def test_fingerprint_detects_changes(backend):
+    changed = json.loads(json.dumps(DOCUMENT))
+    changed['data'][1]['nested']['x'].append(3)
+    assert fingerprint(changed) != fingerprint(DOCUMENT)
+    assert fingerprint({'vlan': 1}) != fingerprint({'vlan': '1'})
+    assert fingerprint({'big': 2 ** 70}) == fingerprint({'big': 2 ** 70})
+
+
+def test_pretty_renders_lazily(backend):
+    assert json.loads(str(Pretty(DOCUMENT))) == DOCUMENT
+    assert '\n    ' in '{0}'.format(Pretty(json.dumps(DOCUMENT)))
+    assert str(Pretty('not json')) == 'not json'
+    assert str(Pretty(b'\xffnot json')) == '�not json'
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64, 65536])
+def test_stream_items_across_chunks(backend, chunk_size):
+    data = json.dumps(DOCUMENT, ensure_ascii=False).encode('utf-8')
+    stream = JsonStream(data, chunk_size=chunk_size)
+    stream.descend(['data'])
+    assert stream.at_array
+    assert list(stream.items()) == DOCUMENT['data']
+
+
+def test_stream_skips_values_before_path():
+    stream = JsonStream('{"meta": {"rc": "ok"}, "skip": [1, {"a": 2}], '
+                        '"outer": {"x": 1, "inner": [4, 5.5, "six"]}}',
+                        chunk_size=3)
+    stream.descend(['outer', 'inner'])
+    assert list(stream.items()) == [4, 5.5, 'six']
+
+
+def test_stream_number_at_chunk_boundary():
+    stream = JsonStream([b'{"data": [12', b'34, 5', b'6]}'])
+    stream.descend(['data'])
+    assert list(stream.items()) == [1234, 56]
+
+
+def test_stream_yields_items_one_at_a_time():
+    chunks = iter([b'{"data": [{"_id": 1}, ', b'{"_id": 2}, ', b'{"_id": 3}]}'])
+    consumed = []
+
+    def source():
+        for chunk in chunks:
+            consumed.append(chunk)
+            yield chunk
+
+    stream = JsonStream(source())
+    stream.descend(['data'])
+    items = stream.items()
+    assert next(items) == {'_id': 1}
+    assert len(consumed) < 3
+
+
+def test_stream_empty_array_and_scalar():
+    stream = JsonStream(b'{"data": []}')
+    stream.descend(['data'])
+    assert list(stream.items()) == []
+
+    stream = JsonStream(b'{"data": {"key": "value"}}')
+    stream.descend(['data'])
+    assert not stream.at_array
+    assert stream.value() == {'key': 'value'}
+
+
+def test_stream_missing_path():
+    stream = JsonStream(b'{"meta": {}, "other": []}')
+    with pytest.raises(KeyError):
+        stream.descend(['data'])
+
+
+def test_stream_truncated_document():
+    stream = JsonStream(b'{"data": [{"_id": 1}, {"_id"')
+    stream.descend(['data'])
+    items = stream.items()
+    assert next(items) == {'_id': 1}
+    with pytest.raises(ValueError):
+        next(items)
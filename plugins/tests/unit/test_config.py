@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import json
+
+import pytest
+
+from support import Connection, Rpc, httpapi_plugin
+
+from ansible_collections.gmeiner.unifi.plugins.action.unifi import \
+    TaskExit, TaskModule
+from ansible_collections.gmeiner.unifi.plugins.module_utils import unifi
+from ansible_collections.gmeiner.unifi.plugins.modules import config
+
+PREFIX = '/proxy/network/api/s/default'
+
+
+class Controller(object):
+    '''
+    Answers the requests of the unifi_config module on a unifi-os controller
+    without any networks, wlans or port profiles besides the default LAN.
+    '''
+
+    def __init__(self):
+        self.collections = {
+            PREFIX + '/rest/networkconf': [
+                {'_id': 'n1', 'name': 'LAN', 'purpose': 'corporate',
+                 'networkgroup': 'LAN', 'attr_no_delete': True}],
+            PREFIX + '/rest/wlanconf': [],
+            PREFIX + '/rest/portconf': [],
+            '/v2/api/site/default/apgroups': [
+                {'_id': 'g1', 'name': 'All APs', 'attr_hidden_id': 'default'}],
+            '/proxy/network/api/self/sites': [
+                {'_id': 's1', 'name': 'default'}],
+        }
+        self.writes = []
+
+    def __call__(self, method, path, data):
+        if path == '/api/system':
+            return 200, {}, b'{}'
+        if path not in self.collections:
+            return 404, {}, b'{"meta": {"rc": "error"}}'
+        items = self.collections[path]
+        if method == 'POST':
+            self.writes.append((path[len(PREFIX):], json.loads(data)))
+            items.append(dict(json.loads(data), _id='{0}-{1}'.format(
+                path.rsplit('/', 1)[1], len(items) + 1)))
+            items = items[-1:]
+        if path.startswith('/v2/'):
+            return 200, {}, json.dumps(items).encode('utf-8')
+        return 200, {}, json.dumps({'meta': {'rc': 'ok'},
+                                    'data': items}).encode('utf-8')
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    controller = Controller()
+    Rpc.plugin = httpapi_plugin(Connection(controller), unifi_pool_size=0)
+    monkeypatch.setattr(unifi, 'Connection', Rpc)
+    return controller
+
+
+def run(check_mode, **args):
+    def module_class(**module_specs):
+        return TaskModule(args, check_mode, '/dev/null', **module_specs)
+    with pytest.raises(TaskExit) as exit:
+        config.main(module_class=module_class)
+    assert not exit.value.result.get('failed'), exit.value.result
+    return exit.value.result
+
+
+#: a network and resources which reference it by name and VLAN
+SITE = dict(
+    networks=[{'name': 'IoT', 'vlan': 510, 'ip_subnet': '172.20.110.1/24'}],
+    wlans=[{'name': 'Things', 'networkconf': 'IoT'}],
+    portconfs=[{'name': 'IoT access', 'native_networkconf': 510}],
+)
+
+
+def test_references_to_new_network(controller):
+    result = run(False, **SITE)
+    network_id = result['networks'][0]['_id']
+    assert result['wlans'][0]['networkconf_id'] == network_id
+    assert result['portconf'][0]['native_networkconf_id'] == network_id
+    assert [path for path, _ in controller.writes] == [
+        '/rest/networkconf', '/rest/wlanconf', '/rest/portconf']
+
+
+def test_references_to_planned_network_in_check_mode(controller):
+    result = run(True, **SITE)
+    assert controller.writes == []
+    for key in ('networks', 'wlans', 'portconf'):
+        assert result['summary'][key]['created'] == 1
+    placeholder = '<planned network 1>'
+    assert result['wlans'][0]['networkconf_id'] == placeholder
+    assert result['portconf'][0]['native_networkconf_id'] == placeholder
+
+
+def test_missing_network_fails_in_check_mode(controller):
+    def module_class(**module_specs):
+        return TaskModule(dict(wlans=[{'name': 'Things',
+                                       'networkconf': 'Missing'}]),
+                          True, '/dev/null', **module_specs)
+    with pytest.raises(TaskExit) as exit:
+        config.main(module_class=module_class)
+    assert exit.value.result['failed']
+    assert "network 'Missing'" in exit.value.result['msg']
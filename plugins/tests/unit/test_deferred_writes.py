@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import json
+
+import pytest
+
+from support import Connection, Rpc, httpapi_plugin
+
+from ansible_collections.gmeiner.unifi.plugins.action.unifi import \
+    TaskExit, TaskModule
+from ansible_collections.gmeiner.unifi.plugins.module_utils import unifi
+from ansible_collections.gmeiner.unifi.plugins.modules import port, setting
+
+PREFIX = '/proxy/network/api/s/default'
+
+
+class Controller(object):
+    '''
+    Answers the requests of the unifi_port module on a unifi-os controller
+    with a single switch.
+    '''
+
+    def __init__(self):
+        self.device = {
+            '_id': 'd1', 'mac': 'aa:bb:cc:dd:ee:ff', 'name': 'Core switch',
+            'port_table': [{'port_idx': 1, 'name': 'Port 1'},
+                           {'port_idx': 2, 'name': 'Port 2'}],
+            'port_overrides': []
+        }
+        self.portconfs = [{'_id': 'pA', 'name': 'A'},
+                          {'_id': 'pB', 'name': 'B'}]
+        self.settings = [{'_id': 's1', 'key': 'mgmt', 'led_enabled': True}]
+        self.writes = []
+
+    @staticmethod
+    def respond(data):
+        return 200, {}, json.dumps({'meta': {'rc': 'ok'},
+                                    'data': data}).encode('utf-8')
+
+    def __call__(self, method, path, data):
+        if path == '/api/system':
+            return 200, {}, b'{}'
+        if path == '/proxy/network/api/self/sites':
+            return self.respond([{'_id': 's1', 'name': 'default'}])
+        if path == PREFIX + '/rest/portconf':
+            return self.respond(self.portconfs)
+        if path == PREFIX + '/stat/device':
+            if method == 'POST':
+                macs = json.loads(data)['macs']
+                return self.respond([self.device] if self.device['mac'] in macs
+                                    else [])
+            return self.respond([self.device])
+        if path == PREFIX + '/get/setting':
+            return self.respond(self.settings)
+        if path.startswith(PREFIX + '/set/setting/') and method == 'PUT':
+            self.writes.append(json.loads(data))
+            key = path.rsplit('/', 1)[1]
+            for item in self.settings:
+                if item['key'] == key:
+                    item.update(json.loads(data))
+            return self.respond([item for item in self.settings
+                                 if item['key'] == key])
+        if path == PREFIX + '/rest/device/d1':
+            if method == 'PUT':
+                self.writes.append(json.loads(data))
+                self.device.update(json.loads(data))
+            return self.respond([self.device])
+        return 404, {}, b'{"meta": {"rc": "error"}}'
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    controller = Controller()
+    Rpc.plugin = httpapi_plugin(Connection(controller),
+                                unifi_pool_size=0, unifi_defer_writes=True)
+    monkeypatch.setattr(unifi, 'Connection', Rpc)
+    return controller
+
+
+def run(module, **args):
+    def module_class(**module_specs):
+        return TaskModule(args, False, '/dev/null', **module_specs)
+    with pytest.raises(TaskExit) as exit:
+        module.main(module_class=module_class)
+    assert not exit.value.result.get('failed'), exit.value.result
+    return exit.value.result
+
+
+def run_port(**args):
+    return run(port, **args)
+
+
+@pytest.mark.parametrize('device', ['aa:bb:cc:dd:ee:ff', 'Core switch'])
+def test_deferred_port_overrides_are_merged(controller, device):
+    run_port(device=device, port=1, portconf='A')
+    run_port(device=device, port=2, portconf='B')
+    assert controller.writes == []
+
+    results = Rpc.plugin.flush_writes()
+    assert [result['status'] for result in results] == ['flushed']
+    assert len(controller.writes) == 1
+    assert controller.writes[0]['port_overrides'] == [
+        {'port_idx': 1, 'portconf_id': 'pA'},
+        {'port_idx': 2, 'portconf_id': 'pB'}
+    ]
+
+
+def test_readonly_query_includes_queued_update(controller):
+    plugin = Rpc.plugin
+    plugin.send_request(path='/rest/device', proxy='network', _id='d1',
+                        data={'port_overrides': [{'port_idx': 1}]},
+                        invalidates=['/stat/device'])
+    devices = plugin.send_request(path='/stat/device', proxy='network',
+                                  method='POST', readonly=True,
+                                  data={'macs': ['aa:bb:cc:dd:ee:ff']})
+    assert devices['data'][0]['port_overrides'] == [{'port_idx': 1}]
+    assert controller.device['port_overrides'] == []
+
+
+def test_settings_are_not_deferred(controller):
+    result = run(setting, settings={'mgmt': {'led_enabled': False}})
+    assert result['summary']['settings']['updated'] == 1
+    assert controller.writes == [
+        {'_id': 's1', 'key': 'mgmt', 'led_enabled': False}]
+    assert Rpc.plugin.flush_writes() == []
+
+    settings = Rpc.plugin.send_request(path='/get/setting', proxy='network')
+    assert settings['data'] == controller.settings
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import json
+
+import pytest
+
+from support import Connection, Rpc, httpapi_plugin
+
+from ansible_collections.gmeiner.unifi.plugins.action.unifi import \
+    TaskExit, TaskModule
+from ansible_collections.gmeiner.unifi.plugins.module_utils import unifi
+from ansible_collections.gmeiner.unifi.plugins.module_utils.resources import \
+    compare_networkconf, preprocess_networkconf
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi import UniFi
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi_api import \
+    networkconf, portconf
+
+PREFIX = '/proxy/network/api/s/default'
+
+
+class Controller(object):
+    '''
+    Answers the requests for the REST collections of a unifi-os controller
+    and records the writes in the order of their arrival.
+    '''
+
+    def __init__(self):
+        self.collections = {
+            '/rest/networkconf': [
+                {'_id': 'n1', 'name': 'LAN', 'purpose': 'corporate',
+                 'networkgroup': 'LAN', 'attr_no_delete': True},
+                {'_id': 'n2', 'name': 'IoT', 'purpose': 'corporate',
+                 'networkgroup': 'LAN', 'vlan_enabled': True, 'vlan': '503'}],
+            '/rest/portconf': [
+                {'_id': 'p1', 'name': 'All', 'tag': 'x', 'forward': 'all'},
+                {'_id': 'p2', 'name': 'Disabled', 'tag': 'y',
+                 'forward': 'disabled'}],
+        }
+        self.writes = []
+        self.created = 0
+
+    @staticmethod
+    def respond(data):
+        return 200, {}, json.dumps({'meta': {'rc': 'ok'},
+                                    'data': data}).encode('utf-8')
+
+    def __call__(self, method, path, data):
+        if path == '/api/system':
+            return 200, {}, b'{}'
+        if not path.startswith(PREFIX + '/rest/'):
+            return 404, {}, b'{"meta": {"rc": "error"}}'
+        collection_path, _, _id = path[len(PREFIX):].partition('/rest/')[2] \
+            .partition('/')
+        items = self.collections['/rest/' + collection_path]
+        item = next((item for item in items if item['_id'] == _id), None)
+        if method == 'GET' and not _id:
+            return self.respond(items)
+        if method != 'POST' and item is None:
+            return 400, {}, b'{"meta": {"rc": "error", ' \
+                b'"msg": "api.err.IdInvalid"}}'
+        if method != 'GET':
+            self.writes.append((method, _id or None))
+        if method == 'POST':
+            self.created += 1
+            item = dict(json.loads(data), _id='new{0}'.format(self.created))
+            items.append(item)
+        elif method == 'PUT':
+            item.update(json.loads(data))
+        elif method == 'DELETE':
+            items.remove(item)
+            return self.respond([])
+        return self.respond([item])
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    controller = Controller()
+    Rpc.plugin = httpapi_plugin(Connection(controller), unifi_pool_size=0)
+    monkeypatch.setattr(unifi, 'Connection', Rpc)
+    return controller
+
+
+def helper(check_mode=False, **params):
+    def module_class(**module_specs):
+        return TaskModule(params, check_mode, '/dev/null', **module_specs)
+    return UniFi(argument_spec=dict(UniFi.EXCLUSIVE_ARGS),
+                 module_class=module_class)
+
+
+def as_list(unifi, items):
+    return items
+
+
+def ensure(api, items, check_mode=False, preprocess_item=as_list,
+           compare_items=None, **params):
+    '''
+    Ensures a list of items and returns the result of the module.
+    '''
+    unifi = helper(check_mode, **params)
+    unifi.ensure_item(api, preprocess_item=preprocess_item,
+                      compare_items=compare_items, items=items)
+    return unifi.result
+
+
+def compare_tags(item_a, item_b):
+    return 'tag' in item_a and item_a['tag'] == item_b.get('tag')
+
+
+def test_key_comparator():
+    comparator = UniFi.key_comparator(lambda item: item.get('key'))
+    assert comparator.key({'key': 'mgmt'}) == 'mgmt'
+    assert comparator({'key': 'mgmt'}, {'key': 'mgmt', 'x': 1})
+    assert not comparator({'key': 'mgmt'}, {'key': 'country'})
+    # items without a key don't match anything, not even each other
+    assert not comparator({}, {})
+
+
+def test_id_comparator_ignores_items_without_id():
+    comparator = UniFi.build_id_comparator(UniFi.default_id_extractor)
+    assert comparator({'_id': 'p1'}, {'_id': 'p1', 'name': 'All'})
+    assert not comparator({'name': 'All'}, {'name': 'All'})
+
+
+@pytest.mark.parametrize('item, compare_items, expected', [
+    # the custom comparator takes precedence over the name
+    ({'name': 'All', 'tag': 'y', 'forward': 'all'}, compare_tags, 'p2'),
+    # without a custom match, items are matched by name (case invariant)
+    ({'name': 'all', 'tag': 'z', 'forward': 'all'}, compare_tags, 'p1'),
+    # the id takes precedence over the name
+    ({'_id': 'p2', 'name': 'All'}, None, 'p2'),
+])
+def test_comparator_precedence(controller, item, compare_items, expected):
+    result = ensure(portconf, [item], compare_items=compare_items)
+    assert [(item['_id'], item['name']) for item in result['portconf']] == \
+        [(expected, item['name'])]
+    assert controller.writes == [('PUT', expected)]
+
+
+@pytest.mark.parametrize('existing_vlan', [503, '503'])
+@pytest.mark.parametrize('input_vlan', [503, '503'])
+def test_vlan_keys_are_normalized(controller, existing_vlan, input_vlan):
+    controller.collections['/rest/networkconf'][1]['vlan'] = existing_vlan
+    result = ensure(networkconf, [{'name': 'Things', 'vlan': input_vlan}],
+                    preprocess_item=preprocess_networkconf,
+                    compare_items=compare_networkconf)
+    assert result['networks'][0]['_id'] == 'n2'
+    assert result['networks'][0]['name'] == 'Things'
+    assert result['summary']['networks']['created'] == 0
+
+
+def test_unchanged_updated_and_created(controller):
+    result = ensure(portconf, [{'name': 'All', 'forward': 'all'},
+                               {'name': 'Disabled', 'forward': 'all'},
+                               {'name': 'New', 'forward': 'all'}])
+    assert result['changed']
+    assert result['summary']['portconf'] == {
+        'created': 1, 'updated': 1, 'deleted': 0, 'unchanged': 1}
+    assert [item['_id'] for item in result['portconf']] == ['p1', 'p2', 'new1']
+    assert controller.writes == [('PUT', 'p2'), ('POST', None)]
+
+
+def test_unchanged_items_are_not_written(controller):
+    result = ensure(portconf, [{'name': 'All', 'forward': 'all'},
+                               {'_id': 'p2', 'tag': 'y'}])
+    assert not result['changed']
+    assert result['summary']['portconf']['unchanged'] == 2
+    # the count is only part of the summary
+    assert 'unchanged' not in result
+    assert controller.writes == []
+
+
+def test_check_mode_does_not_write(controller):
+    result = ensure(portconf, [{'name': 'Disabled', 'forward': 'all'},
+                               {'name': 'New'}], check_mode=True)
+    assert result['summary']['portconf'] == {
+        'created': 1, 'updated': 1, 'deleted': 0, 'unchanged': 0}
+    assert controller.writes == []
+
+
+def test_state_absent(controller):
+    result = ensure(portconf, [{'name': 'disabled'}, {'name': 'Missing'}],
+                    state='absent')
+    assert result['changed']
+    assert result['summary']['portconf']['deleted'] == 1
+    assert controller.writes == [('DELETE', 'p2')]
+    assert [item['_id'] for item in
+            controller.collections['/rest/portconf']] == ['p1']
+
+
+def test_state_absent_without_match(controller):
+    result = ensure(portconf, [{'name': 'Missing'}], state='absent')
+    assert not result['changed']
+    assert controller.writes == []
+
+
+
+def requested_paths(controller):
+    return [path[len(PREFIX):] for method, path, _ in
+            Rpc.plugin.connection.requests
+            if method == 'GET' and path.startswith(PREFIX)]
+
+
+def test_items_with_ids_are_fetched_by_id(controller):
+    result = ensure(portconf, [{'_id': 'p2', 'forward': 'all'}])
+    assert requested_paths(controller) == ['/rest/portconf/p2']
+    assert result['summary']['portconf']['updated'] == 1
+
+
+def test_custom_comparator_sees_whole_collection(controller):
+    result = ensure(portconf, [{'_id': 'p1', 'tag': 'x'}],
+                    compare_items=compare_tags)
+    assert requested_paths(controller) == ['/rest/portconf']
+    assert result['summary']['portconf']['unchanged'] == 1
+
+
+def test_unknown_ids_are_matched_by_name(controller):
+    result = ensure(portconf, [{'_id': 'p1', 'forward': 'all'},
+                               {'_id': 'gone', 'name': 'disabled'}],
+                    state='absent')
+    assert requested_paths(controller)[-1] == '/rest/portconf'
+    assert result['summary']['portconf']['deleted'] == 2
+    assert sorted(controller.writes) == [('DELETE', 'p1'), ('DELETE', 'p2')]
+
+
+def test_state_absent_with_unknown_id(controller):
+    result = ensure(portconf, [{'_id': 'gone'}], state='absent')
+    assert not result.get('failed')
+    assert not result['changed']
+    assert controller.writes == []
+
+
+class Batches(object):
+    '''
+    Records the writes of each batch which is sent through the httpapi
+    plugin.
+    '''
+
+    def __init__(self, plugin):
+        self.batches = []
+        self.__send_requests = plugin.send_requests
+
+    def __call__(self, requests, adaptive=False):
+        self.batches.append(sorted(
+            ('DELETE' if request.get('data') is None else
+             'PUT' if request.get('_id') else 'POST', request.get('_id'))
+            for request in requests))
+        return self.__send_requests(requests, adaptive)
+
+
+def test_exclusive_deletes_before_other_writes(controller, monkeypatch):
+    batches = Batches(Rpc.plugin)
+    monkeypatch.setattr(Rpc.plugin, 'send_requests', batches)
+    result = ensure(portconf, [{'name': 'All', 'forward': 'disabled'},
+                               {'name': 'Disabled 2', 'tag': 'y'}],
+                    state='exclusive')
+    assert batches.batches == [[('DELETE', 'p2')],
+                               [('POST', None), ('PUT', 'p1')]]
+    assert controller.writes[0] == ('DELETE', 'p2')
+    assert result['summary']['portconf'] == {
+        'created': 1, 'updated': 1, 'deleted': 1, 'unchanged': 0}
+    # the results keep the order of the input items
+    assert [item['_id'] for item in result['portconf']] == \
+        ['p1', 'new1', 'p2']
+
+
+def test_exclusive_keeps_protected_items(controller):
+    result = ensure(networkconf, [{'name': 'IoT', 'vlan': 503}],
+                    preprocess_item=preprocess_networkconf,
+                    compare_items=compare_networkconf, state='exclusive')
+    assert not result['changed']
+    assert controller.writes == []
+
+
+def test_max_deletions_refuses_deletions(controller):
+    controller.collections['/rest/portconf'].append(
+        {'_id': 'p3', 'name': 'Third'})
+    with pytest.raises(TaskExit) as exit:
+        ensure(portconf, [{'name': 'All', 'forward': 'disabled'}],
+               state='exclusive', max_deletions=1)
+    assert exit.value.result['failed']
+    assert exit.value.result['msg'].startswith(
+        'Refusing to delete 2 portconf (max_deletions is 1)')
+    # nothing is written, not even the updates
+    assert controller.writes == []
+
+
+@pytest.mark.parametrize('max_deletions', [2, -1])
+def test_max_deletions_allows_deletions(controller, max_deletions):
+    controller.collections['/rest/portconf'].append(
+        {'_id': 'p3', 'name': 'Third'})
+    result = ensure(portconf, [{'name': 'All'}], state='exclusive',
+                    max_deletions=max_deletions)
+    assert result['summary']['portconf']['deleted'] == 2
+    assert sorted(controller.writes) == [('DELETE', 'p2'), ('DELETE', 'p3')]
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import json
+
+import pytest
+
+from support import Connection, httpapi_plugin
+
+PREFIX = '/proxy/network/api/s/default'
+
+
+class Controller(object):
+    '''
+    Answers the requests of a unifi-os controller with two wlans and a
+    device.
+    '''
+
+    def __init__(self):
+        self.wlans = [{'_id': 'w1', 'name': 'Home'},
+                      {'_id': 'w2', 'name': 'Guests'}]
+        self.devices = [{'_id': 'd1', 'mac': 'aa:bb:cc:dd:ee:ff',
+                         'name': 'Core switch'}]
+
+    @staticmethod
+    def respond(data):
+        return 200, {}, json.dumps({'meta': {'rc': 'ok'},
+                                    'data': data}).encode('utf-8')
+
+    def __call__(self, method, path, data):
+        if path == '/api/system':
+            return 200, {}, b'{}'
+        if path == PREFIX + '/rest/wlanconf':
+            return self.respond(self.wlans)
+        if path.startswith(PREFIX + '/rest/wlanconf/'):
+            _id = path.rsplit('/', 1)[1]
+            return self.respond([wlan for wlan in self.wlans
+                                 if wlan['_id'] == _id])
+        if path in (PREFIX + '/stat/device', PREFIX + '/rest/device'):
+            return self.respond(self.devices)
+        return 404, {}, b'{"meta": {"rc": "error"}}'
+
+
+@pytest.fixture
+def plugin():
+    return httpapi_plugin(Connection(Controller()), unifi_pool_size=0)
+
+
+def event(plugin, message, data=None, site='default'):
+    plugin._HttpApi__handle_event(site, json.dumps(
+        {'meta': {'message': message}, 'data': data or []}))
+
+
+def get(plugin, path, **kwargs):
+    '''
+    Requests a path and returns its data and if the controller was asked.
+    '''
+    requests = len(plugin.connection.requests)
+    data = plugin.send_request(path=path, proxy='network', **kwargs)['data']
+    return data, len(plugin.connection.requests) > requests
+
+
+@pytest.mark.parametrize('action', ['add', 'sync'])
+def test_upserts_patch_cached_collection(plugin, action):
+    get(plugin, '/rest/wlanconf')
+    event(plugin, 'wlanconf:' + action, [{'_id': 'w2', 'name': 'Visitors'},
+                                         {'_id': 'w3', 'name': 'IoT'}])
+    data, requested = get(plugin, '/rest/wlanconf')
+    assert not requested
+    assert data == [{'_id': 'w1', 'name': 'Home'},
+                    {'_id': 'w2', 'name': 'Visitors'},
+                    {'_id': 'w3', 'name': 'IoT'}]
+
+
+def test_upsert_patches_single_object(plugin):
+    get(plugin, '/rest/wlanconf', _id='w1', method='GET')
+    get(plugin, '/rest/wlanconf', _id='w2', method='GET')
+    event(plugin, 'wlanconf:sync', [{'_id': 'w1', 'name': 'Upstairs'}])
+
+    data, requested = get(plugin, '/rest/wlanconf', _id='w1', method='GET')
+    assert not requested
+    assert data == [{'_id': 'w1', 'name': 'Upstairs'}]
+    data, requested = get(plugin, '/rest/wlanconf', _id='w2', method='GET')
+    assert not requested
+    assert data == [{'_id': 'w2', 'name': 'Guests'}]
+
+
+def test_delete_removes_objects(plugin):
+    get(plugin, '/rest/wlanconf')
+    get(plugin, '/rest/wlanconf', _id='w1', method='GET')
+    event(plugin, 'wlanconf:delete', [{'_id': 'w1'}])
+
+    data, requested = get(plugin, '/rest/wlanconf')
+    assert not requested
+    assert data == [{'_id': 'w2', 'name': 'Guests'}]
+    # the single object is requested again instead of answering from cache
+    _, requested = get(plugin, '/rest/wlanconf', _id='w1', method='GET')
+    assert requested
+
+
+def test_unpatchable_paths_are_invalidated(plugin):
+    get(plugin, '/stat/device')
+    get(plugin, '/rest/device')
+    get(plugin, '/rest/wlanconf')
+    event(plugin, 'device:sync', [{'_id': 'd1', 'name': 'Renamed'}])
+
+    # statistics can't be patched with the objects of the event
+    _, requested = get(plugin, '/stat/device')
+    assert requested
+    data, requested = get(plugin, '/rest/device')
+    assert not requested
+    assert data[0]['name'] == 'Renamed'
+    _, requested = get(plugin, '/rest/wlanconf')
+    assert not requested
+
+
+@pytest.mark.parametrize('message, data', [
+    ('wlanconf:update', [{'_id': 'w1', 'name': 'Upstairs'}]),
+    ('wlanconf:sync', [{'name': 'without id'}]),
+])
+def test_unknown_changes_invalidate_collection(plugin, message, data):
+    get(plugin, '/rest/wlanconf')
+    event(plugin, message, data)
+    _, requested = get(plugin, '/rest/wlanconf')
+    assert requested
+
+
+@pytest.mark.parametrize('message', [
+    'not json',
+    json.dumps({'data': []}),
+    json.dumps({'meta': {'message': 'events'}, 'data': []}),
+    json.dumps(['wlanconf:sync']),
+])
+def test_invalid_messages_are_ignored(plugin, message):
+    get(plugin, '/rest/wlanconf')
+    plugin._HttpApi__handle_event('default', message)
+    _, requested = get(plugin, '/rest/wlanconf')
+    assert not requested
+
+
+def test_events_of_other_sites_are_ignored(plugin):
+    get(plugin, '/rest/wlanconf')
+    event(plugin, 'wlanconf:delete', [{'_id': 'w1'}], site='other')
+    data, requested = get(plugin, '/rest/wlanconf')
+    assert not requested
+    assert len(data) == 2
+
+
+@pytest.mark.parametrize('message, site, stored', [
+    ('wlanconf:sync', 'default', False),
+    ('wlanconf:sync', 'other', True),
+    ('sta:sync', 'default', True),
+    ('device:sync', 'default', True),
+])
+def test_events_during_pending_request(plugin, message, site, stored):
+    controller = plugin.connection.handler
+
+    def handler(method, path, data):
+        # the event arrives while the response is on its way
+        if path == PREFIX + '/rest/wlanconf':
+            event(plugin, message, [{'_id': 'w1', 'name': 'Upstairs'}],
+                  site=site)
+        return controller(method, path, data)
+
+    plugin.connection.handler = handler
+    get(plugin, '/rest/wlanconf')
+    plugin.connection.handler = controller
+    _, requested = get(plugin, '/rest/wlanconf')
+    assert requested is not stored
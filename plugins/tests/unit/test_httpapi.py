@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import json
+from threading import Lock
+from time import sleep
+
+import pytest
+
+from support import Connection, HttpServer, httpapi_plugin
+
+from ansible_collections.gmeiner.unifi.plugins.httpapi import httpapi
+
+OK = json.dumps({'meta': {'rc': 'ok'}, 'data': []}).encode('utf-8')
+
+
+class Controller(object):
+    '''
+    Answers requests of a unifi-os controller, errors can be queued per path
+    as responses or as exceptions which are raised.
+    '''
+
+    def __init__(self):
+        self.errors = {}
+
+    def __call__(self, method, path, data):
+        errors = self.errors.get(path)
+        if errors:
+            error = errors.pop(0)
+            if isinstance(error, Exception):
+                raise error
+            return error
+        if path.endswith('/login'):
+            return 200, {'Set-Cookie': 'TOKEN=abc; Path=/'}, b'{}'
+        return 200, {}, OK
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    delays = []
+    monkeypatch.setattr(httpapi, 'sleep', delays.append)
+    return delays
+
+
+@pytest.fixture
+def controller():
+    return Controller()
+
+
+@pytest.fixture
+def plugin(controller):
+    return httpapi_plugin(Connection(controller), unifi_pool_size=0,
+                          unifi_cache_size=0)
+
+
+def test_login_honours_retry_after(plugin, controller, delays):
+    controller.errors['/api/auth/login'] = [
+        (429, {'Retry-After': '7'}, b'rate limited'),
+        (503, {}, b'busy'),
+    ]
+    plugin.login('admin', 'secret')
+
+    logins = [request for request in plugin.connection.requests
+              if request[1] == '/api/auth/login']
+    assert len(logins) == 3
+    assert delays[0] == 7
+    assert 0 <= delays[1] <= plugin.get_option('unifi_retry_backoff') * 2
+    assert plugin.connection._auth['cookie'] == 'TOKEN=abc'
+
+
+def test_login_fails_when_retries_are_exhausted(plugin, controller, delays):
+    controller.errors['/api/auth/login'] = [(429, {'Retry-After': '1'},
+                                             b'rate limited')] * 10
+    with pytest.raises(Exception, match='429'):
+        plugin.login('admin', 'secret')
+    assert len(delays) == plugin.get_option('unifi_retries')
+
+
+def test_login_does_not_retry_bad_credentials(plugin, controller, delays):
+    controller.errors['/api/auth/login'] = [(400, {}, b'invalid')]
+    with pytest.raises(Exception, match='400'):
+        plugin.login('admin', 'wrong')
+    assert delays == []
+
+
+def test_relogin_after_401_is_retried(plugin, controller, delays):
+    plugin.login('admin', 'secret')
+    controller.errors['/proxy/network/api/s/default/rest/wlanconf'] = [
+        (401, {}, b'expired')]
+    controller.errors['/api/auth/login'] = [(429, {'Retry-After': '2'},
+                                             b'rate limited')]
+    result = plugin.send_request(path='/rest/wlanconf', proxy='network')
+    assert result['meta']['rc'] == 'ok'
+    assert delays == [2]
+
+
+def test_busy_get_is_retried_but_post_is_not(plugin, controller, delays):
+    path = '/proxy/network/api/s/default/rest/networkconf'
+    controller.errors[path] = [(503, {'Retry-After': '3'}, b'busy')]
+    plugin.send_request(path='/rest/networkconf', proxy='network')
+    assert delays == [3]
+
+    controller.errors[path] = [(503, {}, b'busy')]
+    with pytest.raises(Exception, match='503'):
+        plugin.send_request(path='/rest/networkconf', proxy='network',
+                            data={'name': 'new'})
+    assert delays == [3]
+
+
+class Tracker(object):
+    '''
+    Wraps a handler and records the peak number of concurrent requests.
+    '''
+
+    def __init__(self, handler, delay=0.05):
+        self.handler = handler
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self.lock = Lock()
+
+    def __call__(self, method, path, data):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            sleep(self.delay)
+            return self.handler(method, path, data)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def batch(paths):
+    return [{'path': path, 'proxy': 'network'} for path in paths]
+
+
+def test_batch_without_pool_is_sent_sequentially(controller):
+    tracker = Tracker(controller)
+    plugin = httpapi_plugin(Connection(tracker), unifi_pool_size=0,
+                            unifi_cache_size=0)
+    controller.errors['/proxy/network/api/s/default/rest/b'] = [
+        (400, {}, b'invalid')]
+    responses = plugin.send_requests(batch(['/rest/a', '/rest/b', '/rest/c',
+                                            '/rest/d', '/rest/e']))
+
+    assert tracker.peak == 1
+    assert [sorted(response) for response in responses] == \
+        [['result'], ['error'], ['result'], ['result'], ['result']]
+    assert '400' in responses[1]['error']
+    assert responses[0]['result'] == json.loads(OK)
+
+
+@pytest.mark.parametrize('adaptive', [False, True])
+def test_batch_with_pool_is_sent_concurrently(controller, adaptive):
+    tracker = Tracker(controller)
+    server = HttpServer(tracker)
+    plugin = httpapi_plugin(Connection(tracker, host='127.0.0.1',
+                                       port=server.port),
+                            unifi_cache_size=0)
+    paths = ['/rest/item{index}'.format(index=index) for index in range(12)]
+    responses = plugin.send_requests(batch(paths), adaptive)
+
+    assert responses == [{'result': json.loads(OK)}] * len(paths)
+    assert 1 < tracker.peak <= plugin.get_option('unifi_max_workers')
+    requested = [path for _, path, _ in server.requests]
+    assert sorted(requested) == sorted(
+        '/proxy/network/api/s/default' + path for path in paths)
+    plugin.connection_pool.close()
+    server.close()
+
+
+def test_metrics_record_failed_requests(plugin, controller, delays):
+    plugin.set_logging(0, None, True)
+    path = '/proxy/network/api/s/default/rest/wlanconf'
+    controller.errors[path] = [(503, {}, b'busy'), (429, {}, b'limited')]
+    plugin.send_request(path='/rest/wlanconf', proxy='network')
+    controller.errors[path] = [(400, {}, b'invalid')]
+    with pytest.raises(Exception, match='400'):
+        plugin.send_request(path='/rest/wlanconf', proxy='network',
+                            data={'name': 'new'})
+    controller.errors[path] = [ConnectionRefusedError('refused')]
+    with pytest.raises(OSError):
+        plugin.send_request(path='/rest/wlanconf', proxy='network',
+                            data={'name': 'new'})
+
+    metrics = plugin.get_metrics()
+    assert metrics['GET /rest/wlanconf']['status'] == \
+        {'503': 1, '429': 1, '200': 1}
+    assert metrics['GET /rest/wlanconf']['count'] == 3
+    assert metrics['GET /rest/wlanconf']['retries'] == 2
+    assert metrics['POST /rest/wlanconf']['status'] == \
+        {'400': 1, 'failed': 1}
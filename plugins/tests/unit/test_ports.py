@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import json
+
+import pytest
+
+from support import Connection, Rpc, httpapi_plugin
+
+from ansible_collections.gmeiner.unifi.plugins.action.unifi import \
+    TaskExit, TaskModule
+from ansible_collections.gmeiner.unifi.plugins.module_utils import unifi
+from ansible_collections.gmeiner.unifi.plugins.modules import ports
+
+PREFIX = '/proxy/network/api/s/default'
+
+
+class Controller(object):
+    '''
+    Answers the requests of the unifi_ports module on a unifi-os controller
+    with two switches and records the device updates.
+    '''
+
+    def __init__(self):
+        self.devices = [
+            {'_id': 'd1', 'mac': 'aa:bb:cc:dd:ee:01', 'name': 'Core switch',
+             'port_table': [{'port_idx': 1, 'name': 'Uplink'},
+                            {'port_idx': 2, 'name': 'Port 2'},
+                            {'port_idx': 3, 'name': 'Port 3'}],
+             'port_overrides': [{'port_idx': 1, 'portconf_id': 'pA',
+                                 'stormctrl_enabled': True}]},
+            {'_id': 'd2', 'mac': 'aa:bb:cc:dd:ee:02', 'name': 'Desk switch',
+             'port_table': [{'port_idx': 1, 'name': 'Port 1'},
+                            {'port_idx': 2, 'name': 'Port 2'}],
+             'port_overrides': [{'port_idx': 2, 'portconf_id': 'pA'}]},
+        ]
+        self.portconfs = [{'_id': 'pA', 'name': 'A'},
+                          {'_id': 'pB', 'name': 'B'}]
+        self.writes = []
+
+    @staticmethod
+    def respond(data):
+        return 200, {}, json.dumps({'meta': {'rc': 'ok'},
+                                    'data': data}).encode('utf-8')
+
+    def __call__(self, method, path, data):
+        if path == '/api/system':
+            return 200, {}, b'{}'
+        if path == PREFIX + '/rest/portconf':
+            return self.respond(self.portconfs)
+        if path == PREFIX + '/stat/device':
+            if method == 'POST':
+                macs = json.loads(data)['macs']
+                return self.respond([device for device in self.devices
+                                     if device['mac'] in macs])
+            return self.respond(self.devices)
+        for device in self.devices:
+            if path == PREFIX + '/rest/device/' + device['_id'] \
+                    and method == 'PUT':
+                self.writes.append((device['_id'], json.loads(data)))
+                device.update(json.loads(data))
+                return self.respond([device])
+        return 404, {}, b'{"meta": {"rc": "error"}}'
+
+
+class Batches(object):
+    '''
+    Records the number of writes and the adaptive flag of each batch of
+    writes which is sent through the httpapi plugin.
+    '''
+
+    def __init__(self, plugin):
+        self.batches = []
+        self.__send_requests = plugin.send_requests
+
+    def __call__(self, requests, adaptive=False):
+        writes = [request for request in requests if request.get('_id')]
+        if writes:
+            self.batches.append((len(writes), adaptive))
+        return self.__send_requests(requests, adaptive)
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    controller = Controller()
+    Rpc.plugin = httpapi_plugin(Connection(controller), unifi_pool_size=0)
+    monkeypatch.setattr(unifi, 'Connection', Rpc)
+    return controller
+
+
+@pytest.fixture
+def batches(controller, monkeypatch):
+    batches = Batches(Rpc.plugin)
+    monkeypatch.setattr(Rpc.plugin, 'send_requests', batches)
+    return batches
+
+
+def run(check_mode=False, **args):
+    def module_class(**module_specs):
+        return TaskModule(args, check_mode, '/dev/null', **module_specs)
+    with pytest.raises(TaskExit) as exit:
+        ports.main(module_class=module_class)
+    assert not exit.value.result.get('failed'), exit.value.result
+    return exit.value.result
+
+
+#: ports of both switches, referenced by MAC address and by name
+PORTS = [
+    {'device': 'aa:bb:cc:dd:ee:01', 'port': 2, 'portconf': 'B'},
+    {'device': 'Desk switch', 'port': 'Port 1', 'portconf': 'B'},
+    {'device': 'AA-BB-CC-DD-EE-01', 'port': '3',
+     'override': {'name': 'Printer'}},
+]
+
+
+def test_port_overrides_are_merged_per_device(controller, batches):
+    result = run(ports=PORTS)
+    assert result['changed']
+    assert result['summary']['devices']['updated'] == 2
+
+    # a single update per device, sent as one adaptive batch
+    assert batches.batches == [(2, True)]
+    writes = dict(controller.writes)
+    assert len(controller.writes) == 2
+    # the existing overrides of each device are kept
+    assert writes['d1']['port_overrides'] == [
+        {'port_idx': 1, 'portconf_id': 'pA', 'stormctrl_enabled': True},
+        {'port_idx': 2, 'portconf_id': 'pB'},
+        {'port_idx': 3, 'name': 'Printer'}]
+    assert writes['d2']['port_overrides'] == [
+        {'port_idx': 2, 'portconf_id': 'pA'},
+        {'port_idx': 1, 'portconf_id': 'pB'}]
+
+
+def test_unchanged_devices_are_not_written(controller, batches):
+    result = run(ports=[
+        {'device': 'Core switch', 'port': 'Uplink', 'portconf': 'A'},
+        {'device': 'Desk switch', 'port': 1, 'portconf': 'B'}])
+    assert result['summary']['devices'] == {
+        'created': 0, 'updated': 1, 'deleted': 0, 'unchanged': 1}
+    assert batches.batches == [(1, True)]
+    assert [_id for _id, _ in controller.writes] == ['d2']
+
+
+def test_check_mode_does_not_write(controller, batches):
+    result = run(True, ports=PORTS)
+    assert result['summary']['devices']['updated'] == 2
+    assert batches.batches == []
+    assert controller.writes == []
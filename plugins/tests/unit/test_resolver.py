@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import json
+
+import pytest
+
+from support import Connection, Rpc, httpapi_plugin
+
+from ansible_collections.gmeiner.unifi.plugins.action.unifi import TaskModule
+from ansible_collections.gmeiner.unifi.plugins.module_utils import unifi
+from ansible_collections.gmeiner.unifi.plugins.module_utils.unifi import UniFi
+
+PREFIX = '/proxy/network/api/s/default'
+
+
+class Controller(object):
+    '''
+    Answers the requests for the referenced collections of a unifi-os
+    controller, new networks can be created.
+    '''
+
+    def __init__(self):
+        self.collections = {
+            PREFIX + '/rest/networkconf': [
+                {'_id': 'n1', 'name': 'LAN', 'purpose': 'corporate'},
+                {'_id': 'n2', 'name': 'IoT', 'purpose': 'corporate',
+                 'vlan_enabled': True, 'vlan': '503'},
+                {'_id': 'n3', 'name': 'Guests', 'purpose': 'guest',
+                 'vlan_enabled': True, 'vlan': 504},
+                {'_id': 'n4', 'name': 'WAN', 'purpose': 'wan'}],
+            '/v2/api/site/default/apgroups': [
+                {'_id': 'g1', 'name': 'All APs', 'attr_hidden_id': 'default'},
+                {'_id': 'g2', 'name': 'Upstairs'}],
+            PREFIX + '/rest/portconf': [
+                {'_id': 'p1', 'name': 'All'},
+                {'_id': 'p2', 'name': 'Disabled'}],
+            PREFIX + '/stat/ccode': [
+                {'code': '276', 'key': 'DE', 'name': 'Germany'},
+                {'code': '40', 'key': 'AT', 'name': 'Austria'}],
+        }
+
+    def __call__(self, method, path, data):
+        if path == '/api/system':
+            return 200, {}, b'{}'
+        if path not in self.collections:
+            return 404, {}, b'{"meta": {"rc": "error"}}'
+        items = self.collections[path]
+        if method == 'POST':
+            items.append(dict(json.loads(data),
+                              _id='new{0}'.format(len(items))))
+            items = items[-1:]
+        if path.startswith('/v2/'):
+            return 200, {}, json.dumps(items).encode('utf-8')
+        return 200, {}, json.dumps({'meta': {'rc': 'ok'},
+                                    'data': items}).encode('utf-8')
+
+    def gets(self, path):
+        return [request for request in Rpc.plugin.connection.requests
+                if request[:2] == ('GET', PREFIX + path)]
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    controller = Controller()
+    Rpc.plugin = httpapi_plugin(Connection(controller), unifi_pool_size=0)
+    monkeypatch.setattr(unifi, 'Connection', Rpc)
+    return controller
+
+
+@pytest.fixture
+def helper(controller):
+    def module_class(**module_specs):
+        return TaskModule({}, False, '/dev/null', **module_specs)
+    return UniFi(module_class=module_class)
+
+
+@pytest.mark.parametrize('reference, purpose, expected', [
+    ('IoT', None, 'n2'),
+    ('n3', None, 'n3'),
+    (503, None, 'n2'),
+    (504, None, 'n3'),
+    (504, 'guest', 'n3'),
+    ('WAN', 'wan', 'n4'),
+])
+def test_network_ids(helper, reference, purpose, expected):
+    resolver = helper.resolver
+    assert resolver.network_id(reference, purpose=purpose) == expected
+    assert resolver.missing == []
+
+
+def test_references_by_id_or_name(helper):
+    resolver = helper.resolver
+    assert resolver.network_ids(['LAN', 503, 'n3']) == ['n1', 'n2', 'n3']
+    assert resolver.apgroup_ids(['Upstairs', 'g1']) == ['g2', 'g1']
+    assert resolver.default_apgroup_ids() == ['g1']
+    assert resolver.portconf_id('Disabled') == 'p2'
+    assert resolver.portconf_id('p1') == 'p1'
+    assert resolver.country_code('DE') == '276'
+    resolver.check()
+
+
+def test_missing_references_fail_at_once(helper):
+    resolver = helper.resolver
+    assert resolver.network_id('Missing') is None
+    assert resolver.network_id('IoT', purpose='guest') is None
+    assert resolver.network_ids(['LAN', 'Missing']) == ['n1']
+    assert resolver.apgroup_ids(['Downstairs']) == []
+    assert resolver.portconf_id('Trunk') is None
+    assert resolver.country_code('XX') is None
+
+    with pytest.raises(Exception) as error:
+        resolver.check()
+    # each reference is reported once
+    assert str(error.value) == (
+        "Could not resolve network 'Missing', network 'IoT', "
+        "apgroup 'Downstairs', portconf 'Trunk', country code 'XX'")
+    # the missing references are reset by the check
+    assert resolver.missing == []
+    resolver.check()
+
+
+def test_collections_are_fetched_once(controller, helper):
+    resolver = helper.resolver
+    resolver.prefetch('network', 'apgroup')
+    for reference in ('LAN', 'IoT', 503, 'Missing'):
+        resolver.network_id(reference)
+    resolver.apgroup_ids(['Upstairs'])
+    assert len(controller.gets('/rest/networkconf')) == 1
+
+
+def test_collections_are_forgotten_after_write(controller, helper):
+    resolver = helper.resolver
+    assert resolver.network_id('New') is None
+    with pytest.raises(Exception):
+        resolver.check()
+
+    helper.set_networkconf(data={'name': 'New', 'purpose': 'corporate'})
+    assert resolver.network_id('New') == 'new4'
+    assert len(controller.gets('/rest/networkconf')) == 2
+    resolver.check()
+
+
+def test_lookups_pass_only_ids(controller, helper, monkeypatch):
+    lookups = []
+    lookup_ids = Rpc.plugin.lookup_ids
+
+    def record(request, values, keys=None, filters=None):
+        lookups.append((request['path'], values, keys, filters))
+        return lookup_ids(request, values, keys, filters)
+
+    monkeypatch.setattr(Rpc.plugin, 'lookup_ids', record)
+    resolver = helper.resolver
+    assert resolver.network_ids(['LAN', 503, None, 'IoT'],
+                                purpose='corporate') == ['n1', 'n2', 'n2']
+    assert resolver.portconf_id('Disabled') == 'p2'
+    assert lookups == [
+        ('/rest/networkconf', ['LAN', 'IoT'], None, {'purpose': 'corporate'}),
+        ('/rest/networkconf', [503], ['vlan'], {'purpose': 'corporate'}),
+        ('/rest/portconf', ['Disabled'], None, None)]
+    with pytest.raises(Exception) as error:
+        resolver.check()
+    assert str(error.value) == 'Could not resolve network None'
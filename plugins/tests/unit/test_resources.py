@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import pytest
+
+from ansible_collections.gmeiner.unifi.plugins.module_utils.resources import \
+    prepare_update_networkconf, rebase_range
+
+
+@pytest.mark.parametrize('new_subnet, expected', [
+    # the offsets from both ends of the subnet are kept
+    ('10.0.0.1/16', ('10.0.0.6', '10.0.255.254')),
+    ('192.168.1.1/23', ('192.168.0.6', '192.168.1.254')),
+    ('172.16.5.1/24', ('172.16.5.6', '172.16.5.254')),
+    # too small for the offsets, all hosts except for the gateway
+    ('192.168.1.1/29', ('192.168.1.2', '192.168.1.6')),
+    ('192.168.1.6/29', ('192.168.1.1', '192.168.1.5')),
+    ('192.168.1.3/29', ('192.168.1.1', '192.168.1.6')),
+    # too small for a range beside the gateway
+    ('10.0.0.1/30', None),
+    ('10.0.0.0/31', None),
+    ('10.0.0.1/31', None),
+    ('10.0.0.1/32', None),
+])
+def test_rebase_ipv4(new_subnet, expected):
+    assert rebase_range('192.168.1.1/24', new_subnet, '192.168.1.6',
+                        '192.168.1.254') == expected
+
+
+def test_rebase_shrinks_range_to_subnet():
+    assert rebase_range('192.168.1.1/24', '192.168.1.1/29', '192.168.1.100',
+                        '192.168.1.200') == ('192.168.1.2', '192.168.1.6')
+
+
+def test_rebase_ipv4_defaults():
+    # unknown range and range outside of the previous subnet
+    assert rebase_range(None, '10.0.0.1/24', None, None, 6, -1) == \
+        ('10.0.0.6', '10.0.0.254')
+    assert rebase_range('192.168.1.1/24', '10.0.0.1/24', '172.16.0.10',
+                        '192.168.1.200', 6, -1) == ('10.0.0.6', '10.0.0.200')
+    assert rebase_range('192.168.1.1/24', '10.0.0.1/24', None,
+                        '192.168.1.200') is None
+
+
+def test_rebase_ipv6():
+    assert rebase_range('fd00::1/64', '2001:db8:1::1/64', 'fd00::2',
+                        'fd00::7d1') == ('2001:db8:1::2', '2001:db8:1::7d1')
+    # the last address of IPv6 subnets is a host address
+    assert rebase_range('fd00::1/64', '2001:db8:1::1/120', 'fd00::2',
+                        'fd00::ffff:ffff:ffff:ffff') == \
+        ('2001:db8:1::2', '2001:db8:1::ff')
+    assert rebase_range('fd00::1/64', '2001:db8:1::1/128', 'fd00::2',
+                        'fd00::7d1') is None
+
+
+def test_rebase_ignores_other_address_family():
+    assert rebase_range('192.168.1.1/24', 'fd00::1/64', '192.168.1.6',
+                        '192.168.1.254') is None
+    assert rebase_range('192.168.1.1/24', 'fd00::1/64', '192.168.1.6',
+                        '192.168.1.254', 2, 0) == \
+        ('fd00::2', 'fd00::ffff:ffff:ffff:ffff')
+
+
+def test_networkconf_ranges_follow_subnet():
+    network = {'ip_subnet': '10.0.0.1/16', 'ipv6_subnet': '2001:db8:1::1/64'}
+    prepare_update_networkconf(network, {
+        'ip_subnet': '192.168.1.1/24', 'dhcpd_start': '192.168.1.6',
+        'dhcpd_stop': '192.168.1.254', 'ipv6_subnet': 'fd00::1/64',
+        'dhcpdv6_start': 'fd00::2', 'dhcpdv6_stop': 'fd00::7d1'})
+    assert network == {
+        'ip_subnet': '10.0.0.1/16', 'dhcpd_start': '10.0.0.6',
+        'dhcpd_stop': '10.0.255.254', 'ipv6_subnet': '2001:db8:1::1/64',
+        'dhcpdv6_start': '2001:db8:1::2', 'dhcpdv6_stop': '2001:db8:1::7d1'}
+
+
+@pytest.mark.parametrize('input, existing', [
+    # subnet too small for a range
+    ({'ip_subnet': '10.0.0.1/31'},
+     {'ip_subnet': '192.168.1.1/24', 'dhcpd_start': '192.168.1.6',
+      'dhcpd_stop': '192.168.1.254'}),
+    ({'ip_subnet': '10.0.0.1/32'},
+     {'ip_subnet': '192.168.1.1/24', 'dhcpd_start': '192.168.1.6',
+      'dhcpd_stop': '192.168.1.254'}),
+    # IPv6 ranges given as suffixes of the prefix aren't rebased
+    ({'ipv6_subnet': '2001:db8:1::1/64'},
+     {'ipv6_subnet': 'fd00::1/64', 'dhcpdv6_start': '::2',
+      'dhcpdv6_stop': '::7d1'}),
+    # unchanged subnet and ranges given explicitly
+    ({'ip_subnet': '192.168.1.1/24'},
+     {'ip_subnet': '192.168.1.1/24', 'dhcpd_start': '192.168.1.6',
+      'dhcpd_stop': '192.168.1.254'}),
+    ({'ip_subnet': '10.0.0.1/24', 'dhcpd_start': '10.0.0.100'},
+     {'ip_subnet': '192.168.1.1/24', 'dhcpd_start': '192.168.1.6',
+      'dhcpd_stop': '192.168.1.254'}),
+])
+def test_networkconf_ranges_untouched(input, existing):
+    expected = dict(input)
+    prepare_update_networkconf(input, existing)
+    assert input == expected
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2020, Sebastian Gmeiner <sebastian@gmeiner.eu>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import socket
+from threading import Event
+
+import pytest
+
+from support import WebSocketServer, wait_until
+
+from ansible_collections.gmeiner.unifi.plugins.module_utils.websocket import \
+    EventListener, WebSocket
+
+TEXT, BINARY, CONTINUATION = 0x1, 0x2, 0x0
+CLOSE, PING, PONG = 0x8, 0x9, 0xA
+
+
+@pytest.fixture
+def server():
+    server = WebSocketServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def websocket(server):
+    websocket = WebSocket('127.0.0.1', server.port, '/wss/s/default/events',
+                          headers={'Cookie': 'TOKEN=abc'}, timeout=5)
+    websocket.connect()
+    server.wait_for_client()
+    yield websocket
+    websocket.close()
+
+
+def test_handshake(server, websocket):
+    request = server.requests[0]
+    assert request.startswith('GET /wss/s/default/events HTTP/1.1\r\n')
+    assert 'Upgrade: websocket\r\n' in request
+    assert 'Sec-WebSocket-Version: 13\r\n' in request
+    assert 'Cookie: TOKEN=abc\r\n' in request
+    assert websocket.last_received is not None
+
+
+def test_handshake_rejected():
+    server = WebSocketServer(status='403 Forbidden')
+    websocket = WebSocket('127.0.0.1', server.port, '/', timeout=5)
+    with pytest.raises(ConnectionError, match='403 Forbidden'):
+        websocket.connect()
+    websocket.close()
+    server.close()
+
+
+def test_handshake_with_invalid_accept_key():
+    server = WebSocketServer(accept_key='invalid')
+    websocket = WebSocket('127.0.0.1', server.port, '/', timeout=5)
+    with pytest.raises(ConnectionError, match='accept key'):
+        websocket.connect()
+    websocket.close()
+    server.close()
+
+
+def test_several_frames_in_one_packet(server):
+    websocket = WebSocket('127.0.0.1', server.port, '/', timeout=5)
+    websocket.connect()
+    server.wait_for_client()
+    server.send(WebSocketServer.frame(b'first') +
+                WebSocketServer.frame(b'second'))
+    assert websocket.recv() == 'first'
+    assert websocket.recv() == 'second'
+    websocket.close()
+
+
+@pytest.mark.parametrize('size', [0, 125, 126, 65535, 65536, 200000])
+def test_client_frames_are_masked(server, websocket, size):
+    payload = bytes(i % 251 for i in range(size))
+    websocket.send(payload, BINARY)
+    wait_until(lambda: server.frames)
+    assert server.frames == [(BINARY, payload, True)]
+
+
+@pytest.mark.parametrize('size', [5, 126, 70000])
+def test_server_frames_of_any_length(server, websocket, size):
+    message = 'x' * size
+    server.send(WebSocketServer.frame(message.encode('utf-8')))
+    assert websocket.recv() == message
+
+
+def test_masked_server_frames_are_unmasked(server, websocket):
+    server.send(WebSocketServer.frame(b'{"meta": {}}', mask=b'\x01\x02\x03\x04'))
+    assert websocket.recv() == '{"meta": {}}'
+
+
+def test_fragmented_message_with_interleaved_ping(server, websocket):
+    message = '{"meta": {"message": "wlanconf:sync"}, "data": ["Büro"]}' \
+        .encode('utf-8')
+    data = WebSocketServer.frame(message[:10], TEXT, fin=False) + \
+        WebSocketServer.frame(b'keepalive', PING) + \
+        WebSocketServer.frame(message[10:40], CONTINUATION, fin=False) + \
+        WebSocketServer.frame(message[40:], CONTINUATION)
+    # deliver the frames byte by byte, splitting headers and UTF-8 characters
+    for i in range(len(data)):
+        server.send(data[i:i + 1])
+    assert websocket.recv() == message.decode('utf-8')
+    wait_until(lambda: server.frames)
+    assert server.frames == [(PONG, b'keepalive', True)]
+
+
+def test_binary_message(server, websocket):
+    server.send(WebSocketServer.frame(b'\x00\xff', BINARY, fin=False) +
+                WebSocketServer.frame(b'\x01', CONTINUATION))
+    assert websocket.recv() == b'\x00\xff\x01'
+
+
+def test_ping_and_pong(server, websocket):
+    assert websocket.responsive
+    received = websocket.last_received
+    websocket.ping()
+    assert not websocket.responsive
+    wait_until(lambda: server.frames)
+    assert server.frames == [(PING, b'', True)]
+
+    # the pong is consumed transparently while waiting for the next message
+    server.send(WebSocketServer.frame(b'after pong'))
+    assert websocket.recv() == 'after pong'
+    assert websocket.responsive
+    assert websocket.last_received > received
+
+
+def test_timeout_keeps_partial_frame(server):
+    websocket = WebSocket('127.0.0.1', server.port, '/', timeout=0.2)
+    websocket.connect()
+    server.wait_for_client()
+    frame = WebSocketServer.frame(b'complete later')
+    server.send(frame[:5])
+    with pytest.raises(socket.timeout):
+        websocket.recv()
+    server.send(frame[5:])
+    assert websocket.recv() == 'complete later'
+    websocket.close()
+
+
+def test_close_handshake(server, websocket):
+    server.send(WebSocketServer.frame(b'\x03\xe8bye', CLOSE))
+    assert websocket.recv() is None
+    wait_until(lambda: server.frames)
+    assert server.frames == [(CLOSE, b'\x03\xe8', True)]
+
+
+def test_connection_lost(server, websocket):
+    server.drop()
+    with pytest.raises(ConnectionError):
+        websocket.recv()
+
+
+def listener_for(server, messages, errors, timeout=5, reconnect_delay=0.05):
+    def connect():
+        websocket = WebSocket('127.0.0.1', server.port, '/', timeout=timeout)
+        websocket.connect()
+        return websocket
+    return EventListener(connect, messages.append, errors.append,
+                         reconnect_delay=reconnect_delay)
+
+
+def test_listener_reconnects(server):
+    messages, errors = [], []
+    # stop takes effect at the latest when the receive times out
+    listener = listener_for(server, messages, errors, timeout=0.5)
+    listener.start()
+    wait_until(lambda: listener.connected)
+    server.wait_for_client(1)
+    server.send(WebSocketServer.frame(b'one'))
+    wait_until(lambda: messages == ['one'])
+
+    # the server closes the connection cleanly, then drops it
+    server.send(WebSocketServer.frame(b'', CLOSE))
+    client = server.wait_for_client(2)
+    wait_until(lambda: errors == [None])
+    server.send(WebSocketServer.frame(b'two'), client)
+    wait_until(lambda: messages == ['one', 'two'])
+
+    server.drop()
+    server.wait_for_client(3)
+    wait_until(lambda: len(errors) == 2)
+    assert isinstance(errors[1], ConnectionError)
+    wait_until(lambda: listener.connected)
+
+    listener.stop()
+    listener.join(5)
+    assert not listener.is_alive()
+    assert not listener.connected
+
+
+def test_listener_reports_failed_connects():
+    messages, errors = [], []
+    server = WebSocketServer(status='401 Unauthorized')
+    listener = listener_for(server, messages, errors)
+    listener.start()
+    wait_until(lambda: len(errors) >= 2)
+    assert all(isinstance(error, ConnectionError) for error in errors)
+    assert not listener.connected
+    listener.stop()
+    listener.join(5)
+    server.close()
+
+
+def test_listener_pings_idle_server(server):
+    messages, errors = [], []
+    listener = listener_for(server, messages, errors, timeout=0.1)
+    listener.start()
+    server.wait_for_client()
+    wait_until(lambda: any(frame[0] == PING for frame in server.frames))
+    assert errors == []
+    listener.stop()
+    listener.join(5)
+
+
+def test_listener_gives_up_on_unresponsive_server():
+    server = WebSocketServer()
+    stopped = Event()
+    messages, errors = [], []
+
+    def connect():
+        websocket = WebSocket('127.0.0.1', server.port, '/', timeout=0.1)
+        websocket.connect()
+        # pings are never answered, as if the server hung
+        websocket.ping = lambda: setattr(websocket, '_WebSocket__pinged',
+                                         float('inf'))
+        return websocket
+
+    listener = EventListener(connect, messages.append,
+                             lambda error: (errors.append(error),
+                                            stopped.set()),
+                             reconnect_delay=5)
+    listener.start()
+    assert stopped.wait(5)
+    assert 'did not respond' in str(errors[0])
+    listener.stop()
+    server.close()